@@ -1,6 +1,6 @@
 from django.contrib import admin
 from .models import Usuario, Rol
-from .models import InviteCode
+from .models import InviteCode, RegistroAuditoria
 
 @admin.register(Usuario)
 class UsuarioAdmin(admin.ModelAdmin):
@@ -14,3 +14,14 @@ class InviteCodeAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at', 'used_at', 'used_by', 'uses_count')
     search_fields = ('code',)
     list_filter = ('single_use','used')
+
+@admin.register(RegistroAuditoria)
+class RegistroAuditoriaAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'username', 'metodo', 'ruta', 'vista', 'objeto_id', 'estado', 'duracion_ms')
+    list_filter = ('metodo', 'estado')
+    search_fields = ('username', 'ruta', 'vista')
+    date_hierarchy = 'fecha'
+    readonly_fields = [f.name for f in RegistroAuditoria._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,124 @@
+"""Registro de auditoría por lotes.
+
+El middleware (`cuentas.middleware.AuditoriaMiddleware`) solo agrega un dict
+a un buffer acotado en memoria; un hilo en segundo plano lo vacía cada
+AUDITORIA_INTERVALO segundos (o antes, si se junta un lote completo) con
+`bulk_create`. Si la base no alcanza a absorber el ritmo, el buffer descarta
+las entradas más antiguas en vez de crecer sin límite o frenar los requests.
+
+Con AUDITORIA_EN_SEGUNDO_PLANO desactivado (pruebas) no se lanza el hilo y
+cada request escribe su propia entrada.
+"""
+import atexit
+import logging
+import threading
+from collections import deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+LOTE_PURGA = 5000
+
+
+class BufferAuditoria:
+    def __init__(self, maximo=None):
+        self.entradas = deque(maxlen=maximo or settings.AUDITORIA_BUFFER_MAX)
+        self.descartadas = 0
+        self._lock = threading.Lock()
+        self._hay_lote = threading.Event()
+        self._hilo = None
+
+    def agregar(self, entrada):
+        with self._lock:
+            if len(self.entradas) == self.entradas.maxlen:
+                self.descartadas += 1
+            self.entradas.append(entrada)
+            pendientes = len(self.entradas)
+
+        if not settings.AUDITORIA_EN_SEGUNDO_PLANO:
+            self.vaciar()
+            return
+        self._asegurar_hilo()
+        if pendientes >= settings.AUDITORIA_LOTE:
+            self._hay_lote.set()
+
+    def _tomar(self):
+        with self._lock:
+            entradas = list(self.entradas)
+            self.entradas.clear()
+            descartadas, self.descartadas = self.descartadas, 0
+        return entradas, descartadas
+
+    def vaciar(self):
+        """Escribe las entradas pendientes por lotes. Devuelve cuántas se guardaron."""
+        from .models import RegistroAuditoria
+
+        entradas, descartadas = self._tomar()
+        if descartadas:
+            logger.warning('Auditoría: se descartaron %s entradas por buffer lleno', descartadas)
+        if not entradas:
+            return 0
+        try:
+            RegistroAuditoria.objects.bulk_create(
+                [RegistroAuditoria(**entrada) for entrada in entradas],
+                batch_size=settings.AUDITORIA_LOTE,
+            )
+        except Exception:
+            logger.exception('Auditoría: no se pudieron guardar %s entradas', len(entradas))
+            return 0
+        return len(entradas)
+
+    def _asegurar_hilo(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                if self._hilo is None:
+                    # Lo pendiente al terminar el proceso se escribe antes de salir
+                    atexit.register(self.vaciar)
+                self._hilo = threading.Thread(target=self._ciclo, name='auditoria', daemon=True)
+                self._hilo.start()
+
+    def _ciclo(self):
+        while True:
+            self._hay_lote.wait(settings.AUDITORIA_INTERVALO)
+            self._hay_lote.clear()
+            close_old_connections()
+            self.vaciar()
+
+
+buffer = BufferAuditoria()
+
+
+def registrar(usuario, metodo, ruta, vista, objeto_id, estado, duracion_ms):
+    buffer.agregar({
+        'usuario_id': usuario.pk,
+        'username': usuario.get_username(),
+        'metodo': metodo,
+        'ruta': ruta[:500],
+        'vista': vista[:200],
+        'objeto_id': objeto_id[:64],
+        'estado': estado,
+        'duracion_ms': duracion_ms,
+        'fecha': timezone.now(),
+    })
+
+
+def purgar_auditoria(dias=None, lote=LOTE_PURGA):
+    """Borra los registros con más de `dias` días (AUDITORIA_RETENCION_DIAS) en lotes por id."""
+    from .models import RegistroAuditoria
+
+    if dias is None:
+        dias = settings.AUDITORIA_RETENCION_DIAS
+    limite = timezone.now() - timedelta(days=dias)
+    antiguos = RegistroAuditoria.objects.filter(fecha__lt=limite).order_by('fecha')
+    total = 0
+    while True:
+        ids = list(antiguos.values_list('id', flat=True)[:lote])
+        if not ids:
+            return total
+        total += RegistroAuditoria.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,43 @@
+"""Backend de autenticación que carga el usuario junto con su rol.
+
+`AuthenticationMiddleware` carga el usuario de la sesión en cada request con
+`get_user`; aquí se trae con `select_related('rol')`, así `requiere_rol` y
+las plantillas leen `request.user.rol.nombre` sin otra consulta.
+
+Los permisos de Django (`has_perm`, admin) se cachean por usuario con la clave
+`cuentas:permisos:<id>:<credenciales_version>`. La versión viene en la misma
+fila del usuario y sube al cambiar su rol, su estado (p. ej. al despedirlo) o
+sus grupos y permisos (ver `Usuario.save` y `cuentas.signals`), de modo que
+ningún worker vuelve a usar un conjunto de permisos viejo.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+PERMISOS_CACHE_SEGUNDOS = 3600
+
+
+def clave_permisos(usuario):
+    return f'cuentas:permisos:{usuario.pk}:{usuario.credenciales_version}'
+
+
+class RolBackend(ModelBackend):
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            usuario = UserModel._default_manager.select_related('rol').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return usuario if self.user_can_authenticate(usuario) else None
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, '_perm_cache'):
+            clave = clave_permisos(user_obj)
+            permisos = cache.get(clave)
+            if permisos is None:
+                permisos = super().get_all_permissions(user_obj)
+                cache.set(clave, permisos, PERMISOS_CACHE_SEGUNDOS)
+            user_obj._perm_cache = set(permisos)
+        return user_obj._perm_cache
@@ -0,0 +1,187 @@
+"""Instrumentación por request: consultas SQL, tiempo de base, de plantillas y de vista.
+
+Se activa con INSTRUMENTACION_ACTIVA (`cuentas.middleware.InstrumentacionMiddleware`).
+Cada request lleva una `MedicionRequest` en un thread-local: las consultas se
+cuentan con `connection.execute_wrapper` y el render de plantillas con un
+envoltorio sobre `Template.render` (solo la plantilla externa, para no contar
+dos veces los `{% include %}`). El tiempo de plantillas incluye las consultas
+perezosas que se ejecutan al renderizar.
+
+Los totales se acumulan por vista en `estadisticas`, con las últimas
+INSTRUMENTACION_MUESTRAS mediciones para los percentiles y las huellas de
+consultas (SQL sin literales) que más tiempo sumaron. Todo vive en memoria del
+proceso: con varios workers cada uno tiene sus propias cifras.
+"""
+import math
+import re
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+MAX_HUELLAS_POR_VISTA = 200
+HUELLAS_EN_REPORTE = 5
+
+_local = threading.local()
+
+_LITERALES = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)'), '(?, ...)'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+def huella_sql(sql):
+    """SQL sin literales ni parámetros, para agrupar consultas de la misma forma."""
+    for patron, reemplazo in _LITERALES:
+        sql = patron.sub(reemplazo, sql)
+    return sql.strip()[:500]
+
+
+class MedicionRequest:
+    """Acumula lo medido durante un request. Se usa como `execute_wrapper`."""
+
+    def __init__(self):
+        self.consultas = 0
+        self.db_ms = 0.0
+        self.plantillas_ms = 0.0
+        self.huellas = {}  # huella -> [veces, ms]
+        self._en_plantilla = False
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            ms = (time.perf_counter() - inicio) * 1000
+            self.consultas += 1
+            self.db_ms += ms
+            datos = self.huellas.setdefault(huella_sql(sql), [0, 0.0])
+            datos[0] += 1
+            datos[1] += ms
+
+
+def iniciar_medicion():
+    _local.medicion = MedicionRequest()
+    return _local.medicion
+
+
+def terminar_medicion():
+    _local.medicion = None
+
+
+_render_original = None
+
+
+def instalar_medicion_plantillas():
+    """Envuelve `Template.render` una sola vez por proceso."""
+    global _render_original
+    from django.template.base import Template
+
+    if _render_original is not None:
+        return
+    _render_original = Template.render
+
+    def render_medido(self, context):
+        medicion = getattr(_local, 'medicion', None)
+        if medicion is None or medicion._en_plantilla:
+            return _render_original(self, context)
+        medicion._en_plantilla = True
+        inicio = time.perf_counter()
+        try:
+            return _render_original(self, context)
+        finally:
+            medicion.plantillas_ms += (time.perf_counter() - inicio) * 1000
+            medicion._en_plantilla = False
+
+    Template.render = render_medido
+
+
+def percentil(valores_ordenados, p):
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not valores_ordenados:
+        return 0.0
+    indice = max(0, min(len(valores_ordenados) - 1, math.ceil(p / 100 * len(valores_ordenados)) - 1))
+    return valores_ordenados[indice]
+
+
+class EstadisticaVista:
+    def __init__(self, muestras):
+        self.requests = 0
+        self.tiempos = deque(maxlen=muestras)
+        self.consultas = deque(maxlen=muestras)
+        self.db_ms = deque(maxlen=muestras)
+        self.huellas = {}  # huella -> [veces, ms_total, ms_max]
+
+    def agregar(self, total_ms, medicion):
+        self.requests += 1
+        self.tiempos.append(total_ms)
+        self.consultas.append(medicion.consultas)
+        self.db_ms.append(medicion.db_ms)
+        for huella, (veces, ms) in medicion.huellas.items():
+            datos = self.huellas.setdefault(huella, [0, 0.0, 0.0])
+            datos[0] += veces
+            datos[1] += ms
+            datos[2] = max(datos[2], ms)
+        if len(self.huellas) > MAX_HUELLAS_POR_VISTA:
+            # Se conservan las que más tiempo acumulan
+            conservar = sorted(self.huellas.items(), key=lambda item: item[1][1], reverse=True)
+            self.huellas = dict(conservar[:MAX_HUELLAS_POR_VISTA // 2])
+
+    def resumen(self, vista):
+        tiempos = sorted(self.tiempos)
+        muestras = len(tiempos) or 1
+        peores = sorted(self.huellas.items(), key=lambda item: item[1][1], reverse=True)[:HUELLAS_EN_REPORTE]
+        return {
+            'vista': vista,
+            'requests': self.requests,
+            'p50': percentil(tiempos, 50),
+            'p95': percentil(tiempos, 95),
+            'p99': percentil(tiempos, 99),
+            'consultas_promedio': sum(self.consultas) / muestras,
+            'db_ms_promedio': sum(self.db_ms) / muestras,
+            'huellas': [
+                {'sql': huella, 'veces': veces, 'ms_total': ms_total, 'ms_max': ms_max}
+                for huella, (veces, ms_total, ms_max) in peores
+            ],
+        }
+
+
+class EstadisticasVistas:
+    """Agregado en memoria por nombre de vista, protegido por un lock."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._vistas = {}
+
+    def registrar(self, vista, total_ms, medicion):
+        with self._lock:
+            estadistica = self._vistas.get(vista)
+            if estadistica is None:
+                estadistica = self._vistas[vista] = EstadisticaVista(settings.INSTRUMENTACION_MUESTRAS)
+            estadistica.agregar(total_ms, medicion)
+
+    def resumen(self):
+        """Resumen de cada vista, de la más lenta (p95) a la más rápida."""
+        with self._lock:
+            filas = [estadistica.resumen(vista) for vista, estadistica in self._vistas.items()]
+        return sorted(filas, key=lambda fila: fila['p95'], reverse=True)
+
+    def reiniciar(self):
+        with self._lock:
+            self._vistas.clear()
+
+
+estadisticas = EstadisticasVistas()
+
+
+def encabezado_server_timing(medicion, vista_ms, total_ms):
+    return ', '.join([
+        f'db;dur={medicion.db_ms:.1f};desc="{medicion.consultas} consultas"',
+        f'tpl;dur={medicion.plantillas_ms:.1f}',
+        f'view;dur={vista_ms:.1f}',
+        f'total;dur={total_ms:.1f}',
+    ])
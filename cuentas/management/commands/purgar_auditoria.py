@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from cuentas.auditoria import LOTE_PURGA, purgar_auditoria
+
+
+class Command(BaseCommand):
+    help = 'Borra por lotes los registros de auditoría más antiguos que AUDITORIA_RETENCION_DIAS.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=None,
+                            help='Días a conservar (por defecto AUDITORIA_RETENCION_DIAS).')
+        parser.add_argument('--lote', type=int, default=LOTE_PURGA,
+                            help=f'Filas borradas por consulta (por defecto {LOTE_PURGA}).')
+
+    def handle(self, *args, **options):
+        borrados = purgar_auditoria(options['dias'], options['lote'])
+        self.stdout.write(f'{borrados} registros de auditoría eliminados')
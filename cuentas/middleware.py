@@ -1,42 +1,155 @@
+import time
+from datetime import datetime, timezone as dt_timezone
+from django.core import signing
 from django.utils.deprecation import MiddlewareMixin
 from django.utils import timezone
 from django.contrib.auth import logout
 from django.shortcuts import redirect
 from django.conf import settings
 from django.contrib import messages
-import logging
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from . import auditoria, instrumentacion
+
+COOKIE_ACTIVIDAD = 'ultima_actividad'
+SALT_ACTIVIDAD = 'cuentas.middleware.actividad'
+
+
+def valor_cookie_actividad(session_key, momento):
+    """Valor firmado de la cookie de actividad, atado a la sesión actual."""
+    return signing.dumps([session_key, momento.timestamp()], salt=SALT_ACTIVIDAD, compress=False)
+
+
+def ultima_actividad(request):
+    """Último request del usuario: la cookie firmada si corresponde a esta sesión,
+    si no el valor (con granularidad) guardado en la sesión."""
+    momentos = []
+    guardada = request.session.get('last_activity')
+    if guardada:
+        momentos.append(datetime.fromisoformat(guardada))
+    cookie = request.COOKIES.get(COOKIE_ACTIVIDAD)
+    if cookie and request.session.session_key:
+        try:
+            session_key, marca = signing.loads(cookie, salt=SALT_ACTIVIDAD)
+        except (signing.BadSignature, TypeError, ValueError):
+            session_key = None
+        if session_key == request.session.session_key:
+            momentos.append(datetime.fromtimestamp(marca, tz=dt_timezone.utc))
+    return max(momentos) if momentos else None
 
-logger = logging.getLogger(__name__)
 
 class SessionTimeoutMiddleware:
+    """Cierra la sesión tras SESSION_INACTIVIDAD_SEGUNDOS sin requests.
+
+    Para no escribir la sesión en cada request, `last_activity` se guarda solo
+    cuando avanzó al menos SESSION_ACTIVIDAD_GRANULARIDAD segundos; la hora
+    exacta del último request viaja en una cookie firmada (atada a la clave de
+    sesión), de modo que el límite se aplica al segundo sin tocar la base.
+    """
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
-        if request.user.is_authenticated:
-            current_time = timezone.now()
-            last_activity = request.session.get('last_activity')
-            
-            if last_activity:
-                last_activity = timezone.datetime.fromisoformat(last_activity)
-                time_elapsed = (current_time - last_activity).total_seconds()
-                
-                if time_elapsed > 1200:  # 20 minutos
-                    logout(request)
-                    messages.warning(request, 'Tu sesión ha expirado por inactividad.')
-                    # Redirigir a la URL de login definida en settings
-                    return redirect(settings.LOGIN_URL)
-            
-            request.session['last_activity'] = current_time.isoformat()
-        
-        return self.get_response(request)
+        if not request.user.is_authenticated:
+            return self.get_response(request)
+
+        ahora = timezone.now()
+        limite = settings.SESSION_INACTIVIDAD_SEGUNDOS
+        anterior = ultima_actividad(request)
+        if anterior and (ahora - anterior).total_seconds() > limite:
+            logout(request)
+            messages.warning(request, 'Tu sesión ha expirado por inactividad.')
+            # Redirigir a la URL de login definida en settings
+            response = redirect(settings.LOGIN_URL)
+            response.delete_cookie(COOKIE_ACTIVIDAD)
+            return response
+
+        guardada = request.session.get('last_activity')
+        granularidad = settings.SESSION_ACTIVIDAD_GRANULARIDAD
+        if not guardada or (ahora - datetime.fromisoformat(guardada)).total_seconds() >= granularidad:
+            request.session['last_activity'] = ahora.isoformat()
+
+        response = self.get_response(request)
+        if request.user.is_authenticated and request.session.session_key:
+            response.set_cookie(
+                COOKIE_ACTIVIDAD,
+                valor_cookie_actividad(request.session.session_key, ahora),
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite=settings.SESSION_COOKIE_SAMESITE,
+            )
+        return response
 
 class AuditoriaMiddleware(MiddlewareMixin):
+    """Agrega cada request autenticado al buffer de `cuentas.auditoria`.
+
+    Guarda usuario, método, ruta, vista, id del objeto (primer argumento de la
+    URL), código de respuesta y duración; la escritura a la base la hace el
+    hilo del buffer.
+    """
+    def process_request(self, request):
+        request._inicio_auditoria = time.monotonic()
+
     def process_view(self, request, view_func, view_args, view_kwargs):
         if request.user.is_authenticated:
-            logger.info(
-                f"[AUDITORIA] usuario={request.user.username} "
-                f"metodo={request.method} path={request.path} "
-                f"fecha={timezone.now().isoformat()}"
+            # Se recuerda aquí por si la vista cierra la sesión (logout)
+            request._usuario_auditoria = request.user
+            argumentos = list(view_kwargs.values()) or list(view_args)
+            request._objeto_auditoria = str(argumentos[0]) if argumentos else ''
+        return None
+
+    def process_response(self, request, response):
+        usuario = getattr(request, '_usuario_auditoria', None)
+        if usuario is None and getattr(request, 'user', None) is not None and request.user.is_authenticated:
+            usuario = request.user
+        if usuario is not None:
+            inicio = getattr(request, '_inicio_auditoria', time.monotonic())
+            coincidencia = request.resolver_match
+            auditoria.registrar(
+                usuario,
+                metodo=request.method,
+                ruta=request.path,
+                vista=coincidencia.view_name if coincidencia else '',
+                objeto_id=getattr(request, '_objeto_auditoria', ''),
+                estado=response.status_code,
+                duracion_ms=int((time.monotonic() - inicio) * 1000),
             )
+        return response
+
+
+class InstrumentacionMiddleware:
+    """Mide consultas, tiempo de base, de plantillas y de vista de cada request.
+
+    Solo se carga con INSTRUMENTACION_ACTIVA. Agrega el encabezado
+    `Server-Timing` (visible en las herramientas de desarrollo del navegador)
+    y acumula las cifras por vista en `cuentas.instrumentacion.estadisticas`.
+    Va primero en MIDDLEWARE para que `total` incluya a los demás.
+    """
+    def __init__(self, get_response):
+        if not settings.INSTRUMENTACION_ACTIVA:
+            raise MiddlewareNotUsed
+        instrumentacion.instalar_medicion_plantillas()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        inicio = time.perf_counter()
+        medicion = instrumentacion.iniciar_medicion()
+        try:
+            with connection.execute_wrapper(medicion):
+                response = self.get_response(request)
+        finally:
+            instrumentacion.terminar_medicion()
+        fin = time.perf_counter()
+
+        inicio_vista = getattr(request, '_inicio_vista', None)
+        vista_ms = (fin - inicio_vista) * 1000 if inicio_vista else 0.0
+        total_ms = (fin - inicio) * 1000
+        response['Server-Timing'] = instrumentacion.encabezado_server_timing(medicion, vista_ms, total_ms)
+        coincidencia = request.resolver_match
+        vista = coincidencia.view_name if coincidencia else '(sin vista)'
+        instrumentacion.estadisticas.registrar(vista, total_ms, medicion)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._inicio_vista = time.perf_counter()
         return None
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:08
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cuentas', '0005_alter_usuario_groups_alter_usuario_user_permissions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroAuditoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(max_length=150)),
+                ('metodo', models.CharField(max_length=10)),
+                ('ruta', models.CharField(max_length=500)),
+                ('vista', models.CharField(blank=True, max_length=200)),
+                ('objeto_id', models.CharField(blank=True, max_length=64)),
+                ('estado', models.PositiveSmallIntegerField()),
+                ('duracion_ms', models.PositiveIntegerField()),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Registro de Auditoría',
+                'verbose_name_plural': 'Registros de Auditoría',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['fecha'], name='cuentas_auditoria_fecha_idx'), models.Index(fields=['usuario', 'fecha'], name='cuentas_auditoria_usr_idx')],
+            },
+        ),
+    ]
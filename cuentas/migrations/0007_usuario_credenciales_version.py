@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cuentas', '0006_registroauditoria'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='credenciales_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -12,6 +12,8 @@ class Usuario(AbstractUser):
     rol = models.ForeignKey(Rol, null=True, blank=True, on_delete=models.SET_NULL)
     run = models.CharField(max_length=12, unique=True, null=True, blank=True, help_text="RUN sin puntos, con guión y dígito verificador")
     telefono = models.CharField(max_length=15, null=True, blank=True)
+    # Sube cuando cambian el rol, el estado o los permisos: invalida los permisos cacheados (cuentas.backends)
+    credenciales_version = models.PositiveIntegerField(default=0, editable=False)
 
     groups = models.ManyToManyField(
         'auth.Group',
@@ -30,9 +32,30 @@ class Usuario(AbstractUser):
         related_query_name="usuario",
     )
 
+    CAMPOS_CREDENCIALES = ('rol_id', 'is_active', 'is_superuser', 'is_staff')
+
     class Meta:
         db_table = "usuario"  # si quieres que la tabla se llame 'usuario'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        usuario = super().from_db(db, field_names, values)
+        usuario._credenciales = usuario._estado_credenciales()
+        return usuario
+
+    def _estado_credenciales(self):
+        # Desde __dict__ para no cargar campos diferidos
+        return tuple(self.__dict__.get(campo) for campo in self.CAMPOS_CREDENCIALES)
+
+    def save(self, *args, **kwargs):
+        anterior = getattr(self, '_credenciales', None)
+        if anterior is not None and anterior != self._estado_credenciales():
+            self.credenciales_version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'credenciales_version'}
+        super().save(*args, **kwargs)
+        self._credenciales = self._estado_credenciales()
+
 
 class InviteCode(models.Model):
     code = models.CharField(max_length=64, unique=True)
@@ -96,4 +119,32 @@ class InviteCode(models.Model):
             return False
         if self.single_use and self.used:
             return False
-        return True
\ No newline at end of file
+        return True
+
+class RegistroAuditoria(models.Model):
+    """Un request autenticado: quién, qué vista, con qué resultado y cuánto tardó.
+
+    Las filas las escribe por lotes `cuentas.auditoria` (buffer en memoria +
+    hilo que hace bulk_create); `manage.py purgar_auditoria` borra las antiguas.
+    """
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    username = models.CharField(max_length=150)  # se conserva aunque se elimine el usuario
+    metodo = models.CharField(max_length=10)
+    ruta = models.CharField(max_length=500)
+    vista = models.CharField(max_length=200, blank=True)
+    objeto_id = models.CharField(max_length=64, blank=True)
+    estado = models.PositiveSmallIntegerField()
+    duracion_ms = models.PositiveIntegerField()
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Registro de Auditoría'
+        verbose_name_plural = 'Registros de Auditoría'
+        ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['fecha'], name='cuentas_auditoria_fecha_idx'),
+            models.Index(fields=['usuario', 'fecha'], name='cuentas_auditoria_usr_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha:%Y-%m-%d %H:%M:%S} {self.username} {self.metodo} {self.ruta} ({self.estado})"
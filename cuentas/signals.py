@@ -0,0 +1,43 @@
+"""Invalidación de los permisos cacheados por `cuentas.backends`.
+
+Los cambios de rol y de estado suben `credenciales_version` en `Usuario.save`;
+los cambios de grupos y permisos llegan por `m2m_changed`. Como son cambios
+de administración poco frecuentes, un cambio en un grupo o en los permisos de
+un grupo invalida a todos los usuarios en vez de calcular a quiénes afecta.
+"""
+from django.contrib.auth.models import Group
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete
+from django.dispatch import receiver
+
+from .models import Usuario
+
+ACCIONES = {'post_add', 'post_remove', 'post_clear'}
+
+
+def invalidar_permisos(usuario_ids=None):
+    usuarios = Usuario.objects.all() if usuario_ids is None else Usuario.objects.filter(pk__in=usuario_ids)
+    usuarios.update(credenciales_version=F('credenciales_version') + 1)
+
+
+@receiver(m2m_changed, sender=Usuario.groups.through)
+@receiver(m2m_changed, sender=Usuario.user_permissions.through)
+def permisos_de_usuario_cambiados(sender, instance, action, reverse, **kwargs):
+    if action not in ACCIONES:
+        return
+    if reverse:
+        invalidar_permisos()
+    else:
+        invalidar_permisos([instance.pk])
+        instance.credenciales_version += 1  # que un save() posterior no la devuelva atrás
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def permisos_de_grupo_cambiados(sender, action, **kwargs):
+    if action in ACCIONES:
+        invalidar_permisos()
+
+
+@receiver(post_delete, sender=Group)
+def grupo_eliminado(sender, **kwargs):
+    invalidar_permisos()
@@ -2,6 +2,7 @@ from django.test import TestCase, Client
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from .models import InviteCode
+from .middleware import COOKIE_ACTIVIDAD, valor_cookie_actividad
 
 
 class InviteCodeSignupTests(TestCase):
@@ -55,4 +56,273 @@ class InviteCodeSignupTests(TestCase):
 		self.assertEqual(ic.uses_count, 2)
 		self.assertTrue(ic.used)
 		# Now is_valid should be False
-		self.assertFalse(ic.is_valid())
\ No newline at end of file
+		self.assertFalse(ic.is_valid())
+
+
+class SessionTimeoutTests(TestCase):
+	"""La actividad se persiste con granularidad y el límite de 20 minutos se respeta al segundo."""
+	def setUp(self):
+		from django.core.cache import cache
+		cache.clear()
+		self.user = get_user_model().objects.create_user(username='activo', password='pass')
+		self.client = Client()
+		self.client.force_login(self.user)
+		self.url = reverse('cuentas:dashboard')
+
+	def _fijar_actividad(self, sesion_hace, cookie_hace=None, session_key=None):
+		from datetime import timedelta
+		from django.utils import timezone
+		ahora = timezone.now()
+		sesion = self.client.session
+		sesion['last_activity'] = (ahora - timedelta(seconds=sesion_hace)).isoformat()
+		sesion.save()
+		if cookie_hace is not None:
+			self.client.cookies[COOKIE_ACTIVIDAD] = valor_cookie_actividad(
+				session_key or sesion.session_key, ahora - timedelta(seconds=cookie_hace)
+			)
+
+	def test_requests_seguidos_no_escriben_la_sesion(self):
+		from django.db import connection
+		from django.test.utils import CaptureQueriesContext
+		self.assertEqual(self.client.get(self.url).status_code, 200)
+		with CaptureQueriesContext(connection) as consultas:
+			for _ in range(3):
+				self.assertEqual(self.client.get(self.url).status_code, 200)
+		escrituras = [q['sql'] for q in consultas.captured_queries
+					  if 'django_session' in q['sql'] and not q['sql'].startswith('SELECT')]
+		self.assertEqual(escrituras, [])
+		self.assertIn(COOKIE_ACTIVIDAD, self.client.cookies)
+
+	def test_actividad_se_guarda_al_superar_la_granularidad(self):
+		self._fijar_actividad(sesion_hace=120)
+		self.client.get(self.url)
+		from datetime import datetime
+		from django.utils import timezone
+		guardada = datetime.fromisoformat(self.client.session['last_activity'])
+		self.assertLess((timezone.now() - guardada).total_seconds(), 5)
+
+	def test_cookie_exacta_evita_cierre_con_sesion_atrasada(self):
+		# La sesión guardada quedó atrasada, pero hubo un request hace 100 s
+		self._fijar_actividad(sesion_hace=1230, cookie_hace=100)
+		self.assertEqual(self.client.get(self.url).status_code, 200)
+
+	def test_cierra_la_sesion_pasados_1200_segundos(self):
+		self._fijar_actividad(sesion_hace=1250, cookie_hace=1201)
+		respuesta = self.client.get(self.url)
+		self.assertEqual(respuesta.status_code, 302)
+		self.assertNotIn('_auth_user_id', self.client.session)
+
+	def test_cookie_de_otra_sesion_se_ignora(self):
+		self._fijar_actividad(sesion_hace=1250, cookie_hace=10, session_key='otra-sesion')
+		self.assertEqual(self.client.get(self.url).status_code, 302)
+
+	def test_sesiones_en_cache_solo_con_redis(self):
+		import os
+		import runpy
+		from unittest import mock
+		from django.conf import settings
+		ruta = os.path.join(settings.BASE_DIR, 'obstetricia', 'settings.py')
+		entorno = {k: v for k, v in os.environ.items() if k != 'REDIS_URL'}
+		with mock.patch.dict(os.environ, entorno, clear=True), mock.patch('dotenv.load_dotenv'):
+			sin_redis = runpy.run_path(ruta)
+		self.assertEqual(sin_redis['SESSION_ENGINE'], 'django.contrib.sessions.backends.db')
+		with mock.patch.dict(os.environ, {'REDIS_URL': 'redis://localhost:6379/0'}), mock.patch('dotenv.load_dotenv'):
+			con_redis = runpy.run_path(ruta)
+		self.assertEqual(con_redis['SESSION_ENGINE'], 'django.contrib.sessions.backends.cached_db')
+		self.assertEqual(con_redis['CACHES']['default']['BACKEND'], 'django.core.cache.backends.redis.RedisCache')
+
+
+class AuditoriaTests(TestCase):
+	"""Los requests autenticados se acumulan en el buffer y se escriben por lotes."""
+	def setUp(self):
+		from .auditoria import buffer
+		from .models import Rol
+		buffer.vaciar()
+		rol = Rol.objects.create(nombre='superusuario')
+		self.admin = get_user_model().objects.create_user(username='jefa', password='pass', rol=rol)
+		self.user = get_user_model().objects.create_user(username='matrona', password='pass')
+		self.client = Client()
+
+	def test_middleware_registra_requests_autenticados(self):
+		from .models import RegistroAuditoria
+		self.client.get(reverse('cuentas:login'))
+		self.client.force_login(self.user)
+		self.client.get(reverse('cuentas:dashboard'))
+		self.client.get(reverse('registros:detalle_parto', args=[999]))
+		self.assertEqual(RegistroAuditoria.objects.count(), 2)
+		detalle = RegistroAuditoria.objects.get(vista='registros:detalle_parto')
+		self.assertEqual((detalle.username, detalle.metodo, detalle.objeto_id, detalle.estado),
+						 ('matrona', 'GET', '999', 404))
+		self.assertEqual(detalle.usuario, self.user)
+
+	def test_buffer_escribe_por_lotes_y_descarta_las_mas_antiguas(self):
+		from django.db import connection
+		from django.test.utils import CaptureQueriesContext
+		from django.utils import timezone
+		from .auditoria import BufferAuditoria
+		from .models import RegistroAuditoria
+		acotado = BufferAuditoria(maximo=3)
+		acotado._asegurar_hilo = lambda: None  # sin hilo: se vacía a mano
+		with self.settings(AUDITORIA_EN_SEGUNDO_PLANO=True):
+			for i in range(5):
+				acotado.agregar({'usuario_id': self.user.pk, 'username': f'u{i}', 'metodo': 'GET', 'ruta': '/',
+								 'estado': 200, 'duracion_ms': 1, 'fecha': timezone.now()})
+		self.assertEqual(acotado.descartadas, 2)
+		self.assertEqual(RegistroAuditoria.objects.count(), 0)
+		with CaptureQueriesContext(connection) as consultas:
+			self.assertEqual(acotado.vaciar(), 3)
+		self.assertEqual(len(consultas), 1)
+		self.assertEqual(list(RegistroAuditoria.objects.order_by('username').values_list('username', flat=True)),
+						 ['u2', 'u3', 'u4'])
+		self.assertEqual((len(acotado.entradas), acotado.descartadas), (0, 0))
+
+	def test_reporte_filtra_por_usuario_y_fecha(self):
+		from datetime import date, timedelta
+		from django.utils import timezone
+		from .models import RegistroAuditoria
+		comun = {'metodo': 'GET', 'ruta': '/', 'estado': 200, 'duracion_ms': 5}
+		RegistroAuditoria.objects.create(usuario=self.user, username='matrona', **comun)
+		RegistroAuditoria.objects.create(usuario=self.user, username='matrona',
+										 fecha=timezone.now() - timedelta(days=40), **comun)
+		self.client.force_login(self.admin)
+		hoy = timezone.localdate()
+		respuesta = self.client.get(reverse('cuentas:auditoria'),
+									{'usuario': 'matrona', 'desde': (hoy - timedelta(days=7)).isoformat()})
+		self.assertEqual(respuesta.status_code, 200)
+		self.assertEqual(len(respuesta.context['registros']), 1)
+		self.assertFalse(respuesta.context['hay_mas'])
+		self.assertEqual(len(self.client.get(reverse('cuentas:auditoria'), {'usuario': 'matrona'}).context['registros']), 2)
+
+		# Usuario eliminado: se busca por el nombre que quedó en sus registros
+		self.user.delete()
+		RegistroAuditoria.objects.create(username='otra', **comun)
+		respuesta = self.client.get(reverse('cuentas:auditoria'), {'usuario': 'matrona'})
+		self.assertEqual(len(respuesta.context['registros']), 2)
+
+		# Sin count(): se trae una fila más que el máximo
+		from unittest import mock
+		with mock.patch('cuentas.views.MAX_FILAS_AUDITORIA', 1):
+			respuesta = self.client.get(reverse('cuentas:auditoria'))
+		self.assertEqual(len(respuesta.context['registros']), 1)
+		self.assertTrue(respuesta.context['hay_mas'])
+
+		self.client.force_login(get_user_model().objects.create_user(username='otra', password='pass'))
+		self.assertEqual(self.client.get(reverse('cuentas:auditoria')).status_code, 403)
+
+	def test_purga_por_lotes(self):
+		from datetime import timedelta
+		from django.core.management import call_command
+		from django.utils import timezone
+		from .models import RegistroAuditoria
+		comun = {'usuario': self.user, 'username': 'matrona', 'metodo': 'GET', 'ruta': '/', 'estado': 200, 'duracion_ms': 1}
+		RegistroAuditoria.objects.bulk_create(
+			[RegistroAuditoria(fecha=timezone.now() - timedelta(days=400), **comun) for _ in range(7)]
+			+ [RegistroAuditoria(**comun)]
+		)
+		call_command('purgar_auditoria', '--dias', '365', '--lote', '3', stdout=open('/dev/null', 'w'))
+		self.assertEqual(RegistroAuditoria.objects.count(), 1)
+
+
+class InstrumentacionTests(TestCase):
+	"""Con INSTRUMENTACION_ACTIVA cada request lleva Server-Timing y se agrega por vista."""
+	def setUp(self):
+		from .instrumentacion import estadisticas
+		from .models import Rol
+		estadisticas.reiniciar()
+		rol = Rol.objects.create(nombre='superusuario')
+		self.admin = get_user_model().objects.create_user(username='jefa', password='pass', rol=rol)
+		self.user = get_user_model().objects.create_user(username='matrona', password='pass')
+
+	def test_huella_agrupa_consultas_con_distintos_literales(self):
+		from .instrumentacion import huella_sql
+		self.assertEqual(huella_sql("SELECT * FROM t WHERE id = 5 AND rut = '1-9'"),
+						 huella_sql("SELECT *  FROM t WHERE id = 12 AND rut = '2-7'"))
+		self.assertEqual(huella_sql('SELECT * FROM t WHERE id IN (%s, %s, %s)'), 'SELECT * FROM t WHERE id IN (?, ...)')
+
+	def test_server_timing_y_reporte_de_vistas_lentas(self):
+		from .instrumentacion import estadisticas
+		with self.settings(INSTRUMENTACION_ACTIVA=True):
+			cliente = Client()  # el middleware se carga con el cliente nuevo
+			cliente.force_login(self.user)
+			respuesta = cliente.get(reverse('cuentas:dashboard'))
+			cliente.get(reverse('cuentas:dashboard'))
+			encabezado = respuesta['Server-Timing']
+			for metrica in ('db;dur=', 'tpl;dur=', 'view;dur=', 'total;dur='):
+				self.assertIn(metrica, encabezado)
+			self.assertNotIn('desc="0 consultas"', encabezado)
+
+			fila = next(f for f in estadisticas.resumen() if f['vista'] == 'cuentas:dashboard')
+			self.assertEqual(fila['requests'], 2)
+			self.assertGreater(fila['consultas_promedio'], 0)
+			self.assertTrue(fila['huellas'])
+			self.assertLessEqual(fila['p50'], fila['p99'])
+
+			self.assertEqual(cliente.get(reverse('cuentas:rendimiento')).status_code, 403)
+			cliente.force_login(self.admin)
+			reporte = cliente.get(reverse('cuentas:rendimiento'))
+			self.assertEqual(reporte.status_code, 200)
+			self.assertContains(reporte, 'cuentas:dashboard')
+
+	def test_desactivada_no_agrega_encabezado(self):
+		self.client.force_login(self.user)
+		self.assertNotIn('Server-Timing', self.client.get(reverse('cuentas:dashboard')))
+
+
+class RolBackendTests(TestCase):
+	"""El usuario se carga con su rol y los permisos se cachean hasta que cambian sus credenciales."""
+	def setUp(self):
+		from django.core.cache import cache
+		from .models import Rol
+		cache.clear()
+		self.rol_admin = Rol.objects.create(nombre='superusuario')
+		self.rol_usuario = Rol.objects.create(nombre='usuario')
+		self.admin = get_user_model().objects.create_user(username='jefa', password='pass', rol=self.rol_admin)
+		self.user = get_user_model().objects.create_user(username='matrona', password='pass', rol=self.rol_usuario)
+
+	def test_vista_con_rol_no_consulta_el_rol_aparte(self):
+		from django.db import connection
+		from django.test.utils import CaptureQueriesContext
+		self.client.force_login(self.admin)
+		with CaptureQueriesContext(connection) as consultas:
+			self.assertEqual(self.client.get(reverse('cuentas:rendimiento')).status_code, 200)
+		sql = [c['sql'] for c in consultas]
+		self.assertFalse([s for s in sql if s.startswith('SELECT') and 'FROM "cuentas_rol"' in s], sql)
+		self.assertEqual(len([s for s in sql if 'FROM "usuario"' in s]), 1, sql)
+
+	def test_permisos_cacheados_e_invalidados(self):
+		from django.contrib.auth import get_user
+		from django.contrib.auth.models import Permission
+		permiso = Permission.objects.get(codename='view_rol')
+		self.user.user_permissions.add(permiso)
+		self.client.force_login(self.user)
+
+		def usuario_de_la_sesion():
+			request = self.client.get(reverse('cuentas:dashboard')).wsgi_request
+			return get_user(request)
+
+		self.assertTrue(usuario_de_la_sesion().has_perm('cuentas.view_rol'))
+		usuario = usuario_de_la_sesion()
+		with self.assertNumQueries(0):
+			self.assertTrue(usuario.has_perm('cuentas.view_rol'))
+
+		self.user.user_permissions.remove(permiso)
+		self.assertFalse(usuario_de_la_sesion().has_perm('cuentas.view_rol'))
+
+	def test_cambio_de_rol_y_despido(self):
+		self.client.force_login(self.user)
+		self.assertEqual(self.client.get(reverse('cuentas:rendimiento')).status_code, 403)
+
+		version = self.user.credenciales_version
+		usuario = get_user_model().objects.get(pk=self.user.pk)
+		usuario.rol = self.rol_admin
+		usuario.save()
+		self.assertEqual(usuario.credenciales_version, version + 1)
+		self.assertEqual(self.client.get(reverse('cuentas:rendimiento')).status_code, 200)
+
+		jefe = get_user_model().objects.create_superuser(username='jefe', password='pass')
+		despedir = Client()
+		despedir.force_login(jefe)
+		despedir.post(reverse('usuarios:despedir_profesional', args=[self.user.pk]))
+		usuario.refresh_from_db()
+		self.assertEqual((usuario.is_active, usuario.credenciales_version), (False, version + 2))
+		self.assertEqual(self.client.get(reverse('cuentas:rendimiento')).status_code, 302)
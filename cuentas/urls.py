@@ -8,6 +8,8 @@ urlpatterns = [
     path("registro-profesional/", views.registro_profesional, name="registro_profesional"),
     path("", views.dashboard, name="dashboard"),
     path("gestionar-usuarios/", views.gestionar_usuarios, name="gestionar_usuarios"),
+    path("auditoria/", views.reporte_auditoria, name="auditoria"),
+    path("rendimiento/", views.reporte_rendimiento, name="rendimiento"),
     path("formulario-parto/", views.completar_formulario_parto, name="form_parto"),
     path("buttons-showcase/", views.buttons_showcase, name="buttons_showcase"),
 ]
@@ -4,10 +4,14 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect
 from django.http import HttpResponseForbidden
 from django.contrib import messages
+from django.conf import settings
 from .forms import LoginForm, ProfesionalRegistroForm
-from .models import Usuario, Rol
-from registros.models import Parto
+from .models import Usuario, Rol, RegistroAuditoria
+from . import instrumentacion
+from registros.models import Parto, inicio_dia, rango_dias
+from registros.resumen import total_partos
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 
 def login_view(request):
     if request.user.is_authenticated:
@@ -28,10 +32,16 @@ def login_view(request):
 def dashboard(request):
     # Estadísticas rápidas para matronas
     now = timezone.now()
-    inicio_mes = now.replace(day=1)
-    # Totales
-    total_mes = Parto.objects.filter(fecha_hora__date__gte=inicio_mes.date()).count()
-    total_30dias = Parto.objects.filter(fecha_hora__gte=now - timezone.timedelta(days=30)).count()
+    inicio_mes = timezone.localdate(now).replace(day=1)
+    # Totales desde la tabla de agregados diarios
+    total_mes = total_partos(desde=inicio_mes)
+    # Últimos 30 días exactos: días completos desde el resumen + el tramo del primer día
+    corte = now - timezone.timedelta(days=30)
+    dia_corte = timezone.localdate(corte)
+    siguiente_dia = dia_corte + timezone.timedelta(days=1)
+    total_30dias = total_partos(desde=siguiente_dia) + Parto.objects.filter(
+        fecha_hora__gte=corte, fecha_hora__lt=inicio_dia(siguiente_dia)
+    ).count()
     # Últimos 5 registros (global)
     recientes = Parto.objects.select_related('madre', 'created_by').order_by('-fecha_hora')[:5]
     # Mis registros
@@ -67,6 +77,67 @@ def gestionar_usuarios(request):
     # CRUD de usuarios solo para superusuario
     return render(request, "cuentas/gestionar_usuarios.html")
 
+MAX_FILAS_AUDITORIA = 200
+
+
+def _fecha_param(request, nombre):
+    try:
+        return parse_date(request.GET.get(nombre) or '')
+    except ValueError:
+        return None
+
+
+@requiere_rol("superusuario")
+def reporte_auditoria(request):
+    """Registros de auditoría filtrados por usuario y rango de días (los más recientes primero).
+
+    No vacía el buffer de `cuentas.auditoria`: lo de los últimos
+    AUDITORIA_INTERVALO segundos aparece cuando lo escribe el hilo. Tampoco
+    cuenta el total; se trae una fila más que el máximo para saber si hay más.
+    """
+    usuario = request.GET.get('usuario', '').strip()
+    desde = _fecha_param(request, 'desde')
+    hasta = _fecha_param(request, 'hasta')
+
+    registros = RegistroAuditoria.objects.all()
+    if usuario:
+        usuario_id = Usuario.objects.filter(username=usuario).values_list('id', flat=True).first()
+        if usuario_id is not None:
+            # Usa el índice (usuario, fecha)
+            registros = registros.filter(usuario_id=usuario_id)
+        else:
+            # Usuario eliminado: solo queda su nombre en los registros
+            registros = registros.filter(usuario__isnull=True, username=usuario)
+    if desde or hasta:
+        inicio, fin = rango_dias(desde, hasta)
+        if inicio:
+            registros = registros.filter(fecha__gte=inicio)
+        if fin:
+            registros = registros.filter(fecha__lt=fin)
+
+    filas = list(registros.order_by('-fecha')[:MAX_FILAS_AUDITORIA + 1])
+    return render(request, "cuentas/auditoria.html", {
+        'registros': filas[:MAX_FILAS_AUDITORIA],
+        'hay_mas': len(filas) > MAX_FILAS_AUDITORIA,
+        'max_filas': MAX_FILAS_AUDITORIA,
+        'intervalo': settings.AUDITORIA_INTERVALO,
+        'usuario': usuario,
+        'desde': desde,
+        'hasta': hasta,
+    })
+
+@requiere_rol("superusuario")
+def reporte_rendimiento(request):
+    """Vistas más lentas (p95) y sus consultas más costosas, según la instrumentación en memoria."""
+    if request.method == "POST":
+        instrumentacion.estadisticas.reiniciar()
+        messages.success(request, "Se reiniciaron las métricas de rendimiento.")
+        return redirect("cuentas:rendimiento")
+    return render(request, "cuentas/rendimiento.html", {
+        'vistas': instrumentacion.estadisticas.resumen(),
+        'activa': settings.INSTRUMENTACION_ACTIVA,
+    })
+
 @requiere_rol("usuario", "superusuario")
 def completar_formulario_parto(request):
     # Redirigir al formulario de registro de partos del app `registros`.
@@ -1,46 +1,22 @@
-import pandas as pd
+"""Muestra la cabecera y el mapeo de columnas que usaría el importador en cada hoja.
+
+Uso: python find_header_row.py <planilla.xlsx>
+"""
 import os
+import sys
+
+import django
 
-base_path = r"c:\Users\56975\Desktop\presentacion integrados\proyecto\docs"
-file_name = "LIBRO DE PARTOS 09 SEPTIEMBRE 2025 (Autoguardado) (1).xlsx"
-path = os.path.join(base_path, file_name)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'obstetricia.settings')
+django.setup()
 
-keywords = ["NOMBRE", "RUT", "EDAD", "PARTO", "PESO", "TALLA", "APGAR", "FECHA"]
+from registros.import_data import analizar_cabeceras, leer_hojas  # noqa: E402
 
-try:
-    xls = pd.ExcelFile(path)
-    sheet = xls.sheet_names[0]
-    df = pd.read_excel(xls, sheet_name=sheet, header=None, nrows=20)
-    
-    best_row = -1
-    max_matches = 0
-    
-    print(f"Scanning first 20 rows of '{sheet}' for headers...")
-    
-    for i, row in df.iterrows():
-        matches = 0
-        row_str = " ".join([str(v).upper() for v in row.values if pd.notna(v)])
-        
-        for kw in keywords:
-            if kw in row_str:
-                matches += 1
-        
-        if matches > 0:
-            print(f"Row {i} has {matches} matches: {row_str[:100]}...")
-            
-        if matches > max_matches:
-            max_matches = matches
-            best_row = i
-            
-    print(f"\nBEST GUESS: Header is at Row {best_row} with {max_matches} matches.")
-    
-    if best_row != -1:
-        # Print the actual columns from that row
-        print(f"COLUMNS found in Row {best_row}:")
-        headers = df.iloc[best_row].values
-        for idx, h in enumerate(headers):
-            if pd.notna(h):
-                print(f"  Col {idx}: {h}")
+with open(sys.argv[1], 'rb') as archivo:
+    hojas = analizar_cabeceras(leer_hojas(archivo), guardar=False)
 
-except Exception as e:
-    print(f"ERROR: {e}")
+for hoja in hojas:
+    origen = 'perfil guardado' if hoja['desde_perfil'] else 'palabras clave'
+    print(f"Hoja '{hoja['nombre']}': cabecera en la fila {hoja['header_row']} ({origen})")
+    for campo, columna in hoja['columnas'].items():
+        print(f"  {campo}: {columna or '-'}")
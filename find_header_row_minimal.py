@@ -1,32 +1,17 @@
-import pandas as pd
+"""Imprime la fila de cabecera (índice desde 0) que el importador usa en cada hoja.
+
+Uso: python find_header_row_minimal.py <planilla.xlsx>
+"""
 import os
+import sys
 
-base_path = r"c:\Users\56975\Desktop\presentacion integrados\proyecto\docs"
-file_name = "LIBRO DE PARTOS 09 SEPTIEMBRE 2025 (Autoguardado) (1).xlsx"
-path = os.path.join(base_path, file_name)
+import django
 
-keywords = ["NOMBRE", "RUT", "EDAD", "PARTO", "PESO", "TALLA", "APGAR"]
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'obstetricia.settings')
+django.setup()
 
-try:
-    xls = pd.ExcelFile(path)
-    sheet = xls.sheet_names[0]
-    df = pd.read_excel(xls, sheet_name=sheet, header=None, nrows=20)
-    
-    best_row = -1
-    max_matches = 0
-    
-    for i, row in df.iterrows():
-        matches = 0
-        row_str = " ".join([str(v).upper() for v in row.values if pd.notna(v)])
-        for kw in keywords:
-            if kw in row_str:
-                matches += 1
-        
-        if matches > max_matches:
-            max_matches = matches
-            best_row = i
-            
-    print(f"HEADER_ROW_INDEX:{best_row}")
+from registros.import_data import analizar_cabeceras, leer_hojas  # noqa: E402
 
-except Exception as e:
-    print(f"ERROR:{e}")
+with open(sys.argv[1], 'rb') as archivo:
+    for hoja in analizar_cabeceras(leer_hojas(archivo), guardar=False):
+        print(f"{hoja['nombre']}:HEADER_ROW_INDEX:{hoja['header_row']}")
@@ -1,25 +1,26 @@
-import pandas as pd
+"""Lista las primeras filas con texto de cada hoja y la huella de su cabecera.
+
+Uso: python inspect_headers_smart.py <planilla.xlsx>
+"""
 import os
+import sys
+
+import django
 
-base_path = r"c:\Users\56975\Desktop\presentacion integrados\proyecto\docs"
-file_name = "LIBRO DE PARTOS 09 SEPTIEMBRE 2025 (Autoguardado) (1).xlsx"
-path = os.path.join(base_path, file_name)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'obstetricia.settings')
+django.setup()
 
-print(f"INSPECTING: {file_name}")
+from registros.import_data import (  # noqa: E402
+    FILAS_DETECCION_CABECERA, celdas_cabecera, huella_cabecera, leer_hojas,
+)
 
-try:
-    xls = pd.ExcelFile(path)
-    sheet = xls.sheet_names[0] # Assume data is in the first sheet
-    print(f"SHEET: {sheet}")
-    
-    df = pd.read_excel(xls, sheet_name=sheet, header=None, nrows=15)
-    
-    print("\nSEARCHING FOR HEADERS (Row by Row):")
-    for i, row in df.iterrows():
-        # Get non-null values in this row
-        values = [str(v).strip() for v in row.values if pd.notna(v) and str(v).strip() != '']
-        if values:
-            print(f"ROW {i}: {values}")
+with open(sys.argv[1], 'rb') as archivo:
+    hojas = leer_hojas(archivo)
 
-except Exception as e:
-    print(f"ERROR: {e}")
+for nombre, df in hojas:
+    print(f"HOJA: {nombre}")
+    for i, fila in df.head(FILAS_DETECCION_CABECERA).iterrows():
+        celdas = celdas_cabecera(fila.values)
+        if any(celdas):
+            huella = huella_cabecera(celdas)
+            print(f"FILA {i} [{huella[:12] if huella else '-'}]: {[c for c in celdas if c]}")
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 import dj_database_url
@@ -67,6 +68,8 @@ INSTALLED_APPS = [
 SITE_ID = 1
 
 MIDDLEWARE = [
+    # Métricas por request (solo con INSTRUMENTACION_ACTIVA)
+    'cuentas.middleware.InstrumentacionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     # WhiteNoise sirve archivos estáticos de manera eficiente sin depender de
     # configuración adicional de servidor (útil en despliegues sencillos).
@@ -169,14 +172,65 @@ MEDIA_URL = '/media/'
 LOGIN_URL = '/login/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Exportaciones (Excel/PDF/REM) procesadas por `manage.py procesar_exportaciones`.
+# Con '0'/'False' se generan dentro del request (útil en desarrollo sin worker).
+EXPORTACIONES_EN_SEGUNDO_PLANO = os.environ.get('EXPORTACIONES_EN_SEGUNDO_PLANO', 'True').lower() not in ('0', 'false')
+# Días que se conservan los archivos generados antes de purgarlos
+EXPORTACIONES_RETENCION_DIAS = int(os.environ.get('EXPORTACIONES_RETENCION_DIAS', '7'))
+# Minutos sin latido del worker tras los que los trabajos pendientes se marcan con error
+EXPORTACIONES_SIN_WORKER_MINUTOS = int(os.environ.get('EXPORTACIONES_SIN_WORKER_MINUTOS', '10'))
+
+# Reporte PDF de partos: partos por bloque de HTML y procesos que los
+# convierten en paralelo (1 = en el mismo proceso).
+PDF_PARTOS_POR_BLOQUE = int(os.environ.get('PDF_PARTOS_POR_BLOQUE', '200'))
+PDF_PROCESOS = int(os.environ.get('PDF_PROCESOS', '2'))
+
+# Caché de archivos generados (MEDIA_ROOT/artefactos): tamaño máximo antes
+# de desalojar los menos usados.
+ARTEFACTOS_MAX_MB = int(os.environ.get('ARTEFACTOS_MAX_MB', '500'))
+
+# Días que se conservan las planillas ya analizadas (MEDIA_ROOT/import_cache)
+# para confirmar la importación o re-subir el mismo archivo sin re-parsearlo.
+IMPORTACIONES_CACHE_DIAS = int(os.environ.get('IMPORTACIONES_CACHE_DIAS', '7'))
+
+# Auditoría de requests (cuentas.auditoria): buffer en memoria que un hilo
+# vacía con bulk_create. Durante `manage.py test` se vacía en el mismo request.
+TESTING = sys.argv[1:2] == ['test']
+AUDITORIA_EN_SEGUNDO_PLANO = (
+    os.environ.get('AUDITORIA_EN_SEGUNDO_PLANO', 'True').lower() not in ('0', 'false') and not TESTING
+)
+AUDITORIA_INTERVALO = float(os.environ.get('AUDITORIA_INTERVALO', '5'))  # segundos entre vaciados
+AUDITORIA_LOTE = 500  # filas por bulk_create
+AUDITORIA_BUFFER_MAX = 10000  # entradas en memoria antes de descartar las más antiguas
+# Días que se conservan los registros (manage.py purgar_auditoria)
+AUDITORIA_RETENCION_DIAS = int(os.environ.get('AUDITORIA_RETENCION_DIAS', '365'))
+
+# Instrumentación por request (consultas, tiempos y encabezado Server-Timing).
+# Desactivada por defecto; el reporte está en /rendimiento/ (superusuario).
+INSTRUMENTACION_ACTIVA = os.environ.get('INSTRUMENTACION_ACTIVA', 'False').lower() in ('1', 'true')
+INSTRUMENTACION_MUESTRAS = 1000  # mediciones por vista para los percentiles
+
+# Directorio de profesionales en memoria (/registros/api/profesionales/): cada
+# proceso compara su versión con la de la base a lo más cada tantos segundos.
+PROFESIONALES_VERIFICAR_SEGUNDOS = int(os.environ.get('PROFESIONALES_VERIFICAR_SEGUNDOS', '30'))
+
+# Índice de madres que el registro de partos guarda en el navegador
+# (registros.indice_madres): madres con actividad en estos días, hasta este máximo.
+INDICE_MADRES_DIAS = int(os.environ.get('INDICE_MADRES_DIAS', '365'))
+INDICE_MADRES_MAX = int(os.environ.get('INDICE_MADRES_MAX', '50000'))
+
+# Máximo de RUT por consulta de /registros/api/madre/lote/.
+MADRE_LOOKUP_LOTE_MAX = int(os.environ.get('MADRE_LOOKUP_LOTE_MAX', '5000'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Configuración de Autenticación
+# RolBackend: ModelBackend que carga el usuario con su rol y cachea sus permisos
 AUTHENTICATION_BACKENDS = [
-    'django.contrib.auth.backends.ModelBackend',
+    'cuentas.backends.RolBackend',
 ]
 
 # Configuraciones de autenticación
@@ -190,8 +244,39 @@ LOGOUT_REDIRECT_URL = '/login/'
 # agregar la configuración correspondiente aquí. Actualmente usamos el sistema
 # de autenticación por defecto de Django.
 
+# Caché: en memoria por proceso salvo que se configure Redis (REDIS_URL).
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'evali',
+        }
+    }
+
 # Configuraciones de Sesión
-SESSION_COOKIE_AGE = 1200  # 20 minutos en segundos
-SESSION_SAVE_EVERY_REQUEST = True
+# Con Redis, sesiones leídas desde la caché con respaldo en la base de datos:
+# una lectura sin acierto en caché va a la tabla. Sin Redis se leen de la
+# tabla: la caché en memoria es una copia por proceso de gunicorn, y un logout
+# o un cambio hecho en un proceso no llegaría a los demás.
+if os.environ.get('REDIS_URL'):
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+else:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+SESSION_SAVE_EVERY_REQUEST = False
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
+# Cierre por inactividad (cuentas.middleware.SessionTimeoutMiddleware)
+SESSION_INACTIVIDAD_SEGUNDOS = 1200  # 20 minutos
+# La última actividad se guarda en la sesión solo cuando avanzó al menos
+# estos segundos; el valor exacto viaja en una cookie firmada.
+SESSION_ACTIVIDAD_GRANULARIDAD = int(os.environ.get('SESSION_ACTIVIDAD_GRANULARIDAD', '60'))
+# La sesión guardada puede ir atrasada hasta una granularidad respecto de la
+# última actividad, así que dura eso más que el límite de inactividad.
+SESSION_COOKIE_AGE = SESSION_INACTIVIDAD_SEGUNDOS + SESSION_ACTIVIDAD_GRANULARIDAD
 
@@ -1,3 +1,9 @@
 from django.contrib import admin
+from .models import PerfilImportacion
 
-# Register your models here.
+@admin.register(PerfilImportacion)
+class PerfilImportacionAdmin(admin.ModelAdmin):
+    list_display = ('huella', 'confirmado', 'confirmado_por', 'usos', 'created_at', 'updated_at')
+    list_filter = ('confirmado',)
+    search_fields = ('huella',)
+    readonly_fields = ('huella', 'encabezados', 'usos', 'created_at', 'updated_at')
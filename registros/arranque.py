@@ -0,0 +1,63 @@
+"""Tiempo de arranque de un worker (`manage.py tiempo_arranque`).
+
+Arranca un intérprete nuevo con `python -X importtime`, carga la aplicación
+WSGI y el URLconf como lo hace un worker de gunicorn antes de su primer
+request, y convierte la salida de importtime en un informe: tiempo total de
+importación, los módulos que más tardan y las bibliotecas pesadas que se
+cargaron. Pandas, openpyxl y xhtml2pdf solo deben cargarse en las rutas de
+importación, exportación y reportes; si aparecen al arrancar, hay un import a
+nivel de módulo que los arrastra.
+"""
+import os
+import re
+import subprocess
+import sys
+
+from django.conf import settings
+
+BIBLIOTECAS_PESADAS = ('pandas', 'numpy', 'openpyxl', 'xhtml2pdf', 'reportlab', 'PIL')
+
+CODIGO_ARRANQUE = (
+    'from obstetricia.wsgi import application\n'
+    'from django.urls import get_resolver\n'
+    'get_resolver().url_patterns\n'
+)
+
+_LINEA = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s*(\S+)\s*$')
+
+
+def parsear_importtime(salida):
+    """Lista de `(modulo, propio_us, acumulado_us)` desde la salida de `-X importtime`."""
+    modulos = []
+    for linea in salida.splitlines():
+        coincidencia = _LINEA.match(linea)
+        if coincidencia:
+            propio, acumulado, modulo = coincidencia.groups()
+            modulos.append((modulo, int(propio), int(acumulado)))
+    return modulos
+
+
+def informe_arranque(modulos, top=15):
+    """Resumen de los módulos importados: total, más lentos (acumulado) y bibliotecas pesadas."""
+    cargados = {modulo for modulo, _, _ in modulos}
+    return {
+        'total_ms': round(sum(propio for _, propio, _ in modulos) / 1000, 1),
+        'modulos': len(modulos),
+        'pesadas': [nombre for nombre in BIBLIOTECAS_PESADAS if nombre in cargados],
+        'mas_lentos': [
+            {'modulo': modulo, 'acumulado_ms': round(acumulado / 1000, 1)}
+            for modulo, _, acumulado in sorted(modulos, key=lambda m: m[2], reverse=True)[:top]
+        ],
+    }
+
+
+def medir_arranque(top=15):
+    """Arranca un intérprete nuevo con `-X importtime` y devuelve el informe del arranque."""
+    entorno = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'obstetricia.settings')}
+    proceso = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CODIGO_ARRANQUE],
+        cwd=settings.BASE_DIR, env=entorno, capture_output=True, text=True, timeout=120,
+    )
+    if proceso.returncode != 0:
+        raise RuntimeError(f'El arranque falló:\n{proceso.stderr[-2000:]}')
+    return informe_arranque(parsear_importtime(proceso.stderr), top=top)
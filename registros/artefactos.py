@@ -0,0 +1,176 @@
+"""Caché en disco de los archivos generados (Excel, PDF y REM).
+
+La clave de un artefacto es (tipo de exportación, parámetros, versión de los
+datos clínicos de `registros.versiones`). Las señales y el importador cambian
+esa versión con cualquier alta, baja o edición, así que un archivo viejo nunca
+se vuelve a servir, y armar la clave cuesta una consulta por la llave única.
+
+Como un mismo archivo se sirve muchas veces, no lleva la hora en que se generó:
+el PDF indica cuándo cambiaron los datos por última vez y la fecha del nombre
+de las exportaciones completas se agrega al servirlas (`nombre_descarga`).
+
+Los bytes se guardan direccionados por contenido (MEDIA_ROOT/artefactos/<sha256>)
+y cada clave apunta a su archivo con un pequeño JSON; el sha256 es también el
+ETag con que se sirven. Cada acierto renueva la fecha de modificación del
+archivo y, al superar ARTEFACTOS_MAX_MB, se eliminan los menos usados (LRU).
+`buscar_artefacto` entrega el archivo ya abierto, así un desalojo de otro
+proceso entre la búsqueda y la lectura no corta la descarga.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils import timezone
+from django.utils.http import parse_etags, quote_etag
+
+from .versiones import version_datos
+
+logger = logging.getLogger(__name__)
+
+CARPETA_ARTEFACTOS = 'artefactos'
+
+
+@dataclass
+class Artefacto:
+    ruta: str
+    nombre: str
+    sha: str
+    archivo: object = None  # abierto en binario por buscar_artefacto
+
+    @property
+    def etag(self):
+        return quote_etag(self.sha)
+
+
+def _carpeta():
+    return os.path.join(settings.MEDIA_ROOT, CARPETA_ARTEFACTOS)
+
+
+def clave_artefacto(tipo, parametros, sello=None):
+    if sello is None:
+        sello = version_datos()
+    contenido = json.dumps([tipo, parametros, sello], sort_keys=True, default=str)
+    return hashlib.sha256(contenido.encode()).hexdigest()
+
+
+def _ruta_indice(clave):
+    return os.path.join(_carpeta(), f'{clave}.json')
+
+
+def buscar_artefacto(tipo, parametros, clave=None):
+    """Artefacto vigente para la exportación pedida, con su archivo abierto, o None si hay que generarlo.
+
+    Quien lo recibe debe cerrar `artefacto.archivo` (respuesta_artefacto y
+    copiar_artefacto lo hacen).
+    """
+    clave = clave or clave_artefacto(tipo, parametros)
+    try:
+        with open(_ruta_indice(clave)) as indice_archivo:
+            indice = json.load(indice_archivo)
+        ruta = os.path.join(_carpeta(), indice['sha'])
+        artefacto = Artefacto(ruta, indice['nombre'], indice['sha'], open(ruta, 'rb'))
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+    try:
+        os.utime(artefacto.archivo.fileno())  # uso reciente para el LRU
+    except OSError:
+        pass
+    return artefacto
+
+
+def guardar_artefacto(clave, origen, nombre):
+    """Copia el archivo binario abierto `origen` a la caché bajo `clave` y devuelve el Artefacto."""
+    carpeta = _carpeta()
+    os.makedirs(carpeta, exist_ok=True)
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(dir=carpeta, suffix='.tmp', delete=False) as temporal:
+        for bloque in iter(lambda: origen.read(1024 * 1024), b''):
+            digest.update(bloque)
+            temporal.write(bloque)
+    sha = digest.hexdigest()
+    ruta = os.path.join(carpeta, sha)
+    os.replace(temporal.name, ruta)
+
+    indice_temporal = f'{_ruta_indice(clave)}.{os.getpid()}.tmp'
+    with open(indice_temporal, 'w') as archivo:
+        json.dump({'sha': sha, 'nombre': nombre}, archivo)
+    os.replace(indice_temporal, _ruta_indice(clave))
+
+    desalojar_artefactos()
+    return Artefacto(ruta, nombre, sha)
+
+
+def copiar_artefacto(artefacto, destino):
+    with artefacto.archivo as origen:
+        shutil.copyfileobj(origen, destino)
+
+
+def desalojar_artefactos(max_bytes=None):
+    """Borra los archivos menos usados hasta quedar bajo ARTEFACTOS_MAX_MB. Devuelve cuántos borró."""
+    if max_bytes is None:
+        max_bytes = settings.ARTEFACTOS_MAX_MB * 1024 * 1024
+    try:
+        entradas = [e for e in os.scandir(_carpeta()) if e.is_file() and '.' not in e.name]
+    except FileNotFoundError:
+        return 0
+    archivos = sorted((e.stat().st_mtime, e.stat().st_size, e.path) for e in entradas)
+    total = sum(tamano for _, tamano, _ in archivos)
+    borrados = 0
+    for _, tamano, ruta in archivos:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(ruta)
+        except OSError:
+            logger.warning('No se pudo eliminar %s', ruta)
+            continue
+        total -= tamano
+        borrados += 1
+    if borrados:
+        _limpiar_indices()
+    return borrados
+
+
+def _limpiar_indices():
+    """Elimina los índices que apuntan a archivos ya desalojados."""
+    carpeta = _carpeta()
+    for entrada in os.scandir(carpeta):
+        if not entrada.name.endswith('.json'):
+            continue
+        try:
+            with open(entrada.path) as archivo:
+                sha = json.load(archivo)['sha']
+        except (OSError, ValueError, KeyError):
+            sha = None
+        if sha is None or not os.path.exists(os.path.join(carpeta, sha)):
+            try:
+                os.remove(entrada.path)
+            except OSError:
+                pass
+
+
+def nombre_descarga(nombre):
+    """Nombre con que se entrega un archivo: a las exportaciones completas se les agrega la fecha de hoy."""
+    base, extension = os.path.splitext(nombre)
+    if base.endswith('_Completo'):
+        return f"{base}_{timezone.localdate().strftime('%Y%m%d')}{extension}"
+    return nombre
+
+
+def respuesta_artefacto(request, artefacto):
+    """Descarga del artefacto con ETag; 304 si el cliente ya tiene esa versión (If-None-Match)."""
+    etags = parse_etags(request.headers.get('If-None-Match', ''))
+    if '*' in etags or artefacto.etag in etags:
+        artefacto.archivo.close()
+        respuesta = HttpResponseNotModified()
+    else:
+        respuesta = FileResponse(artefacto.archivo, as_attachment=True, filename=nombre_descarga(artefacto.nombre))
+    respuesta['ETag'] = artefacto.etag
+    respuesta['Cache-Control'] = 'private, no-cache'
+    return respuesta
@@ -0,0 +1,237 @@
+"""Benchmark de punta a punta (`manage.py benchmark`).
+
+Mide con el cliente de pruebas de Django las rutas más usadas sobre la base
+configurada, a uno o más tamaños de datos que se completan con
+`registros.sinteticos`. Cada medición repite la ruta, guarda los tiempos en
+milisegundos y la cantidad de consultas de la última repetición, y el
+resultado completo se escribe como JSON para comparar corridas.
+
+La búsqueda por lote de RUT (`madre_lookup_lote`) se compara con las mismas
+RUT consultadas una a una en `madre_lookup`.
+
+Las exportaciones se miden completas (encolar + generar en el worker) y con la
+caché de artefactos vacía; el reporte REM, con la versión de datos recién
+marcada para que no salga de caché.
+"""
+import math
+import random
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from .artefactos import CARPETA_ARTEFACTOS
+from .exportaciones import ejecutar_trabajo, tomar_trabajo
+from .import_data import importar_datos_excel
+from .models import Madre, Parto, TrabajoExportacion
+from .paginacion import codificar_cursor
+from .sinteticos import APELLIDOS, USUARIO_SINTETICO, GeneradorSintetico, generar_datos, usuario_sintetico
+from .versiones import marcar_cambio
+
+CABECERA_IMPORTACION = ['FECHA', 'Hora', 'Nombre completo', 'RUN', 'DV', 'Edad', 'Tipo de parto',
+                        'Sem. Obst. (semanas)', 'Sexo', 'Peso', 'Talla', 'Apgar al minuto', 'Apgar a los 5 min']
+TIPOS_PARTO_EXCEL = {
+    'eutocico': 'EUTOCICO',
+    'distocico': 'FORCEPS',
+    'cesarea_urgencia': 'CESAREA URGENCIA',
+    'cesarea_electiva': 'CESAREA ELECTIVA',
+}
+
+
+class BaseNoSintetica(Exception):
+    """La base tiene datos que no creó el generador sintético."""
+
+
+def hay_datos_reales():
+    return Madre.objects.exclude(created_by__username=USUARIO_SINTETICO).exists()
+
+
+def estadisticas(tiempos, consultas):
+    ordenados = sorted(tiempos)
+
+    def percentil(p):
+        return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+    return {
+        'n': len(ordenados),
+        'min_ms': round(ordenados[0], 2),
+        'p50_ms': round(percentil(50), 2),
+        'p95_ms': round(percentil(95), 2),
+        'max_ms': round(ordenados[-1], 2),
+        'media_ms': round(sum(ordenados) / len(ordenados), 2),
+        'consultas': consultas,
+    }
+
+
+def planilla_importacion(generador, filas):
+    """Libro .xlsx con `filas` partos nuevos en el formato del libro de partos."""
+    from openpyxl import Workbook
+
+    libro = Workbook()
+    hoja = libro.active
+    hoja.append(['LIBRO DE PARTOS'])
+    hoja.append(CABECERA_IMPORTACION)
+    for _ in range(filas):
+        rut = generador.rut()
+        madre = generador.madre(rut, None)
+        parto = generador.parto(madre, None, 0)
+        rn = generador.recien_nacido(parto)
+        local = timezone.localtime(parto.fecha_hora)
+        hoja.append([
+            local.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None), local.strftime('%H:%M'),
+            f'{madre.nombres} {madre.apellidos}', int(rut[:-1]), rut[-1], madre.edad,
+            TIPOS_PARTO_EXCEL[parto.tipo_parto], parto.semanas_gestacion,
+            'MASCULINO' if rn.sexo == 'M' else 'FEMENINO', int(rn.peso * 1000), rn.talla, rn.apgar_1, rn.apgar_5,
+        ])
+    archivo = BytesIO()
+    libro.save(archivo)
+    return archivo.getvalue()
+
+
+class Benchmark:
+    def __init__(self, repeticiones=5, dias_exportacion=7, filas_importacion=500, ruts_lote=500, semilla=None):
+        self.repeticiones = repeticiones
+        self.dias_exportacion = dias_exportacion
+        self.filas_importacion = filas_importacion
+        self.ruts_lote = ruts_lote
+        self.rng = random.Random(semilla)
+        self.semilla = semilla
+        self.usuario = usuario_sintetico()
+        self.cliente = Client()
+        self.cliente.force_login(self.usuario)
+
+    def medir(self, funcion, preparar=None):
+        tiempos = []
+        consultas = 0
+        for i in range(self.repeticiones):
+            if preparar:
+                preparar(i)
+            with CaptureQueriesContext(connection) as capturadas:
+                inicio = time.perf_counter()
+                funcion(i)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            consultas = len(capturadas)
+        return estadisticas(tiempos, consultas)
+
+    def _get(self, nombre, datos=None, metodo='get'):
+        respuesta = getattr(self.cliente, metodo)(reverse(nombre), datos or {})
+        if respuesta.status_code >= 400:
+            raise RuntimeError(f'{nombre} respondió {respuesta.status_code}')
+        return respuesta
+
+    def _muestra_madres(self, cantidad):
+        maximo = Madre.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        ids = [self.rng.randint(1, maximo) for _ in range(cantidad * 3)]
+        ruts = list(Madre.objects.filter(id__in=ids).values_list('rut', flat=True)[:cantidad])
+        return ruts or ['11.111.111-1']
+
+    def _exportar(self, vista, rango):
+        respuesta = self._get(vista, rango)
+        respuesta.close()
+        coincidencia = resolve(respuesta.url) if respuesta.status_code == 302 else None
+        if coincidencia is None or 'trabajo_id' not in coincidencia.kwargs:
+            return  # servido desde la caché
+        trabajo_id = coincidencia.kwargs['trabajo_id']
+        if tomar_trabajo(trabajo_id):
+            trabajo = ejecutar_trabajo(TrabajoExportacion.objects.get(pk=trabajo_id))
+            if trabajo.estado != 'completado':
+                raise RuntimeError(f'{vista}: {trabajo.error}')
+
+    def _vaciar_artefactos(self, _i):
+        shutil.rmtree(f'{settings.MEDIA_ROOT}/{CARPETA_ARTEFACTOS}', ignore_errors=True)
+
+    def medir_rutas(self):
+        hoy = timezone.localdate()
+        rango = {'start': (hoy - timedelta(days=self.dias_exportacion)).isoformat(), 'end': hoy.isoformat()}
+        ruts = self._muestra_madres(self.repeticiones)
+        lote = self._muestra_madres(self.ruts_lote)
+        apellidos = [apellido[:4] for apellido in self.rng.sample(APELLIDOS, min(len(APELLIDOS), self.repeticiones))]
+        total = Parto.objects.count()
+        profundo = (Parto.objects.order_by('-fecha_hora', '-id')
+                    .values_list('fecha_hora', 'id')[min(total - 1, total // 2)]) if total else None
+
+        generador = GeneradorSintetico(self.semilla, dias=2)
+        generador.excluir_ruts_existentes()
+        planillas = [planilla_importacion(generador, self.filas_importacion) for _ in range(self.repeticiones)]
+
+        rutas = {
+            'madre_lookup': self.medir(lambda i: self._get('registros:madre_lookup', {'rut': ruts[i % len(ruts)]})),
+            'madre_typeahead_nombre': self.medir(
+                lambda i: self._get('registros:madre_typeahead', {'q': apellidos[i % len(apellidos)]})),
+            'madre_typeahead_rut': self.medir(
+                lambda i: self._get('registros:madre_typeahead', {'q': ruts[i % len(ruts)][:6]})),
+            'madre_lookup_lote': self.medir(
+                lambda i: self._get('registros:madre_lookup_lote', {'ruts': '\n'.join(lote)}, metodo='post')),
+            'madre_lookup_uno_a_uno': self.medir(
+                lambda i: [self._get('registros:madre_lookup', {'rut': rut}) for rut in lote]),
+            'madre_indice': self.medir(lambda i: self._get('registros:madre_indice')),
+            'lista_partos': self.medir(lambda i: self._get('registros:lista_partos')),
+            'lista_partos_busqueda': self.medir(
+                lambda i: self._get('registros:lista_partos', {'q': apellidos[i % len(apellidos)]})),
+        }
+        if profundo:
+            cursor = codificar_cursor(profundo[0], profundo[1], 'sig')
+            rutas['lista_partos_pagina_profunda'] = self.medir(
+                lambda i: self._get('registros:lista_partos', {'cursor': cursor}))
+        rutas['exportar_partos'] = self.medir(
+            lambda i: self._exportar('registros:exportar_partos', rango), preparar=self._vaciar_artefactos)
+        rutas['exportar_partos_pdf'] = self.medir(
+            lambda i: self._exportar('registros:exportar_partos_pdf', rango), preparar=self._vaciar_artefactos)
+        rutas['reporte_rem'] = self.medir(
+            lambda i: self._get('registros:reporte_rem', {
+                'fecha_inicio': rango['start'], 'fecha_fin': rango['end'],
+                'tipo_reporte': ('bs22', 'a09', 'a04')[i % 3], 'formato': 'html',
+            }, metodo='post'),
+            preparar=lambda i: marcar_cambio(),
+        )
+        rutas['importar_datos_excel'] = self.medir(
+            lambda i: importar_datos_excel(BytesIO(planillas[i]), self.usuario))
+        return rutas
+
+    def ejecutar(self, tamanos, progreso=None):
+        """Completa los datos hasta cada tamaño (en partos) y mide las rutas. Devuelve el dict del informe."""
+        if hay_datos_reales():
+            raise BaseNoSintetica('La base tiene madres que no son sintéticas.')
+        media = tempfile.mkdtemp(prefix='benchmark_media_')
+        resultados = []
+        try:
+            with override_settings(ALLOWED_HOSTS=['testserver', *settings.ALLOWED_HOSTS],
+                                   SECURE_SSL_REDIRECT=False, MEDIA_ROOT=media):
+                for indice, tamano in enumerate(sorted(tamanos)):
+                    faltan = tamano - Parto.objects.count()
+                    inicio = time.perf_counter()
+                    if faltan > 0:
+                        semilla = None if self.semilla is None else self.semilla + indice
+                        generar_datos(faltan, semilla=semilla)
+                    generacion_s = time.perf_counter() - inicio
+                    if progreso:
+                        progreso(f'{tamano} partos: datos listos en {generacion_s:.1f} s; midiendo')
+                    resultados.append({
+                        'tamano': tamano,
+                        'partos': Parto.objects.count(),
+                        'madres': Madre.objects.count(),
+                        'generacion_s': round(generacion_s, 2),
+                        'rutas': self.medir_rutas(),
+                    })
+        finally:
+            shutil.rmtree(media, ignore_errors=True)
+        return {
+            'fecha': timezone.now().isoformat(),
+            'motor': connection.vendor,
+            'parametros': {
+                'repeticiones': self.repeticiones,
+                'dias_exportacion': self.dias_exportacion,
+                'filas_importacion': self.filas_importacion,
+                'ruts_lote': self.ruts_lote,
+                'semilla': self.semilla,
+            },
+            'resultados': resultados,
+        }
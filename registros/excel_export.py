@@ -1,164 +1,180 @@
-from django.http import HttpResponse
-from io import BytesIO
+import tempfile
 from datetime import datetime
+
+from django.http import FileResponse
 from django.utils import timezone
 
+from .artefactos import nombre_descarga
+
+# Partos leídos por consulta al recorrer el queryset con .iterator()
+CHUNK_PARTOS = 2000
+# Filas iniciales por hoja usadas para calcular el ancho de las columnas.
+# En un libro write-only las dimensiones de columna se escriben antes que los
+# datos, así que se mide una ventana acotada y luego se escribe en streaming.
+MUESTRA_ANCHOS = 500
+ANCHO_MAXIMO = 50
+
+COLUMNAS_MADRES = ['RUT', 'Nombres', 'Apellidos', 'Fecha Nacimiento', 'Edad', 'Estado Civil', 'Dirección', 'Teléfono', 'Previsión']
+COLUMNAS_PARTOS = ['RUT Madre', 'Fecha y Hora', 'Tipo Parto', 'Semanas Gestación', 'Tipo Anestesia', 'Complicaciones', 'Observaciones', 'Registrado por', 'Fecha Registro']
+COLUMNAS_RN = ['RUT Madre', 'Fecha Parto', 'Hora Nacimiento', 'Sexo', 'Peso (kg)', 'Talla (cm)', 'APGAR 1min', 'APGAR 5min', 'Estado', 'Observaciones']
+
+CONTENT_TYPE_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def _naive_local(valor):
+    """Excel no admite datetimes con zona horaria: convertir a hora local naive."""
+    if valor and isinstance(valor, datetime) and timezone.is_aware(valor):
+        return timezone.localtime(valor).replace(tzinfo=None)
+    return valor
+
+
+class HojaStreaming:
+    """Hoja de un libro write-only que ajusta el ancho de columnas mientras escribe.
+
+    Las primeras `muestra` filas se retienen para medir el ancho de cada
+    columna; al completarse la ventana se fijan las dimensiones y desde ahí
+    cada fila se escribe directamente, con memoria constante.
+    """
+    def __init__(self, libro, titulo, columnas, muestra=MUESTRA_ANCHOS):
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font
+
+        self.hoja = libro.create_sheet(titulo)
+        self.muestra = muestra
+        self.anchos = [len(c) for c in columnas]
+        encabezado = []
+        for columna in columnas:
+            celda = WriteOnlyCell(self.hoja, value=columna)
+            celda.font = Font(bold=True)
+            encabezado.append(celda)
+        self.pendientes = [encabezado]
+
+    def agregar(self, fila):
+        if self.pendientes is None:
+            self.hoja.append(fila)
+            return
+        for idx, valor in enumerate(fila):
+            if valor is not None:
+                self.anchos[idx] = max(self.anchos[idx], len(str(valor)))
+        self.pendientes.append(fila)
+        if len(self.pendientes) > self.muestra:
+            self._volcar()
+
+    def _volcar(self):
+        from openpyxl.utils import get_column_letter
+
+        for idx, ancho in enumerate(self.anchos, 1):
+            self.hoja.column_dimensions[get_column_letter(idx)].width = min(ancho + 2, ANCHO_MAXIMO)
+        for fila in self.pendientes:
+            self.hoja.append(fila)
+        self.pendientes = None
+
+    def cerrar(self):
+        if self.pendientes is not None:
+            self._volcar()
+
+
+def partos_para_exportar(fecha_inicio=None, fecha_fin=None):
+    from .models import Parto
+
+    partos = Parto.objects.select_related('madre', 'created_by').prefetch_related('recien_nacidos').order_by('-fecha_hora')
+    if fecha_inicio and fecha_fin:
+        partos = partos.en_rango(fecha_inicio, fecha_fin)
+    return partos
+
+
+def escribir_excel_partos(destino, fecha_inicio=None, fecha_fin=None, chunk_size=CHUNK_PARTOS, muestra=MUESTRA_ANCHOS):
+    """Escribe el libro de partos (hojas Madres, Partos y Recién Nacidos) en `destino`.
+
+    `destino` puede ser una ruta o un archivo binario. Los partos se leen con
+    `.iterator(chunk_size=...)` y las hojas se escriben en modo write-only, por
+    lo que la memoria usada no depende del número de registros.
+    """
+    from openpyxl import Workbook
+
+    libro = Workbook(write_only=True)
+    hoja_madres = HojaStreaming(libro, 'Madres', COLUMNAS_MADRES, muestra)
+    hoja_partos = HojaStreaming(libro, 'Partos', COLUMNAS_PARTOS, muestra)
+    hoja_rn = HojaStreaming(libro, 'Recién Nacidos', COLUMNAS_RN, muestra)
+
+    for parto in partos_para_exportar(fecha_inicio, fecha_fin).iterator(chunk_size=chunk_size):
+        madre = parto.madre
+        try:
+            edad = (parto.fecha_hora.date() - madre.fecha_nacimiento).days // 365
+        except Exception:
+            edad = None
+        hoja_madres.agregar([
+            madre.rut,
+            madre.nombres,
+            madre.apellidos,
+            madre.fecha_nacimiento,
+            edad,
+            madre.estado_civil,
+            madre.direccion,
+            madre.telefono,
+            madre.prevision,
+        ])
+
+        if parto.created_by:
+            registrado_por = parto.created_by.get_full_name() or parto.created_by.username
+        else:
+            registrado_por = 'Sistema'
+        hoja_partos.agregar([
+            madre.rut,
+            _naive_local(parto.fecha_hora),
+            parto.tipo_parto,
+            parto.semanas_gestacion,
+            parto.tipo_anestesia,
+            parto.complicaciones or '',
+            parto.observaciones or '',
+            registrado_por,
+            _naive_local(parto.created_at),
+        ])
+
+        for rn in parto.recien_nacidos.all():
+            hoja_rn.agregar([
+                madre.rut,
+                parto.fecha_hora.date(),
+                rn.hora_nacimiento,
+                'Masculino' if rn.sexo == 'M' else 'Femenino',
+                float(rn.peso) if rn.peso else None,
+                float(rn.talla) if rn.talla else None,
+                rn.apgar_1,
+                rn.apgar_5,
+                rn.estado,
+                rn.observaciones or '',
+            ])
+
+    for hoja in (hoja_madres, hoja_partos, hoja_rn):
+        hoja.cerrar()
+    libro.save(destino)
+
+
+def nombre_archivo_excel(fecha_inicio=None, fecha_fin=None):
+    if fecha_inicio and fecha_fin:
+        return f'Registros_Partos_{fecha_inicio}_{fecha_fin}.xlsx'
+    return 'Registros_Partos_Completo.xlsx'
 
 
 def exportar_datos_excel(fecha_inicio=None, fecha_fin=None):
     """
     Exporta todos los datos de partos y recién nacidos a un archivo Excel
-    con múltiples hojas y formato mejorado.
-    Si fecha_inicio y fecha_fin son None, exporta todos los partos.
+    con múltiples hojas. Si fecha_inicio y fecha_fin son None, exporta todos
+    los partos (sin límite de filas).
+
+    El libro se escribe en un archivo temporal y se entrega con FileResponse,
+    que lo envía por bloques y lo cierra (y elimina) al terminar.
     """
-    # Import pandas lazily so tests that don't call export don't require it
+    archivo = tempfile.TemporaryFile()
     try:
-        import pandas as pd
+        escribir_excel_partos(archivo, fecha_inicio, fecha_fin)
     except Exception:
-        return HttpResponse('Export unavailable: pandas not installed', status=500)
-
-    # Import models here to avoid touching Django settings at module import time
-    from .models import Madre, Parto, RecienNacido
-
-    # Crear un archivo Excel con múltiples hojas
-    output = BytesIO()
-    # Use a context manager for ExcelWriter to ensure resources are flushed/closed
-    # and be compatible with different pandas/openpyxl versions.
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        # Obtener los datos - evaluar el queryset para asegurarse de que se ejecute
-        partos_qs = Parto.objects.select_related('madre', 'created_by').prefetch_related('recien_nacidos').order_by('-fecha_hora')
-        
-        # Filtrar por fecha solo si se proporcionaron fechas válidas
-        if fecha_inicio and fecha_fin:
-            partos = partos_qs.filter(
-                fecha_hora__date__range=[fecha_inicio, fecha_fin]
-            )
-        else:
-            # Si no hay fechas, exportar todos los partos
-            partos = partos_qs
-        
-        # Evaluar el queryset para obtener la lista (limitar a 10000 para evitar problemas de memoria)
-        partos_list = list(partos[:10000])
-        
-        # Datos de las madres
-        datos_madres = []
-        for parto in partos_list:
-            try:
-                edad = (parto.fecha_hora.date() - parto.madre.fecha_nacimiento).days // 365
-            except:
-                edad = None
-            datos_madres.append({
-                'RUT': parto.madre.rut,
-                'Nombres': parto.madre.nombres,
-                'Apellidos': parto.madre.apellidos,
-                'Fecha Nacimiento': parto.madre.fecha_nacimiento,
-                'Edad': edad,
-                'Estado Civil': parto.madre.estado_civil,
-                'Dirección': parto.madre.direccion,
-                'Teléfono': parto.madre.telefono,
-                'Previsión': parto.madre.prevision
-            })
-
-        # Datos de los partos
-        datos_partos = []
-        for parto in partos_list:
-            # Convertir datetime con timezone a naive datetime para Excel
-            fecha_hora_naive = parto.fecha_hora
-            if timezone.is_aware(fecha_hora_naive):
-                # Convertir a la zona horaria local y luego a naive
-                fecha_hora_naive = timezone.localtime(fecha_hora_naive).replace(tzinfo=None)
-            
-            created_at_naive = parto.created_at
-            if timezone.is_aware(created_at_naive):
-                # Convertir a la zona horaria local y luego a naive
-                created_at_naive = timezone.localtime(created_at_naive).replace(tzinfo=None)
-            
-            datos_partos.append({
-                'RUT Madre': parto.madre.rut,
-                'Fecha y Hora': fecha_hora_naive,
-                'Tipo Parto': parto.tipo_parto,
-                'Semanas Gestación': parto.semanas_gestacion,
-                'Tipo Anestesia': parto.tipo_anestesia,
-                'Complicaciones': parto.complicaciones or '',
-                'Observaciones': parto.observaciones or '',
-                'Registrado por': parto.created_by.get_full_name() if parto.created_by and parto.created_by.get_full_name() else (parto.created_by.username if parto.created_by else 'Sistema'),
-                'Fecha Registro': created_at_naive
-            })
-
-        # Datos de recién nacidos
-        datos_rn = []
-        for parto in partos_list:
-            for rn in parto.recien_nacidos.all():
-                # Convertir hora_nacimiento a naive si es datetime con timezone
-                hora_nacimiento_naive = rn.hora_nacimiento
-                if hora_nacimiento_naive and timezone.is_aware(hora_nacimiento_naive):
-                    # Convertir a la zona horaria local y luego a naive
-                    hora_nacimiento_naive = timezone.localtime(hora_nacimiento_naive).replace(tzinfo=None)
-                
-                datos_rn.append({
-                    'RUT Madre': parto.madre.rut,
-                    'Fecha Parto': parto.fecha_hora.date(),
-                    'Hora Nacimiento': hora_nacimiento_naive,
-                    'Sexo': 'Masculino' if rn.sexo == 'M' else 'Femenino',
-                    'Peso (kg)': float(rn.peso) if rn.peso else None,
-                    'Talla (cm)': float(rn.talla) if rn.talla else None,
-                    'APGAR 1min': rn.apgar_1,
-                    'APGAR 5min': rn.apgar_5,
-                    'Estado': rn.estado,
-                    'Observaciones': rn.observaciones or ''
-                })
-
-        # Crear DataFrames - usar columnas definidas si están vacíos
-        if datos_madres:
-            df_madres = pd.DataFrame(datos_madres)
-        else:
-            df_madres = pd.DataFrame(columns=['RUT', 'Nombres', 'Apellidos', 'Fecha Nacimiento', 'Edad', 'Estado Civil', 'Dirección', 'Teléfono', 'Previsión'])
-        
-        if datos_partos:
-            df_partos = pd.DataFrame(datos_partos)
-        else:
-            df_partos = pd.DataFrame(columns=['RUT Madre', 'Fecha y Hora', 'Tipo Parto', 'Semanas Gestación', 'Tipo Anestesia', 'Complicaciones', 'Observaciones', 'Registrado por', 'Fecha Registro'])
-        
-        if datos_rn:
-            df_rn = pd.DataFrame(datos_rn)
-        else:
-            df_rn = pd.DataFrame(columns=['RUT Madre', 'Fecha Parto', 'Hora Nacimiento', 'Sexo', 'Peso (kg)', 'Talla (cm)', 'APGAR 1min', 'APGAR 5min', 'Estado', 'Observaciones'])
-
-        # Guardar en diferentes hojas
-        df_madres.to_excel(writer, sheet_name='Madres', index=False)
-        df_partos.to_excel(writer, sheet_name='Partos', index=False)
-        df_rn.to_excel(writer, sheet_name='Recién Nacidos', index=False)
-
-        # Ajustar el ancho de las columnas en cada hoja
-        for sheet_name in writer.sheets:
-            worksheet = writer.sheets[sheet_name]
-            for idx, col in enumerate(worksheet.columns, 1):
-                max_length = 0
-                column = worksheet.column_dimensions[worksheet.cell(row=1, column=idx).column_letter]
-                for cell in col:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(cell.value)
-                    except Exception:
-                        pass
-                adjusted_width = (max_length + 2)
-                column.width = min(adjusted_width, 50)  # Máximo 50 caracteres de ancho
-
-    # Después del context manager el escritor ha sido cerrado y el buffer contiene los datos
-    output.seek(0)
-
-    # Crear la respuesta HTTP
-    response = HttpResponse(
-        output.getvalue(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        archivo.close()
+        raise
+    archivo.seek(0)
+    return FileResponse(
+        archivo,
+        as_attachment=True,
+        filename=nombre_descarga(nombre_archivo_excel(fecha_inicio, fecha_fin)),
+        content_type=CONTENT_TYPE_XLSX,
     )
-    
-    # Generar nombre de archivo
-    if fecha_inicio and fecha_fin:
-        filename = f'Registros_Partos_{fecha_inicio}_{fecha_fin}.xlsx'
-    else:
-        filename = f'Registros_Partos_Completo_{datetime.now().strftime("%Y%m%d")}.xlsx'
-    
-    response['Content-Disposition'] = f'attachment; filename={filename}'
-    
-    return response
\ No newline at end of file
@@ -0,0 +1,203 @@
+"""Cola de exportaciones en segundo plano respaldada por la base de datos.
+
+Las vistas encolan un `TrabajoExportacion`; el comando
+`manage.py procesar_exportaciones` los toma uno a uno, genera el archivo en
+MEDIA_ROOT y marca el trabajo como completado (o con error). Lo generado
+queda además en la caché de `registros.artefactos` para servir las descargas
+repetidas sin regenerar.
+
+El worker corre en el mismo contenedor que la web, para compartir
+MEDIA_ROOT, dentro de un bucle que lo vuelve a levantar si termina (Procfile,
+render.yaml, Dockerfile). Deja un latido en `VersionDatos` (clave
+CLAVE_LATIDO_WORKER). Si el worker cae, la página de estado de la exportación
+marca con error los trabajos pendientes en vez de dejarlos esperando para
+siempre (`vencer_pendientes`).
+"""
+import logging
+import tempfile
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db.models import F
+from django.utils import timezone
+
+from .artefactos import buscar_artefacto, clave_artefacto, copiar_artefacto, guardar_artefacto
+from .models import TrabajoExportacion, VersionDatos
+from .versiones import marcar_cambio
+
+logger = logging.getLogger(__name__)
+
+CLAVE_LATIDO_WORKER = 'worker_exportaciones'
+MINUTOS_COLGADO = 30
+
+
+def _fecha(valor):
+    return date.fromisoformat(valor) if valor else None
+
+
+def _generar_excel(destino, parametros):
+    from .excel_export import escribir_excel_partos, nombre_archivo_excel
+    fecha_inicio, fecha_fin = _fecha(parametros.get('fecha_inicio')), _fecha(parametros.get('fecha_fin'))
+    escribir_excel_partos(destino, fecha_inicio, fecha_fin)
+    return nombre_archivo_excel(fecha_inicio, fecha_fin)
+
+
+def _generar_pdf(destino, parametros):
+    from .pdf_export import generar_pdf_partos, nombre_archivo_pdf
+    fecha_inicio, fecha_fin = _fecha(parametros.get('fecha_inicio')), _fecha(parametros.get('fecha_fin'))
+    if generar_pdf_partos(destino, fecha_inicio, fecha_fin):
+        raise RuntimeError('xhtml2pdf reportó errores al generar el PDF.')
+    return nombre_archivo_pdf(fecha_inicio, fecha_fin)
+
+
+def _generar_rem(destino, parametros):
+    from .utils import GeneradorREM
+    fecha_inicio, fecha_fin = _fecha(parametros['fecha_inicio']), _fecha(parametros['fecha_fin'])
+    destino.write(GeneradorREM(fecha_inicio, fecha_fin).exportar_excel())
+    tipo_reporte = parametros.get('tipo_reporte', 'rem')
+    return f'REM_{tipo_reporte}_{fecha_inicio}_{fecha_fin}.xlsx'
+
+
+GENERADORES = {
+    'excel': _generar_excel,
+    'pdf': _generar_pdf,
+    'rem': _generar_rem,
+}
+
+
+def encolar_exportacion(tipo, parametros, usuario=None):
+    """Crea un trabajo pendiente. Si las exportaciones en segundo plano están
+    desactivadas (EXPORTACIONES_EN_SEGUNDO_PLANO = False) lo ejecuta de inmediato."""
+    if tipo not in GENERADORES:
+        raise ValueError(f'Tipo de exportación desconocido: {tipo}')
+    trabajo = TrabajoExportacion.objects.create(
+        tipo=tipo,
+        parametros=parametros,
+        created_by=usuario if usuario is not None and usuario.is_authenticated else None,
+    )
+    if not getattr(settings, 'EXPORTACIONES_EN_SEGUNDO_PLANO', True):
+        if tomar_trabajo(trabajo.pk):
+            trabajo.refresh_from_db()
+            ejecutar_trabajo(trabajo)
+    return trabajo
+
+
+def tomar_trabajo(trabajo_id):
+    """Reclama un trabajo pendiente con un UPDATE condicional. True si este proceso lo obtuvo."""
+    return TrabajoExportacion.objects.filter(pk=trabajo_id, estado='pendiente').update(
+        estado='procesando',
+        started_at=timezone.now(),
+        intentos=F('intentos') + 1,
+    ) == 1
+
+
+def tomar_siguiente_trabajo():
+    """Devuelve el trabajo pendiente más antiguo ya reclamado, o None si la cola está vacía."""
+    candidatos = TrabajoExportacion.objects.filter(estado='pendiente').order_by('created_at', 'pk')
+    for trabajo_id in candidatos.values_list('pk', flat=True)[:10]:
+        if tomar_trabajo(trabajo_id):
+            return TrabajoExportacion.objects.get(pk=trabajo_id)
+    return None
+
+
+def ejecutar_trabajo(trabajo):
+    """Genera el archivo del trabajo (ya reclamado) y lo guarda en MEDIA_ROOT."""
+    generador = GENERADORES[trabajo.tipo]
+    parametros = trabajo.parametros or {}
+    try:
+        # El sello se calcula antes de generar: si los datos cambian mientras
+        # tanto, el artefacto queda con el sello viejo y no se reutiliza.
+        clave = clave_artefacto(trabajo.tipo, parametros)
+        artefacto = buscar_artefacto(trabajo.tipo, parametros, clave)
+        with tempfile.TemporaryFile() as temporal:
+            if artefacto is not None:
+                copiar_artefacto(artefacto, temporal)
+                nombre = artefacto.nombre
+            else:
+                nombre = generador(temporal, parametros)
+                temporal.seek(0)
+                try:
+                    guardar_artefacto(clave, temporal, nombre)
+                except OSError:
+                    logger.warning('No se pudo guardar en caché la exportación %s', trabajo.pk)
+            temporal.seek(0)
+            trabajo.archivo.save(nombre, File(temporal), save=False)
+        trabajo.nombre_archivo = nombre
+        trabajo.estado = 'completado'
+        trabajo.error = ''
+    except Exception as e:
+        logger.exception('Error procesando exportación %s', trabajo.pk)
+        trabajo.estado = 'error'
+        trabajo.error = str(e)
+    trabajo.finished_at = timezone.now()
+    trabajo.save(update_fields=['archivo', 'nombre_archivo', 'estado', 'error', 'finished_at'])
+    return trabajo
+
+
+def latido_worker():
+    """Lo llama el worker mientras está vivo (entre trabajos y con la cola vacía)."""
+    marcar_cambio(CLAVE_LATIDO_WORKER)
+
+
+def worker_activo():
+    """True si el worker dio señales en los últimos EXPORTACIONES_SIN_WORKER_MINUTOS.
+
+    Durante un trabajo largo no hay latidos: cuenta también un trabajo en
+    proceso que todavía no se considera colgado.
+    """
+    ahora = timezone.now()
+    silencio = ahora - timedelta(minutes=settings.EXPORTACIONES_SIN_WORKER_MINUTOS)
+    if VersionDatos.objects.filter(clave=CLAVE_LATIDO_WORKER, actualizado__gte=silencio).exists():
+        return True
+    return TrabajoExportacion.objects.filter(
+        estado='procesando', started_at__gte=ahora - timedelta(minutes=MINUTOS_COLGADO)
+    ).exists()
+
+
+def pendiente_vencido(trabajo):
+    """True si el trabajo lleva pendiente más de EXPORTACIONES_SIN_WORKER_MINUTOS (sin consultar la base)."""
+    limite = timezone.now() - timedelta(minutes=settings.EXPORTACIONES_SIN_WORKER_MINUTOS)
+    return trabajo.estado == 'pendiente' and trabajo.created_at < limite
+
+
+def vencer_pendientes(trabajos=None):
+    """Marca con error los trabajos pendientes antiguos si no hay worker activo. Devuelve cuántos."""
+    if worker_activo():
+        return 0
+    trabajos = TrabajoExportacion.objects.all() if trabajos is None else trabajos
+    limite = timezone.now() - timedelta(minutes=settings.EXPORTACIONES_SIN_WORKER_MINUTOS)
+    return trabajos.filter(estado='pendiente', created_at__lt=limite).update(
+        estado='error',
+        error='No hay un worker de exportaciones activo. Vuelva a solicitar la exportación más tarde.',
+        finished_at=timezone.now(),
+    )
+
+
+def liberar_trabajos_colgados(minutos=MINUTOS_COLGADO, max_intentos=3):
+    """Devuelve a la cola los trabajos cuyo worker murió a mitad de proceso."""
+    limite = timezone.now() - timedelta(minutes=minutos)
+    colgados = TrabajoExportacion.objects.filter(estado='procesando', started_at__lt=limite)
+    fallidos = colgados.filter(intentos__gte=max_intentos).update(
+        estado='error', error='El trabajo excedió el tiempo máximo de proceso.', finished_at=timezone.now()
+    )
+    reencolados = colgados.filter(intentos__lt=max_intentos).update(estado='pendiente')
+    return reencolados, fallidos
+
+
+def purgar_exportaciones_antiguas(dias=None):
+    """Elimina trabajos terminados (y sus archivos) más antiguos que `dias`."""
+    if dias is None:
+        dias = getattr(settings, 'EXPORTACIONES_RETENCION_DIAS', 7)
+    limite = timezone.now() - timedelta(days=dias)
+    antiguos = TrabajoExportacion.objects.filter(estado__in=['completado', 'error'], created_at__lt=limite)
+    total = 0
+    for trabajo in antiguos.iterator():
+        if trabajo.archivo:
+            try:
+                trabajo.archivo.delete(save=False)
+            except OSError:
+                logger.warning('No se pudo eliminar %s', trabajo.archivo.name)
+        trabajo.delete()
+        total += 1
+    return total
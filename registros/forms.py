@@ -46,9 +46,10 @@ class MadreFormSimple(forms.ModelForm):
             if validate_rut(clean):
                 # Formatear a formato estándar con puntos
                 formatted = format_rut(clean)
-                # Verificar si ya existe
-                if Madre.objects.filter(rut=formatted).exists():
+                # Verificar si ya existe (por la clave normalizada, indexada)
+                if Madre.objects.filter(rut_normalizado=clean).exists():
                     raise forms.ValidationError('Ya existe una madre con ese RUT.')
+                self.instance.rut_normalizado = clean
                 return formatted
             else:
                 raise forms.ValidationError('El dígito verificador no es válido.')
@@ -101,6 +102,7 @@ class MadreForm(forms.ModelForm):
             clean = re.sub(r'[^0-9kK]', '', raw).upper()
             if not validate_rut(clean):
                 raise forms.ValidationError('El dígito verificador no coincide. Revise el último dígito del RUT')
+            self.instance.rut_normalizado = clean
             return raw
 
         # Si no está formateado, intentamos formatearlo
@@ -123,6 +125,7 @@ class MadreForm(forms.ModelForm):
             # Si el formato resultante no coincide con el patrón esperado
             if not re.match(r'^\d{1,2}\.\d{3}\.\d{3}-[\dkK]$', formatted):
                 raise forms.ValidationError('El formato del RUT debe ser XX.XXX.XXX-X (por ejemplo: 12.345.678-9)')
+            self.instance.rut_normalizado = clean
             return formatted
             
         raise forms.ValidationError('El dígito verificador no coincide. Revise el último dígito del RUT')
@@ -393,16 +396,9 @@ class PartoForm(forms.ModelForm):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # Configurar queryset para profesional_a_cargo
-        from cuentas.models import Usuario
-        self.fields['profesional_a_cargo'].queryset = Usuario.objects.filter(is_active=True)
-        
-        # Prellenar profesional_a_cargo_display si hay un profesional seleccionado
-        if self.instance and self.instance.pk and self.instance.profesional_a_cargo:
-            prof = self.instance.profesional_a_cargo
-            area = prof.rol.nombre if prof.rol else 'Sin área'
-            self.initial['profesional_a_cargo_display'] = f"{prof.first_name or ''} {prof.last_name or ''} - {prof.run or ''} ({area})".strip()
-        
+        # profesional_a_cargo es texto libre (el buscador de /api/profesionales/ lo completa
+        # en el navegador con nombre, RUN y área): no hay usuario ni rol que cargar aquí.
+
         # Convertir valores booleanos existentes a strings para los ChoiceFields
         if self.instance and self.instance.pk:
             if self.instance.monitor is not None:
@@ -1,260 +1,715 @@
+import hashlib
+import json
+import os
+import pickle
+import re
+import time
 import pandas as pd
+from django.conf import settings
 from django.utils import timezone
-from datetime import datetime, timedelta
-from .models import Madre, Parto, RecienNacido
-from django.db import transaction
+from datetime import date
+from .models import Madre, Parto, PerfilImportacion, RecienNacido
+from .resumen import fecha_local, recalcular_dias
+from .search import actualizar_documentos
+from .utils import format_rut, ruts_en_lote
+from .versiones import marcar_cambio
+from django.db import connection, transaction
+from django.db.models import F
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Filas del Excel escritas por lote (una transacción y ~6 consultas por lote)
+CHUNK_IMPORTACION = 500
+# Filas de la hoja revisadas para encontrar la cabecera
+FILAS_DETECCION_CABECERA = 20
+# Las planillas suelen declarar un rango usado de ~1M filas con formato vacío;
+# la lectura se corta tras esta cantidad de filas vacías consecutivas.
+MAX_FILAS_VACIAS = 50
+MAX_ERRORES = 20
+# Fecha de nacimiento de una madre nueva cuya fila no trae edad
+FECHA_NACIMIENTO_DESCONOCIDA = date(2000, 1, 1)
+# Análisis cacheados en MEDIA_ROOT/<carpeta>/<sha256>-v<versión>.pkl; subir la
+# versión al cambiar el formato de las filas normalizadas invalida el caché.
+CARPETA_CACHE_IMPORTACION = 'import_cache'
+VERSION_ANALISIS = 4
+
+KEYWORDS_CABECERA = ["NOMBRE", "RUT", "RUN", "EDAD", "PARTO", "PESO", "FECHA", "HORA", "MATRONA", "DIAGNOSTICO"]
+
+# Campo -> palabras clave en orden de prioridad (la primera que aparezca gana)
+KEYWORDS_COLUMNAS = {
+    'rut': ["RUT", "RUN", "IDENTIFICACION"],
+    'dv': ["DV", "DIGITO VERIFICADOR"],
+    'nombre': ["NOMBRE COMPLETO", "NOMBRE PACIENTE", "NOMBRE"],
+    'edad': ["EDAD"],
+    'fecha': ["FECHA PARTO", "FECHA DE PARTO", "FECHA"],
+    'hora': ["HORA PARTO", "HORA DE PARTO", "HORA"],
+    'comuna': ["COMUNA", "PROCEDENCIA", "DOMICILIO"],
+    'tipo_parto': ["TIPO DE PARTO", "VIA DE PARTO", "TIPO PARTO"],
+    'sexo': ["SEXO RN", "SEXO", "GENERO"],
+    'peso': ["PESO RN", "PESO"],
+    'talla': ["TALLA RN", "TALLA"],
+    'apgar1': ["APGAR 1", "APGAR AL MINUTO"],
+    'apgar5': ["APGAR 5", "APGAR A LOS 5"],
+    'semanas': ["EDAD GESTACIONAL", "SEMANAS", "EG"],
+}
+# Palabras clave muy cortas: solo cuentan si son el nombre completo de la columna
+KEYWORDS_EXACTAS = {"DV", "EG"}
+
 def normalize_col(name):
     """Normaliza el nombre de la columna para facilitar el matching."""
     if not isinstance(name, str):
         return str(name)
-    return name.upper().strip().replace('\n', ' ').replace('.', '')
+    return ' '.join(name.upper().replace('.', '').split())
 
 def find_col(columns, keywords):
-    """Busca una columna que contenga alguna de las palabras clave."""
-    for col in columns:
-        norm = normalize_col(col)
-        for kw in keywords:
-            if kw in norm:
+    """Busca la primera columna que contenga alguna palabra clave,
+    respetando el orden de prioridad de `keywords`."""
+    for kw in keywords:
+        for col in columns:
+            norm = normalize_col(col)
+            if norm == kw or (kw not in KEYWORDS_EXACTAS and kw in norm):
                 return col
     return None
 
-def parse_datetime_smart(date_val, time_val=None):
-    """Intenta parsear fecha y hora de varias fuentes."""
-    fecha_dt = timezone.now()
-    
-    # 1. Intentar parsear fecha
-    if pd.notna(date_val):
-        try:
-            if isinstance(date_val, datetime):
-                fecha_dt = date_val
-            else:
-                # Intentar formatos comunes
-                str_val = str(date_val).strip()
-                for fmt in ['%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%Y/%m/%d']:
-                    try:
-                        fecha_dt = datetime.strptime(str_val, fmt)
-                        break
-                    except:
-                        continue
-        except:
-            pass
-
-    # 2. Intentar parsear hora y combinar
-    if pd.notna(time_val):
+def _filas_hoja(hoja, max_filas_vacias):
+    filas = []
+    vacias = 0
+    for fila in hoja.iter_rows(values_only=True):
+        if any(v is not None and str(v).strip() != '' for v in fila):
+            filas.extend([()] * vacias)
+            vacias = 0
+            filas.append(fila)
+        else:
+            vacias += 1
+            if vacias >= max_filas_vacias:
+                break
+    return pd.DataFrame(filas).dropna(axis=1, how='all')
+
+def leer_hojas(file, max_filas_vacias=MAX_FILAS_VACIAS):
+    """Lee todas las hojas sin cabecera: lista de `(nombre, DataFrame de valores crudos)`.
+
+    Los .xlsx se recorren con openpyxl en modo read-only y la lectura de cada
+    hoja se detiene tras `max_filas_vacias` filas vacías seguidas; otros
+    formatos (.xls) se leen con pandas.
+    """
+    import zipfile
+    from openpyxl import load_workbook
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    try:
+        libro = load_workbook(file, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException):
+        file.seek(0)
+        return list(pd.read_excel(file, header=None, sheet_name=None).items())
+
+    try:
+        return [(hoja.title, _filas_hoja(hoja, max_filas_vacias)) for hoja in libro.worksheets]
+    finally:
+        libro.close()
+
+def detectar_cabecera(df_raw, filas=FILAS_DETECCION_CABECERA):
+    """Índice de la fila (entre las primeras `filas`) con más palabras clave de cabecera."""
+    header_row = 0
+    max_matches = 0
+    for i, row in df_raw.head(filas).iterrows():
+        row_str = " ".join([str(v).upper() for v in row.values if pd.notna(v)])
+        matches = sum(1 for kw in KEYWORDS_CABECERA if kw in row_str)
+        if matches > max_matches:
+            max_matches = matches
+            header_row = i
+    return header_row
+
+def detectar_columnas(columnas):
+    """Mapeo campo -> nombre de columna del Excel (None si no se encontró)."""
+    return {
+        campo: find_col(columnas, keywords)
+        for campo, keywords in KEYWORDS_COLUMNAS.items()
+    }
+
+def celdas_cabecera(fila):
+    """Celdas normalizadas de una fila candidata a cabecera ('' las vacías, sin las vacías finales)."""
+    celdas = ['' if pd.isna(v) or str(v).strip() == '' else normalize_col(v) for v in fila]
+    while celdas and celdas[-1] == '':
+        celdas.pop()
+    return celdas
+
+def huella_cabecera(celdas):
+    """sha256 de las celdas de la cabecera; None si la fila tiene menos de dos celdas con texto."""
+    if sum(1 for c in celdas if c) < 2:
+        return None
+    return hashlib.sha256(json.dumps(celdas, ensure_ascii=False).encode()).hexdigest()
+
+def analizar_cabeceras(hojas, guardar=True):
+    """Fila de cabecera y mapeo de columnas de cada hoja no vacía.
+
+    Se calcula la huella de las primeras FILAS_DETECCION_CABECERA filas de
+    cada hoja y se buscan todas en una sola consulta: si alguna coincide con
+    un `PerfilImportacion`, se usan su fila y su mapeo tal cual. Si no, se
+    detectan con las palabras clave y, con `guardar`, el resultado queda como
+    perfil sin confirmar (solo si se encontró la columna de RUT).
+
+    Devuelve una lista de dicts con `nombre`, `df_raw`, `header_row` (índice
+    desde 0), `encabezados`, `huella`, `columnas`, `confirmado` y
+    `desde_perfil`.
+    """
+    candidatas = []
+    for nombre, df_raw in hojas:
+        if df_raw.empty:
+            continue
+        huellas = {}  # huella -> fila, en orden de aparición
+        for i, fila in df_raw.head(FILAS_DETECCION_CABECERA).iterrows():
+            huella = huella_cabecera(celdas_cabecera(fila.values))
+            if huella is not None:
+                huellas.setdefault(huella, i)
+        candidatas.append((nombre, df_raw, huellas))
+
+    todas = {huella for _, _, huellas in candidatas for huella in huellas}
+    perfiles = {p.huella: p for p in PerfilImportacion.objects.filter(huella__in=todas)} if todas else {}
+
+    resultado = []
+    usados = set()
+    nuevos = {}
+    for nombre, df_raw, huellas in candidatas:
+        huella = next((h for h in huellas if h in perfiles), None)
+        if huella is not None:
+            perfil = perfiles[huella]
+            usados.add(perfil.pk)
+            header_row = huellas[huella]
+            columnas = {campo: perfil.columnas.get(campo) for campo in KEYWORDS_COLUMNAS}
+        else:
+            perfil = None
+            header_row = detectar_cabecera(df_raw)
+            columnas = detectar_columnas([normalize_col(c) for c in df_raw.iloc[header_row]])
+        encabezados = celdas_cabecera(df_raw.iloc[header_row].values)
+        if perfil is None:
+            huella = huella_cabecera(encabezados)
+            if huella is not None and columnas['rut'] is not None:
+                nuevos.setdefault(huella, PerfilImportacion(
+                    huella=huella, encabezados=encabezados, columnas=columnas, usos=1))
+        resultado.append({
+            'nombre': nombre,
+            'df_raw': df_raw,
+            'header_row': header_row,
+            'encabezados': encabezados,
+            'huella': huella,
+            'columnas': columnas,
+            'confirmado': perfil is not None and perfil.confirmado,
+            'desde_perfil': perfil is not None,
+        })
+    if guardar and usados:
+        PerfilImportacion.objects.filter(pk__in=usados).update(usos=F('usos') + 1)
+    if guardar and nuevos:
+        # Otro proceso pudo guardar el mismo formato entretanto: se conserva el suyo
+        PerfilImportacion.objects.bulk_create(nuevos.values(), ignore_conflicts=True)
+    return resultado
+
+def guardar_perfil(huella, encabezados, columnas, usuario=None):
+    """Guarda (o corrige) el mapeo confirmado para el formato de cabecera `huella`."""
+    perfil, _ = PerfilImportacion.objects.update_or_create(huella=huella, defaults={
+        'encabezados': encabezados,
+        'columnas': {campo: columnas.get(campo) for campo in KEYWORDS_COLUMNAS},
+        'confirmado': True,
+        'confirmado_por': usuario if usuario is not None and usuario.is_authenticated else None,
+    })
+    return perfil
+
+def ubicacion(fila_excel, hoja=None):
+    """'Fila N' o, en libros con varias hojas de datos, "Hoja 'X', fila N"."""
+    if hoja is None:
+        return f"Fila {fila_excel}"
+    return f"Hoja '{hoja}', fila {fila_excel}"
+
+def _columna(df, col):
+    if col is None:
+        return pd.Series(pd.NA, index=df.index, dtype='object')
+    return df[col]
+
+def _texto(serie):
+    """Texto limpio por celda; celdas vacías quedan como ''."""
+    texto = serie.astype('string').str.strip().fillna('')
+    return texto.mask(texto.str.lower().isin(['nan', 'nat', 'none']), '')
+
+def _numero(serie):
+    return pd.to_numeric(serie, errors='coerce')
+
+def _entero_con_defecto(serie, defecto, minimo=None, maximo=None):
+    numeros = _numero(serie)
+    if minimo is not None:
+        numeros = numeros.where((numeros >= minimo) & (numeros <= maximo))
+    return numeros.fillna(defecto).astype(int)
+
+def _ruts(df, columnas):
+    """RUT limpio (dígitos + DV, sin validar) por fila; une RUN y DV si vienen separados."""
+    rut = _columna(df, columnas['rut'])
+    numerico = _numero(rut)
+    rut_txt = _texto(rut).mask(numerico.notna(), numerico.round().astype('Int64').astype('string'))
+    if columnas['dv'] is not None:
+        dv = _texto(df[columnas['dv']])
+        dv = dv.mask(dv.str.endswith('.0'), dv.str[:-2])
+        rut_txt = rut_txt.mask((dv != '') & (rut_txt != ''), rut_txt + dv)
+    return rut_txt.str.upper().str.replace(r'[^0-9K]', '', regex=True)
+
+def _fechas_parto(df, columnas):
+    """Fecha y hora del parto como datetime con zona horaria (NaT si la fecha es inválida)."""
+    fecha_col = _columna(df, columnas['fecha'])
+    fecha = pd.to_datetime(fecha_col.mask(_texto(fecha_col) == ''),
+                           errors='coerce', dayfirst=True, format='mixed').dt.normalize()
+
+    hora_txt = _texto(_columna(df, columnas['hora'])).str.lower()
+    hora_txt = hora_txt.str.replace(r'\s*hrs?\.?$', '', regex=True)
+    hora = pd.to_datetime(hora_txt.mask(hora_txt == ''), errors='coerce', format='mixed')
+    fecha_hora = fecha + (hora - hora.dt.normalize()).fillna(pd.Timedelta(0))
+
+    if settings.USE_TZ:
+        fecha_hora = fecha_hora.dt.tz_localize(
+            timezone.get_current_timezone_name(), ambiguous=False, nonexistent='shift_forward'
+        )
+    return fecha_hora
+
+def _tipos_parto(df, columnas):
+    raw = _texto(_columna(df, columnas['tipo_parto'])).str.upper()
+    tipo = pd.Series('eutocico', index=df.index, dtype='object')
+    tipo = tipo.mask(raw.str.contains(r'FORCEPS|FÓRCEPS|DISTOCICO|DISTÓCICO', regex=True), 'distocico')
+    cesarea = raw.str.contains(r'CES', regex=False)
+    tipo = tipo.mask(cesarea, 'cesarea_urgencia')
+    return tipo.mask(cesarea & raw.str.contains('ELECTIV', regex=False), 'cesarea_electiva')
+
+def normalizar_filas(df, columnas, header_row=0, hoja=None):
+    """Convierte el DataFrame del Excel en registros listos para guardar.
+
+    Todo el parseo se hace con operaciones de columna de pandas. Devuelve
+    `(filas, errores)`: `filas` es una lista de dicts (uno por fila válida, con
+    su número de fila en el Excel en `fila_excel` y, si se indica, su `hoja`)
+    y `errores` la lista de mensajes de las filas descartadas. Las filas sin
+    RUT se omiten.
+    """
+    fila_excel = pd.Series(df.index, index=df.index) + header_row + 2
+
+    rut = _ruts(df, columnas)
+    con_rut = rut != ''
+    # DV y número mínimo validados para todas las filas a la vez
+    ruts = ruts_en_lote(rut)
+
+    nombre = _texto(_columna(df, columnas['nombre'])).str.split().str.join(' ')
+    nombre = nombre.mask(nombre == '', 'Desconocida')
+    partes = nombre.str.split(' ')
+    mitad = partes.str.len() // 2
+    nombres = pd.Series([' '.join(p[:m]) if m else n for p, m, n in zip(partes, mitad, nombre)], index=df.index)
+    apellidos = pd.Series([' '.join(p[m:]) if m else '.' for p, m in zip(partes, mitad)], index=df.index)
+
+    fecha_hora = _fechas_parto(df, columnas)
+    anio_nacimiento = fecha_hora.dt.year - _numero(_columna(df, columnas['edad']))
+    anio_nacimiento = anio_nacimiento.where(anio_nacimiento.between(1900, 2100))
+
+    sexo_raw = _texto(_columna(df, columnas['sexo'])).str.upper()
+    sexo = sexo_raw.str.contains(r'F|MUJER', regex=True).map({True: 'F', False: 'M'})
+
+    peso = _numero(_columna(df, columnas['peso']))
+    peso = peso.mask(peso > 100, peso / 1000.0).fillna(3.0).round(3)
+    talla = _numero(_columna(df, columnas['talla'])).fillna(50.0).round(1)
+
+    normalizado = pd.DataFrame({
+        'fila_excel': fila_excel,
+        'rut_normalizado': rut,
+        'rut_valido': ruts['valido'],
+        'nombres': nombres.str[:100],
+        'apellidos': apellidos.str[:100],
+        'anio_nacimiento': anio_nacimiento,
+        'direccion': _texto(_columna(df, columnas['comuna'])).str[:200],
+        'fecha_hora': fecha_hora,
+        'tipo_parto': _tipos_parto(df, columnas),
+        'semanas_gestacion': _entero_con_defecto(_columna(df, columnas['semanas']), 39, 20, 45),
+        'sexo': sexo,
+        'peso': peso,
+        'talla': talla,
+        'apgar_1': _entero_con_defecto(_columna(df, columnas['apgar1']), 9, 0, 10),
+        'apgar_5': _entero_con_defecto(_columna(df, columnas['apgar5']), 10, 0, 10),
+    })[con_rut]
+
+    errores = []
+    rut_invalido = ~normalizado.pop('rut_valido').astype(bool)
+    for fila, valor in normalizado.loc[rut_invalido, ['fila_excel', 'rut_normalizado']].itertuples(index=False):
+        errores.append(f"{ubicacion(fila, hoja)}: RUT inválido: {valor}")
+    sin_fecha = ~rut_invalido & normalizado['fecha_hora'].isna()
+    for fila in normalizado.loc[sin_fecha, 'fila_excel']:
+        errores.append(f"{ubicacion(fila, hoja)}: Fecha de parto inválida o vacía")
+    normalizado = normalizado[~rut_invalido & ~sin_fecha]
+    if hoja is not None:
+        normalizado['hoja'] = hoja
+
+    filas = []
+    for registro in normalizado.to_dict('records'):
+        anio = registro.pop('anio_nacimiento')
+        # None si la fila no trae edad: no se pisa la fecha de una madre existente
+        registro['fecha_nacimiento'] = date(int(anio), 1, 1) if pd.notna(anio) else None
+        registro['fecha_hora'] = registro['fecha_hora'].to_pydatetime()
+        registro['tiene_direccion'] = columnas['comuna'] is not None
+        filas.append(registro)
+    return filas, errores
+
+def _importar_lote(filas, user):
+    """Guarda un lote de filas normalizadas con consultas por lote.
+
+    Trae madres, partos y recién nacidos existentes en una consulta cada uno y
+    escribe con bulk_create/bulk_update. Si varias filas comparten madre o
+    parto, la última fila gana (igual que el antiguo update_or_create por fila).
+    Devuelve los conteos de creados/actualizados del lote.
+    """
+    stats = {modelo: {'creados': 0, 'actualizados': 0} for modelo in ('madres', 'partos', 'rn')}
+    # Días del resumen diario afectados (bulk_create/bulk_update no disparan señales)
+    stats['dias'] = {fecha_local(f['fecha_hora']) for f in filas}
+    nacimiento_cambiado = []
+    con_edad = False
+    ahora = timezone.now()
+    creador = user if user is not None and user.is_authenticated else None
+
+    # --- 1. Madres ---
+    ruts = {f['rut_normalizado'] for f in filas}
+    madres = {}
+    for madre in Madre.objects.filter(rut_normalizado__in=ruts).order_by('-id'):
+        madres[madre.rut_normalizado] = madre
+    madres_nuevas = {}
+    madres_actualizadas = {}
+    for fila in filas:
+        rut_norm = fila['rut_normalizado']
+        madre = madres.get(rut_norm)
+        if madre is None:
+            madre = Madre(
+                prevision='fonasa_a',
+                estado_civil='soltera',
+                direccion='',
+                telefono='',
+                created_by=creador,
+            )
+            madres[rut_norm] = madres_nuevas[rut_norm] = madre
+        elif rut_norm not in madres_nuevas:
+            madres_actualizadas[rut_norm] = madre
+            if fila['fecha_nacimiento'] is not None and madre.fecha_nacimiento != fila['fecha_nacimiento']:
+                nacimiento_cambiado.append(madre.pk)
+        madre.rut = format_rut(rut_norm)
+        madre.nombres = fila['nombres']
+        madre.apellidos = fila['apellidos']
+        if fila['fecha_nacimiento'] is not None:
+            madre.fecha_nacimiento = fila['fecha_nacimiento']
+            con_edad = con_edad or rut_norm in madres_actualizadas
+        elif madre.fecha_nacimiento is None:
+            madre.fecha_nacimiento = FECHA_NACIMIENTO_DESCONOCIDA
+        if fila['tiene_direccion']:
+            madre.direccion = fila['direccion']
+        madre.updated_at = ahora
+        madre.sincronizar_claves_busqueda()
+
+    if madres_nuevas:
+        Madre.objects.bulk_create(madres_nuevas.values())
+        if not connection.features.can_return_rows_from_bulk_insert:
+            ids = dict(Madre.objects.filter(rut_normalizado__in=madres_nuevas).values_list('rut_normalizado', 'id'))
+            for rut_norm, madre in madres_nuevas.items():
+                madre.pk = ids[rut_norm]
+    if madres_actualizadas:
+        campos = ['rut', 'rut_normalizado', 'nombres', 'apellidos', 'nombre_busqueda', 'updated_at']
+        if con_edad:
+            campos.append('fecha_nacimiento')
+        if filas[0]['tiene_direccion']:
+            campos.append('direccion')
+        Madre.objects.bulk_update(madres_actualizadas.values(), campos)
+    if nacimiento_cambiado:
+        # Cambia el tramo de edad de todos los partos de esas madres
+        fechas = Parto.objects.filter(madre_id__in=nacimiento_cambiado).values_list('fecha_hora', flat=True)
+        stats['dias'].update(fecha_local(f) for f in fechas)
+    stats['madres']['creados'] += len(madres_nuevas)
+    stats['madres']['actualizados'] += len(madres_actualizadas)
+
+    # --- 2. Partos (clave: madre + fecha_hora) ---
+    partos = {
+        (parto.madre_id, parto.fecha_hora): parto
+        for parto in Parto.objects.filter(
+            madre_id__in=[m.pk for m in madres.values()],
+            fecha_hora__in={f['fecha_hora'] for f in filas},
+        ).order_by('-id')
+    }
+    partos_nuevos = {}
+    partos_actualizados = {}
+    for fila in filas:
+        clave = (madres[fila['rut_normalizado']].pk, fila['fecha_hora'])
+        parto = partos.get(clave)
+        if parto is None:
+            parto = Parto(
+                madre=madres[fila['rut_normalizado']],
+                fecha_hora=fila['fecha_hora'],
+                tipo_anestesia='ninguna',
+                created_by=creador,
+            )
+            partos[clave] = partos_nuevos[clave] = parto
+        elif clave not in partos_nuevos:
+            partos_actualizados[clave] = parto
+        parto.tipo_parto = fila['tipo_parto']
+        parto.semanas_gestacion = fila['semanas_gestacion']
+        parto.updated_at = ahora
+
+    if partos_nuevos:
+        Parto.objects.bulk_create(partos_nuevos.values())
+        if not connection.features.can_return_rows_from_bulk_insert:
+            ids = {
+                (madre_id, fecha_hora): pk
+                for pk, madre_id, fecha_hora in Parto.objects.filter(
+                    madre_id__in={m for m, _ in partos_nuevos},
+                    fecha_hora__in={f for _, f in partos_nuevos},
+                ).values_list('id', 'madre_id', 'fecha_hora')
+            }
+            for clave, parto in partos_nuevos.items():
+                parto.pk = ids[clave]
+    if partos_actualizados:
+        Parto.objects.bulk_update(partos_actualizados.values(), ['tipo_parto', 'semanas_gestacion', 'updated_at'])
+    stats['partos']['creados'] += len(partos_nuevos)
+    stats['partos']['actualizados'] += len(partos_actualizados)
+
+    # --- 3. Recién nacidos (uno por parto) ---
+    recien_nacidos = {}
+    for rn in RecienNacido.objects.filter(parto_id__in=[p.pk for p in partos.values()]).order_by('-id'):
+        recien_nacidos[rn.parto_id] = rn
+    rn_nuevos = {}
+    rn_actualizados = {}
+    for fila in filas:
+        parto = partos[(madres[fila['rut_normalizado']].pk, fila['fecha_hora'])]
+        rn = recien_nacidos.get(parto.pk)
+        if rn is None:
+            rn = RecienNacido(parto=parto)
+            recien_nacidos[parto.pk] = rn_nuevos[parto.pk] = rn
+        elif parto.pk not in rn_nuevos:
+            rn_actualizados[parto.pk] = rn
+        rn.hora_nacimiento = fila['fecha_hora'].time()  # hora local: la fecha se localizó desde el Excel
+        rn.sexo = fila['sexo']
+        rn.peso = fila['peso']
+        rn.talla = fila['talla']
+        rn.apgar_1 = fila['apgar_1']
+        rn.apgar_5 = fila['apgar_5']
+        rn.estado = 'vivo'
+        rn.updated_at = ahora
+
+    if rn_nuevos:
+        RecienNacido.objects.bulk_create(rn_nuevos.values())
+    if rn_actualizados:
+        RecienNacido.objects.bulk_update(
+            rn_actualizados.values(),
+            ['hora_nacimiento', 'sexo', 'peso', 'talla', 'apgar_1', 'apgar_5', 'estado', 'updated_at'],
+        )
+    stats['rn']['creados'] += len(rn_nuevos)
+    stats['rn']['actualizados'] += len(rn_actualizados)
+
+    # --- 4. Documentos de búsqueda (el nombre de la madre vale para todos sus partos) ---
+    actualizar_documentos(madre_ids=[m.pk for m in madres.values()])
+    return stats
+
+def _sumar_conteos(stats, conteos):
+    stats['dias'].update(conteos.pop('dias'))
+    for modelo, valores in conteos.items():
+        for clave, valor in valores.items():
+            stats[modelo][clave] += valor
+
+def importar_filas(filas, user=None, chunk_size=CHUNK_IMPORTACION):
+    """Guarda las filas normalizadas por lotes de `chunk_size`, cada uno en su transacción.
+
+    Si un lote falla se reintenta fila por fila para reportar el error con el
+    número de fila del Excel, sin perder las filas válidas del lote.
+    """
+    stats = {
+        'madres': {'creados': 0, 'actualizados': 0},
+        'partos': {'creados': 0, 'actualizados': 0},
+        'rn': {'creados': 0, 'actualizados': 0},
+        'errors': [],
+        'dias': set(),
+    }
+    for inicio in range(0, len(filas), chunk_size):
+        lote = filas[inicio:inicio + chunk_size]
         try:
-            time_obj = None
-            if isinstance(time_val, datetime):
-                time_obj = time_val.time()
-            else:
-                str_val = str(time_val).strip()
-                # Intentar limpiar "hrs" o similares
-                str_val = str_val.lower().replace('hrs', '').replace('hr', '').strip()
-                for fmt in ['%H:%M:%S', '%H:%M', '%H']:
-                    try:
-                        time_obj = datetime.strptime(str_val, fmt).time()
-                        break
-                    except:
-                        continue
-            
-            if time_obj:
-                fecha_dt = fecha_dt.replace(
-                    hour=time_obj.hour,
-                    minute=time_obj.minute,
-                    second=time_obj.second
-                )
-        except:
-            pass
-            
-    return fecha_dt
+            with transaction.atomic():
+                _sumar_conteos(stats, _importar_lote(lote, user))
+        except Exception:
+            logger.warning("Lote de importación con errores; se reintenta fila por fila", exc_info=True)
+            for fila in lote:
+                try:
+                    with transaction.atomic():
+                        _sumar_conteos(stats, _importar_lote([fila], user))
+                except Exception as e:
+                    stats['errors'].append(f"{ubicacion(fila['fila_excel'], fila.get('hoja'))}: {str(e)}")
+    recalcular_dias(stats['dias'])
+    if stats['dias']:
+        marcar_cambio()
+    return stats
 
-def importar_datos_excel(file, user=None, import_type='auto'):
+def analizar_excel(file):
+    """Lee y normaliza la planilla una sola vez (fase 1 de la importación).
+
+    Recorre todas las hojas y junta las filas de las que tienen columna de
+    RUT; si hay más de una, las filas y los errores llevan el nombre de su
+    hoja. Devuelve un dict serializable con las filas listas para
+    `importar_filas`, los errores de validación y, por hoja, la fila de
+    cabecera y el mapeo de columnas usado.
+    """
+    hojas = analizar_cabeceras(leer_hojas(file))
+    con_rut = [hoja for hoja in hojas if hoja['columnas']['rut'] is not None]
+    filas = []
+    errores = []
+    resumen = []
+    for hoja in hojas:
+        df_raw = hoja.pop('df_raw')
+        hoja['filas'] = 0
+        hoja['omitida'] = hoja['columnas']['rut'] is None
+        if not hoja['omitida']:
+            header_row = hoja['header_row']
+            # Filas bajo la cabecera, con los nombres de columna normalizados
+            df = df_raw.iloc[header_row + 1:].reset_index(drop=True)
+            df.columns = [normalize_col(c) for c in df_raw.iloc[header_row]]
+            df = df.loc[:, ~pd.Index(df.columns).duplicated()]
+            filas_hoja, errores_hoja = normalizar_filas(
+                df, hoja['columnas'], header_row, hoja=hoja['nombre'] if len(con_rut) > 1 else None)
+            filas.extend(filas_hoja)
+            errores.extend(errores_hoja)
+            hoja['filas'] = len(filas_hoja)
+        hoja['header_row'] += 1
+        resumen.append(hoja)
+    if not con_rut:
+        errores.append("No se encontró ninguna hoja con columna de RUT/RUN.")
+    return {
+        'version': VERSION_ANALISIS,
+        'hojas': resumen,
+        'filas': filas,
+        'errores': errores,
+    }
+
+def hash_archivo(file):
+    """sha256 del contenido del archivo subido; deja el archivo al inicio."""
+    sha = hashlib.sha256()
+    file.seek(0)
+    if hasattr(file, 'chunks'):
+        for bloque in file.chunks():
+            sha.update(bloque)
+    else:
+        for bloque in iter(lambda: file.read(1024 * 1024), b''):
+            sha.update(bloque)
+    file.seek(0)
+    return sha.hexdigest()
+
+def es_clave_valida(clave):
+    return bool(re.fullmatch(r'[0-9a-f]{64}', clave or ''))
+
+def ruta_analisis(clave):
+    return os.path.join(settings.MEDIA_ROOT, CARPETA_CACHE_IMPORTACION, f'{clave}-v{VERSION_ANALISIS}.pkl')
+
+def ruta_planilla(clave):
+    return os.path.join(settings.MEDIA_ROOT, CARPETA_CACHE_IMPORTACION, f'{clave}.planilla')
+
+def cargar_analisis(clave):
+    """Análisis cacheado para el hash `clave`, o None si no existe."""
+    if not es_clave_valida(clave):
+        return None
     try:
-        # Detectar cabecera automáticamente
-        xls = pd.ExcelFile(file)
-        df_preview = pd.read_excel(xls, nrows=20, header=None)
-        
-        header_row = 0
-        max_matches = 0
-        # Palabras clave ampliadas para detectar mejor la cabecera
-        keywords_detect = ["NOMBRE", "RUT", "EDAD", "PARTO", "PESO", "FECHA", "HORA", "MATRONA", "DIAGNOSTICO"]
-        
-        for i, row in df_preview.iterrows():
-            matches = 0
-            row_str = " ".join([str(v).upper() for v in row.values if pd.notna(v)])
-            for kw in keywords_detect:
-                if kw in row_str:
-                    matches += 1
-            if matches > max_matches:
-                max_matches = matches
-                header_row = i
-        
-        # Leer el archivo con la cabecera detectada
-        df = pd.read_excel(file, header=header_row)
-        
-        # Normalizar columnas
-        df.columns = [normalize_col(c) for c in df.columns]
-        cols = df.columns
-        
-        # Mapeo de columnas (Búsqueda flexible y ampliada)
-        col_rut = find_col(cols, ["RUT", "IDENTIFICACION", "RUN"])
-        col_nombre = find_col(cols, ["NOMBRE COMPLETO", "NOMBRE PACIENTE", "PACIENTE", "NOMBRE"])
-        col_edad = find_col(cols, ["EDAD"])
-        col_fecha = find_col(cols, ["FECHA PARTO", "FECHA DE PARTO", "FECHA"])
-        col_hora = find_col(cols, ["HORA PARTO", "HORA DE PARTO", "HORA"])
-        col_comuna = find_col(cols, ["COMUNA", "PROCEDENCIA", "DOMICILIO"])
-        col_prevision = find_col(cols, ["PREVISION", "FINANCIADOR"])
-        col_tipo_parto = find_col(cols, ["TIPO DE PARTO", "VIA DE PARTO", "TIPO PARTO"])
-        col_sexo = find_col(cols, ["SEXO", "GENERO", "SEXO RN"])
-        col_peso = find_col(cols, ["PESO", "PESO RN"])
-        col_talla = find_col(cols, ["TALLA", "TALLA RN"])
-        col_apgar1 = find_col(cols, ["APGAR 1", "APGAR 1 MIN", "APGAR 1'"])
-        col_apgar5 = find_col(cols, ["APGAR 5", "APGAR 5 MIN", "APGAR 5'"])
-        col_semanas = find_col(cols, ["EG", "EDAD GESTACIONAL", "SEMANAS"])
-        
-        stats = {'created': 0, 'updated': 0, 'errors': []}
-        
-        for index, row in df.iterrows():
+        with open(ruta_analisis(clave), 'rb') as archivo:
+            return pickle.load(archivo)
+    except FileNotFoundError:
+        return None
+
+def _guardar_analisis(clave, analisis):
+    ruta = ruta_analisis(clave)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = f'{ruta}.{os.getpid()}.tmp'
+    with open(temporal, 'wb') as archivo:
+        pickle.dump(analisis, archivo, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporal, ruta)
+
+def _guardar_planilla(clave, file):
+    """Copia el archivo subido junto al análisis, para reanalizarlo si se corrige el mapeo."""
+    ruta = ruta_planilla(clave)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = f'{ruta}.{os.getpid()}.tmp'
+    file.seek(0)
+    with open(temporal, 'wb') as archivo:
+        for bloque in iter(lambda: file.read(1024 * 1024), b''):
+            archivo.write(bloque)
+    file.seek(0)
+    os.replace(temporal, ruta)
+
+def purgar_analisis_antiguos(dias=None):
+    """Elimina análisis cacheados con más de `dias` días. Devuelve cuántos borró."""
+    if dias is None:
+        dias = getattr(settings, 'IMPORTACIONES_CACHE_DIAS', 7)
+    carpeta = os.path.join(settings.MEDIA_ROOT, CARPETA_CACHE_IMPORTACION)
+    limite = time.time() - dias * 86400
+    total = 0
+    try:
+        entradas = list(os.scandir(carpeta))
+    except FileNotFoundError:
+        return 0
+    for entrada in entradas:
+        if entrada.is_file() and entrada.stat().st_mtime < limite:
             try:
-                with transaction.atomic():
-                    # --- 1. Procesar Madre ---
-                    rut_raw = str(row.get(col_rut, '')).strip() if col_rut else ''
-                    if not rut_raw or rut_raw.lower() in ['nan', 'nat', 'none', '']:
-                        continue # Saltar filas sin RUT
-                        
-                    # Limpieza de RUT
-                    rut_clean = rut_raw.replace('.', '').replace(' ', '').upper()
-                    if '-' not in rut_clean and len(rut_clean) > 1:
-                        # Intentar formatear si viene sin guión
-                        rut_clean = f"{rut_clean[:-1]}-{rut_clean[-1]}"
-                    
-                    nombre_completo = str(row.get(col_nombre, 'Desconocida')).strip()
-                    if nombre_completo.lower() in ['nan', 'nat']: nombre_completo = 'Desconocida'
-                    
-                    # Separar nombre y apellido
-                    parts = nombre_completo.split()
-                    if len(parts) >= 2:
-                        nombres = " ".join(parts[:len(parts)//2])
-                        apellidos = " ".join(parts[len(parts)//2:])
-                    else:
-                        nombres = nombre_completo
-                        apellidos = "."
-                        
-                    # Fecha nacimiento desde edad
-                    edad = row.get(col_edad)
-                    fecha_nacimiento = None
-                    if pd.notna(edad):
-                        try:
-                            edad_int = int(float(edad))
-                            year_nac = datetime.now().year - edad_int
-                            fecha_nacimiento = datetime(year_nac, 1, 1).date()
-                        except:
-                            pass
-                    
-                    if not fecha_nacimiento:
-                        fecha_nacimiento = datetime(2000, 1, 1).date()
-                        
-                    madre, created = Madre.objects.update_or_create(
-                        rut=rut_clean,
-                        defaults={
-                            'nombres': nombres,
-                            'apellidos': apellidos,
-                            'fecha_nacimiento': fecha_nacimiento,
-                            'comuna': str(row.get(col_comuna, ''))[:100],
-                            'prevision': 'fonasa_a', # Default
-                            'estado_civil': 'soltera',
-                            'created_by': user if user and user.is_authenticated else None
-                        }
-                    )
-                    
-                    # --- 2. Procesar Parto ---
-                    fecha_val = row.get(col_fecha)
-                    hora_val = row.get(col_hora)
-                    fecha_parto = parse_datetime_smart(fecha_val, hora_val)
-                            
-                    # Tipo parto
-                    tipo_parto_raw = str(row.get(col_tipo_parto, '')).upper()
-                    tipo_parto = 'vaginal'
-                    if 'CESAREA' in tipo_parto_raw or 'CESÁREA' in tipo_parto_raw:
-                        tipo_parto = 'cesarea'
-                    elif 'FORCEPS' in tipo_parto_raw or 'FÓRCEPS' in tipo_parto_raw:
-                        tipo_parto = 'forceps'
-                        
-                    # Semanas
-                    semanas = 39
-                    try:
-                        eg_val = row.get(col_semanas)
-                        if pd.notna(eg_val):
-                            semanas = int(float(eg_val))
-                    except:
-                        pass
-                        
-                    parto, p_created = Parto.objects.update_or_create(
-                        madre=madre,
-                        fecha_hora=fecha_parto,
-                        defaults={
-                            'tipo_parto': tipo_parto,
-                            'semanas_gestacion': semanas,
-                            'tipo_anestesia': 'ninguna',
-                            '_allow_old_parto': True, # Permitir históricos
-                            'created_by': user if user and user.is_authenticated else None
-                        }
-                    )
-                    
-                    # --- 3. Procesar Recién Nacido ---
-                    sexo_raw = str(row.get(col_sexo, '')).upper()
-                    sexo = 'M'
-                    if 'F' in sexo_raw or 'MUJER' in sexo_raw or 'FEMENINO' in sexo_raw:
-                        sexo = 'F'
-                    
-                    peso = row.get(col_peso)
-                    try:
-                        peso = float(peso)
-                        if peso > 100: # Gramos a kg
-                            peso = peso / 1000.0
-                    except:
-                        peso = 3.0
-                        
-                    talla = row.get(col_talla)
-                    try:
-                        talla = float(talla)
-                    except:
-                        talla = 50.0
-                        
-                    RecienNacido.objects.update_or_create(
-                        parto=parto,
-                        defaults={
-                            'hora_nacimiento': fecha_parto.time(),
-                            'sexo': sexo,
-                            'peso': peso,
-                            'talla': talla,
-                            'apgar_1': int(row.get(col_apgar1, 9)) if pd.notna(row.get(col_apgar1)) else 9,
-                            'apgar_5': int(row.get(col_apgar5, 10)) if pd.notna(row.get(col_apgar5)) else 10,
-                            'estado': 'vivo'
-                        }
-                    )
-                    
-                    if created or p_created:
-                        stats['created'] += 1
-                    else:
-                        stats['updated'] += 1
-                    
-            except Exception as e:
-                stats['errors'].append(f"Fila {index + header_row + 2}: {str(e)}")
-                    
-        return {
-            'success': True,
-            'counts': {
-                'madres': stats['created'], 
-                'partos': stats['created'],
-                'rn': stats['created']
-            },
-            'errors': stats['errors'][:20] # Limitar errores retornados
-        }
-        
+                os.remove(entrada.path)
+                total += 1
+            except OSError:
+                logger.warning('No se pudo eliminar %s', entrada.path)
+    return total
+
+def analizar_excel_con_cache(file):
+    """Analiza la planilla o reutiliza el análisis de un archivo idéntico ya subido.
+
+    Devuelve `(clave, analisis, desde_cache)`; `clave` es el sha256 del archivo
+    y sirve para confirmar la importación sin volver a abrir el XLSX. El
+    archivo se guarda junto al análisis mientras dure el caché.
+    """
+    clave = hash_archivo(file)
+    analisis = cargar_analisis(clave)
+    if analisis is not None:
+        return clave, analisis, True
+    analisis = analizar_excel(file)
+    _guardar_analisis(clave, analisis)
+    _guardar_planilla(clave, file)
+    purgar_analisis_antiguos()
+    return clave, analisis, False
+
+def reanalizar(clave):
+    """Vuelve a analizar la planilla guardada (p. ej. tras corregir un perfil). None si ya no existe."""
+    if not es_clave_valida(clave):
+        return None
+    try:
+        with open(ruta_planilla(clave), 'rb') as archivo:
+            analisis = analizar_excel(archivo)
+    except FileNotFoundError:
+        return None
+    _guardar_analisis(clave, analisis)
+    return analisis
+
+def resultado_importacion(stats, errores):
+    return {
+        'success': True,
+        'counts': {
+            'madres': stats['madres']['creados'],
+            'partos': stats['partos']['creados'],
+            'rn': stats['rn']['creados'],
+        },
+        'updated': {
+            'madres': stats['madres']['actualizados'],
+            'partos': stats['partos']['actualizados'],
+            'rn': stats['rn']['actualizados'],
+        },
+        'errors': (list(errores) + stats['errors'])[:MAX_ERRORES] # Limitar errores retornados
+    }
+
+def confirmar_importacion(clave, user=None):
+    """Fase 2: guarda las filas del análisis cacheado. None si el análisis ya no existe."""
+    analisis = cargar_analisis(clave)
+    if analisis is None:
+        return None
+    stats = importar_filas(analisis['filas'], user)
+    return resultado_importacion(stats, analisis['errores'])
+
+def importar_datos_excel(file, user=None, import_type='auto'):
+    """Analiza e importa en un solo paso (sin vista previa)."""
+    try:
+        analisis = analizar_excel(file)
+        stats = importar_filas(analisis['filas'], user)
+        return resultado_importacion(stats, analisis['errores'])
+
     except Exception as e:
         logger.exception("Error importando excel")
         return {
@@ -0,0 +1,71 @@
+"""Índice compacto de madres para el typeahead del registro de partos.
+
+El navegador descarga una vez las madres con actividad reciente (creadas,
+editadas o con un parto en los últimos INDICE_MADRES_DIAS días) como filas
+`[id, rut_normalizado, nombre_busqueda]`, lo guarda en sessionStorage (que
+base.html borra al cerrar o expirar la sesión) y muestra primero lo que
+encuentra ahí. Como el índice solo cubre madres recientes, cuando hay menos
+coincidencias que el límite completa con `madre_typeahead`.
+
+Para ponerse al día pide el delta: las madres modificadas desde el `hasta`
+de su última respuesta. El delta repite SOLAPE_SEGUNDOS hacia atrás para no
+perder filas de transacciones que confirmaron después de esa marca (el
+navegador reemplaza por id, así que repetir filas no molesta). Eliminar una
+madre cambia la versión `CLAVE_INDICE_MADRES` y el delta responde entonces el
+índice completo. Lo mismo si el `desde` es anterior a INDICE_MADRES_DIAS o el
+delta pasa de INDICE_MADRES_MAX filas: el delta nunca entrega más que el
+índice completo.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Madre, Parto
+from .versiones import version_datos
+
+CLAVE_INDICE_MADRES = 'indice_madres'
+CAMPOS = ['id', 'rut', 'nombre']
+SOLAPE_SEGUNDOS = 60
+
+
+def _respuesta(version, hasta, madres, completo):
+    return {
+        'version': version,
+        'hasta': hasta.isoformat(),
+        'completo': completo,
+        'campos': CAMPOS,
+        'filas': [list(fila) for fila in madres.values_list('id', 'rut_normalizado', 'nombre_busqueda')],
+    }
+
+
+def indice_madres(dias=None, maximo=None):
+    """Índice completo: las `maximo` madres con actividad más reciente dentro de `dias` días."""
+    dias = settings.INDICE_MADRES_DIAS if dias is None else dias
+    maximo = settings.INDICE_MADRES_MAX if maximo is None else maximo
+    version = version_datos(CLAVE_INDICE_MADRES)
+    ahora = timezone.now()
+    desde = ahora - timedelta(days=dias)
+    con_parto = Parto.objects.filter(fecha_hora__gte=desde).values('madre_id')
+    madres = Madre.objects.filter(Q(updated_at__gte=desde) | Q(id__in=con_parto)).order_by('-updated_at')[:maximo]
+    return _respuesta(version, ahora, madres, completo=True)
+
+
+def delta_madres(desde, version):
+    """Madres modificadas desde `desde` (ISO 8601).
+
+    El índice completo si `version` ya no es la vigente, si `desde` es más
+    antiguo que INDICE_MADRES_DIAS o si el delta tendría más de INDICE_MADRES_MAX filas.
+    """
+    marca = parse_datetime(desde or '')
+    if marca is None or timezone.is_naive(marca) or version != version_datos(CLAVE_INDICE_MADRES):
+        return indice_madres()
+    ahora = timezone.now()
+    if marca < ahora - timedelta(days=settings.INDICE_MADRES_DIAS):
+        return indice_madres()
+    madres = Madre.objects.filter(updated_at__gte=marca - timedelta(seconds=SOLAPE_SEGUNDOS)).order_by('updated_at')
+    if madres[settings.INDICE_MADRES_MAX:settings.INDICE_MADRES_MAX + 1].exists():
+        return indice_madres()
+    return _respuesta(version, ahora, madres[:settings.INDICE_MADRES_MAX], completo=False)
@@ -0,0 +1,53 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from registros.benchmark import Benchmark, BaseNoSintetica
+
+
+class Command(BaseCommand):
+    help = ('Mide las rutas principales (búsqueda de madres, lista de partos, exportaciones, REM, importación) '
+            'a distintos tamaños de datos sintéticos y escribe el resultado en JSON. '
+            'Agrega datos a la base configurada: úsese con una base aparte.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanos', type=int, nargs='+', default=[10000, 100000, 1000000],
+                            help='Cantidades de partos a medir (por defecto 10000 100000 1000000).')
+        parser.add_argument('--repeticiones', type=int, default=5,
+                            help='Veces que se mide cada ruta (por defecto 5).')
+        parser.add_argument('--dias-exportacion', type=int, default=7,
+                            help='Días hacia atrás que cubren las exportaciones y el REM (por defecto 7).')
+        parser.add_argument('--filas-importacion', type=int, default=500,
+                            help='Filas de cada planilla importada (por defecto 500).')
+        parser.add_argument('--ruts-lote', type=int, default=500,
+                            help='RUT por consulta al comparar madre_lookup_lote con madre_lookup (por defecto 500).')
+        parser.add_argument('--semilla', type=int, default=None)
+        parser.add_argument('--salida', default=None,
+                            help='Archivo JSON de resultados (por defecto benchmark-AAAAMMDD-HHMM.json).')
+
+    def handle(self, *args, **options):
+        if options['repeticiones'] <= 0 or min(options['tamanos']) <= 0:
+            raise CommandError('Los tamaños y las repeticiones deben ser mayores a 0.')
+        benchmark = Benchmark(
+            repeticiones=options['repeticiones'],
+            dias_exportacion=options['dias_exportacion'],
+            filas_importacion=options['filas_importacion'],
+            ruts_lote=options['ruts_lote'],
+            semilla=options['semilla'],
+        )
+        try:
+            informe = benchmark.ejecutar(options['tamanos'], progreso=self.stdout.write)
+        except BaseNoSintetica as e:
+            raise CommandError(f'{e} El benchmark solo corre sobre una base con datos sintéticos.')
+
+        salida = options['salida'] or f"benchmark-{timezone.localtime().strftime('%Y%m%d-%H%M')}.json"
+        with open(salida, 'w', encoding='utf-8') as archivo:
+            json.dump(informe, archivo, ensure_ascii=False, indent=2)
+
+        for resultado in informe['resultados']:
+            self.stdout.write(f"\n{resultado['partos']} partos / {resultado['madres']} madres")
+            for ruta, medida in resultado['rutas'].items():
+                self.stdout.write(f"  {ruta:<30} p50 {medida['p50_ms']:>9.1f} ms  p95 {medida['p95_ms']:>9.1f} ms  "
+                                  f"{medida['consultas']} consultas")
+        self.stdout.write(self.style.SUCCESS(f'Resultados en {salida}'))
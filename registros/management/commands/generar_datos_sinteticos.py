@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from registros.sinteticos import LOTE_SINTETICOS, generar_datos
+
+
+class Command(BaseCommand):
+    help = 'Genera partos sintéticos (con madres y recién nacidos) para pruebas de carga.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('partos', type=int, help='Cantidad de partos a generar.')
+        parser.add_argument('--semilla', type=int, default=None,
+                            help='Semilla del generador, para repetir el mismo conjunto de datos.')
+        parser.add_argument('--dias', type=int, default=365,
+                            help='Los partos se reparten en los últimos N días (por defecto 365).')
+        parser.add_argument('--lote', type=int, default=LOTE_SINTETICOS,
+                            help=f'Partos por transacción (por defecto {LOTE_SINTETICOS}).')
+
+    def handle(self, *args, **options):
+        if options['partos'] <= 0 or options['dias'] <= 0:
+            raise CommandError('La cantidad de partos y de días debe ser mayor a 0.')
+
+        def progreso(creados):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{creados} / {options["partos"]} partos')
+
+        conteos = generar_datos(options['partos'], semilla=options['semilla'], dias=options['dias'],
+                                lote=options['lote'], progreso=progreso)
+        self.stdout.write(self.style.SUCCESS(
+            f"Datos sintéticos creados: {conteos['madres']} madres, {conteos['partos']} partos, {conteos['rn']} recién nacidos."
+        ))
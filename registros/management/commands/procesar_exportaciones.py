@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from registros.exportaciones import (
+    ejecutar_trabajo,
+    latido_worker,
+    liberar_trabajos_colgados,
+    purgar_exportaciones_antiguas,
+    tomar_siguiente_trabajo,
+)
+
+
+class Command(BaseCommand):
+    help = 'Worker de exportaciones: procesa los TrabajoExportacion pendientes (cola en la base de datos).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Procesa los trabajos pendientes y termina (útil para cron o pruebas).')
+        parser.add_argument('--intervalo', type=float, default=3.0,
+                            help='Segundos de espera cuando la cola está vacía (por defecto 3).')
+
+    def handle(self, *args, **options):
+        una_vez = options['una_vez']
+        intervalo = options['intervalo']
+        # None: la limpieza y el latido corren en la primera vuelta (time.monotonic() puede partir cerca de 0)
+        ultima_limpieza = ultimo_latido = None
+
+        while True:
+            close_old_connections()
+            if ultimo_latido is None or time.monotonic() - ultimo_latido > 30:
+                latido_worker()
+                ultimo_latido = time.monotonic()
+            if ultima_limpieza is None or time.monotonic() - ultima_limpieza > 3600:
+                reencolados, fallidos = liberar_trabajos_colgados()
+                purgados = purgar_exportaciones_antiguas()
+                if reencolados or fallidos or purgados:
+                    self.stdout.write(f'Limpieza: {reencolados} reencolados, {fallidos} fallidos, {purgados} purgados')
+                ultima_limpieza = time.monotonic()
+
+            trabajo = tomar_siguiente_trabajo()
+            if trabajo is None:
+                if una_vez:
+                    break
+                time.sleep(intervalo)
+                continue
+
+            ejecutar_trabajo(trabajo)
+            self.stdout.write(f'{trabajo} -> {trabajo.estado}')
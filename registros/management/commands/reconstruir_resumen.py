@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from registros.resumen import reconstruir_resumen
+
+
+class Command(BaseCommand):
+    help = 'Recalcula desde cero la tabla de agregados diarios (ResumenDiario).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias-por-tramo', type=int, default=366,
+                            help='Días recalculados por transacción (por defecto 366).')
+
+    def handle(self, *args, **options):
+        filas = reconstruir_resumen(dias_por_tramo=options['dias_por_tramo'])
+        self.stdout.write(self.style.SUCCESS(f'Resumen diario reconstruido: {filas} filas.'))
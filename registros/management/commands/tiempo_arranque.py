@@ -0,0 +1,35 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from registros.arranque import medir_arranque
+
+
+class Command(BaseCommand):
+    help = ('Mide con `python -X importtime` el arranque de un worker (aplicación WSGI y URLconf) y falla '
+            'si carga bibliotecas pesadas (pandas, openpyxl, xhtml2pdf...) o supera --max-ms.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-ms', type=float, default=None,
+                            help='Tiempo total de importación permitido en ms (por defecto sin límite).')
+        parser.add_argument('--top', type=int, default=15, help='Módulos más lentos a listar (por defecto 15).')
+        parser.add_argument('--json', action='store_true', help='Escribe el informe como JSON.')
+
+    def handle(self, *args, **options):
+        try:
+            informe = medir_arranque(top=options['top'])
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        if options['json']:
+            self.stdout.write(json.dumps(informe, indent=2))
+        else:
+            self.stdout.write(f"Importación al arrancar: {informe['total_ms']} ms en {informe['modulos']} módulos.")
+            for fila in informe['mas_lentos']:
+                self.stdout.write(f"  {fila['acumulado_ms']:>8.1f} ms  {fila['modulo']}")
+
+        if informe['pesadas']:
+            raise CommandError(f"El arranque carga bibliotecas pesadas: {', '.join(informe['pesadas'])}.")
+        if options['max_ms'] is not None and informe['total_ms'] > options['max_ms']:
+            raise CommandError(f"El arranque tarda {informe['total_ms']} ms (máximo {options['max_ms']} ms).")
+        self.stdout.write(self.style.SUCCESS('Arranque sin bibliotecas pesadas.'))
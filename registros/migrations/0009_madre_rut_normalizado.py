@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:34
+
+import re
+
+from django.db import migrations, models
+
+
+def poblar_rut_normalizado(apps, schema_editor):
+    """Backfill de la clave normalizada para las madres existentes."""
+    Madre = apps.get_model('registros', 'Madre')
+    pendientes = []
+    for madre in Madre.objects.only('id', 'rut').iterator(chunk_size=2000):
+        madre.rut_normalizado = re.sub(r'[^0-9kK]', '', madre.rut or '').upper()
+        pendientes.append(madre)
+        if len(pendientes) >= 2000:
+            Madre.objects.bulk_update(pendientes, ['rut_normalizado'])
+            pendientes = []
+    if pendientes:
+        Madre.objects.bulk_update(pendientes, ['rut_normalizado'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registros', '0008_parto_estampado_placenta_parto_folio_valido_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='madre',
+            name='rut_normalizado',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=12, verbose_name='RUT normalizado'),
+        ),
+        migrations.RunPython(poblar_rut_normalizado, migrations.RunPython.noop),
+    ]
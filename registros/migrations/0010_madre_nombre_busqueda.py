@@ -0,0 +1,96 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:52
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+SQLITE_FTS = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS registros_madre_fts USING fts5(
+        nombre_busqueda,
+        content='registros_madre',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS registros_madre_fts_ai AFTER INSERT ON registros_madre BEGIN
+        INSERT INTO registros_madre_fts(rowid, nombre_busqueda) VALUES (new.id, new.nombre_busqueda);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS registros_madre_fts_ad AFTER DELETE ON registros_madre BEGIN
+        INSERT INTO registros_madre_fts(registros_madre_fts, rowid, nombre_busqueda)
+        VALUES ('delete', old.id, old.nombre_busqueda);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS registros_madre_fts_au AFTER UPDATE OF nombre_busqueda ON registros_madre BEGIN
+        INSERT INTO registros_madre_fts(registros_madre_fts, rowid, nombre_busqueda)
+        VALUES ('delete', old.id, old.nombre_busqueda);
+        INSERT INTO registros_madre_fts(rowid, nombre_busqueda) VALUES (new.id, new.nombre_busqueda);
+    END""",
+    "INSERT INTO registros_madre_fts(registros_madre_fts) VALUES ('rebuild')",
+]
+
+SQLITE_FTS_DROP = [
+    "DROP TRIGGER IF EXISTS registros_madre_fts_ai",
+    "DROP TRIGGER IF EXISTS registros_madre_fts_ad",
+    "DROP TRIGGER IF EXISTS registros_madre_fts_au",
+    "DROP TABLE IF EXISTS registros_madre_fts",
+]
+
+POSTGRES_TRGM = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS registros_madre_nombre_trgm "
+    "ON registros_madre USING gin (nombre_busqueda gin_trgm_ops)",
+]
+
+POSTGRES_TRGM_DROP = [
+    "DROP INDEX IF EXISTS registros_madre_nombre_trgm",
+]
+
+
+def _fold(value):
+    decomposed = unicodedata.normalize('NFKD', value or '')
+    sin_tildes = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(sin_tildes.lower().split())
+
+
+def poblar_nombre_busqueda(apps, schema_editor):
+    Madre = apps.get_model('registros', 'Madre')
+    pendientes = []
+    for madre in Madre.objects.only('id', 'nombres', 'apellidos').iterator(chunk_size=2000):
+        madre.nombre_busqueda = _fold(f"{madre.nombres} {madre.apellidos}")[:201]
+        pendientes.append(madre)
+        if len(pendientes) >= 2000:
+            Madre.objects.bulk_update(pendientes, ['nombre_busqueda'])
+            pendientes = []
+    if pendientes:
+        Madre.objects.bulk_update(pendientes, ['nombre_busqueda'])
+
+
+def _ejecutar(schema_editor, por_motor):
+    sentencias = por_motor.get(schema_editor.connection.vendor, [])
+    for sql in sentencias:
+        schema_editor.execute(sql)
+
+
+def crear_indice_nombres(apps, schema_editor):
+    """FTS5 en SQLite, trigramas (pg_trgm) en Postgres; otros motores usan el índice B-tree."""
+    _ejecutar(schema_editor, {'sqlite': SQLITE_FTS, 'postgresql': POSTGRES_TRGM})
+
+
+def eliminar_indice_nombres(apps, schema_editor):
+    _ejecutar(schema_editor, {'sqlite': SQLITE_FTS_DROP, 'postgresql': POSTGRES_TRGM_DROP})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registros', '0009_madre_rut_normalizado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='madre',
+            name='nombre_busqueda',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=201, verbose_name='Nombre para búsqueda'),
+        ),
+        migrations.RunPython(poblar_nombre_busqueda, migrations.RunPython.noop),
+        migrations.RunPython(crear_indice_nombres, eliminar_indice_nombres),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:49
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models import Case, Count, Value, When
+from django.db.models.functions import ExtractDay, ExtractMonth, ExtractYear, TruncDate
+from django.db.models.lookups import GreaterThan, LessThan
+
+# Copia fija de registros.resumen al momento de esta migración: no importar
+# código de la aplicación, que puede cambiar después.
+TRAMOS_EDAD = [(15, 'menor_15'), (20, '15_19'), (25, '20_24'), (30, '25_29'), (35, '30_34')]
+
+
+def tramo_edad():
+    meses = (
+        (ExtractYear('fecha_hora') - ExtractYear('madre__fecha_nacimiento')) * 12
+        + ExtractMonth('fecha_hora') - ExtractMonth('madre__fecha_nacimiento')
+        - Case(When(GreaterThan(ExtractDay('madre__fecha_nacimiento'), ExtractDay('fecha_hora')), then=Value(1)),
+               default=Value(0))
+    )
+    return Case(*[When(LessThan(meses, limite * 12), then=Value(tramo)) for limite, tramo in TRAMOS_EDAD],
+                default=Value('35_mas'), output_field=models.CharField())
+
+
+def poblar_resumen(apps, schema_editor):
+    """Calcula los agregados diarios de los partos ya registrados."""
+    Parto = apps.get_model('registros', 'Parto')
+    RecienNacido = apps.get_model('registros', 'RecienNacido')
+    ResumenDiario = apps.get_model('registros', 'ResumenDiario')
+
+    conteos = Counter()
+    partos = Parto.objects.annotate(dia=TruncDate('fecha_hora'))
+    for dimension in ('tipo_parto', 'tipo_anestesia', 'clasificacion_robson'):
+        for fila in partos.values('dia', dimension).annotate(total=Count('id')).order_by():
+            conteos[(fila['dia'], dimension, fila[dimension] or '')] += fila['total']
+    for fila in partos.annotate(tramo=tramo_edad()).values('dia', 'tramo').annotate(total=Count('id')).order_by():
+        conteos[(fila['dia'], 'edad_madre', fila['tramo'])] += fila['total']
+    recien_nacidos = RecienNacido.objects.annotate(dia=TruncDate('parto__fecha_hora'))
+    for dimension, campo in (('rn_sexo', 'sexo'), ('rn_estado', 'estado')):
+        for fila in recien_nacidos.values('dia', campo).annotate(total=Count('id')).order_by():
+            conteos[(fila['dia'], dimension, fila[campo] or '')] += fila['total']
+
+    ResumenDiario.objects.bulk_create(
+        [ResumenDiario(fecha=fecha, dimension=dimension, valor=valor, total=total)
+         for (fecha, dimension, valor), total in conteos.items()],
+        batch_size=1000,
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registros', '0011_trabajoexportacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('dimension', models.CharField(choices=[('tipo_parto', 'Tipo de parto'), ('tipo_anestesia', 'Tipo de anestesia'), ('clasificacion_robson', 'Clasificación de Robson'), ('edad_madre', 'Tramo de edad de la madre'), ('rn_sexo', 'Sexo del recién nacido'), ('rn_estado', 'Estado del recién nacido')], max_length=30)),
+                ('valor', models.CharField(blank=True, default='', max_length=30)),
+                ('total', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Resumen Diario',
+                'verbose_name_plural': 'Resúmenes Diarios',
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'dimension', 'valor'), name='registros_resumen_unico')],
+            },
+        ),
+        migrations.RunPython(poblar_resumen, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registros', '0013_versiondatos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='madre',
+            index=models.Index(fields=['created_at', 'id'], name='registros_madre_cursor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parto',
+            index=models.Index(fields=['fecha_hora', 'id'], name='registros_parto_cursor_idx'),
+        ),
+    ]
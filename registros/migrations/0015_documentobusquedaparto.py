@@ -0,0 +1,121 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:03
+
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+SQLITE_FTS = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS registros_parto_busqueda_fts USING fts5(
+        texto,
+        content='registros_documentobusquedaparto',
+        content_rowid='parto_id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS registros_parto_busqueda_fts_ai
+    AFTER INSERT ON registros_documentobusquedaparto BEGIN
+        INSERT INTO registros_parto_busqueda_fts(rowid, texto) VALUES (new.parto_id, new.texto);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS registros_parto_busqueda_fts_ad
+    AFTER DELETE ON registros_documentobusquedaparto BEGIN
+        INSERT INTO registros_parto_busqueda_fts(registros_parto_busqueda_fts, rowid, texto)
+        VALUES ('delete', old.parto_id, old.texto);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS registros_parto_busqueda_fts_au
+    AFTER UPDATE OF texto ON registros_documentobusquedaparto BEGIN
+        INSERT INTO registros_parto_busqueda_fts(registros_parto_busqueda_fts, rowid, texto)
+        VALUES ('delete', old.parto_id, old.texto);
+        INSERT INTO registros_parto_busqueda_fts(rowid, texto) VALUES (new.parto_id, new.texto);
+    END""",
+    "INSERT INTO registros_parto_busqueda_fts(registros_parto_busqueda_fts) VALUES ('rebuild')",
+]
+
+SQLITE_FTS_DROP = [
+    "DROP TRIGGER IF EXISTS registros_parto_busqueda_fts_ai",
+    "DROP TRIGGER IF EXISTS registros_parto_busqueda_fts_ad",
+    "DROP TRIGGER IF EXISTS registros_parto_busqueda_fts_au",
+    "DROP TABLE IF EXISTS registros_parto_busqueda_fts",
+]
+
+POSTGRES_TSVECTOR = [
+    "CREATE INDEX IF NOT EXISTS registros_parto_busqueda_tsv "
+    "ON registros_documentobusquedaparto USING gin (to_tsvector('simple', texto))",
+]
+
+POSTGRES_TSVECTOR_DROP = [
+    "DROP INDEX IF EXISTS registros_parto_busqueda_tsv",
+]
+
+
+# Copia fija de registros.search (texto_documento_parto) y registros.utils
+# (fold_text) al momento de esta migración: no importar código de la
+# aplicación, que puede cambiar después.
+LOTE_DOCUMENTOS = 1000
+
+
+def fold_text(value):
+    decomposed = unicodedata.normalize('NFKD', str(value))
+    sin_tildes = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(sin_tildes.lower().split())
+
+
+def texto_documento_parto(parto):
+    madre = parto.madre
+    partes = [madre.rut_normalizado, madre.nombres, madre.apellidos, parto.profesional_a_cargo, parto.folio_valido]
+    for rn in parto.recien_nacidos.all():
+        partes += [rn.get_sexo_display(), rn.get_estado_display()]
+    return fold_text(' '.join(p for p in partes if p))
+
+
+def poblar_documentos(apps, schema_editor):
+    """Escribe el documento de búsqueda de cada parto ya registrado."""
+    Parto = apps.get_model('registros', 'Parto')
+    DocumentoBusquedaParto = apps.get_model('registros', 'DocumentoBusquedaParto')
+
+    partos = Parto.objects.select_related('madre').prefetch_related('recien_nacidos').order_by('id')
+    lote = []
+    for parto in partos.iterator(chunk_size=LOTE_DOCUMENTOS):
+        lote.append(DocumentoBusquedaParto(parto_id=parto.pk, texto=texto_documento_parto(parto)))
+        if len(lote) >= LOTE_DOCUMENTOS:
+            DocumentoBusquedaParto.objects.bulk_create(lote)
+            lote = []
+    DocumentoBusquedaParto.objects.bulk_create(lote)
+
+
+def _ejecutar(schema_editor, por_motor):
+    for sql in por_motor.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def crear_indice_texto(apps, schema_editor):
+    """FTS5 en SQLite, GIN sobre tsvector en Postgres; otros motores buscan con LIKE."""
+    _ejecutar(schema_editor, {'sqlite': SQLITE_FTS, 'postgresql': POSTGRES_TSVECTOR})
+
+
+def eliminar_indice_texto(apps, schema_editor):
+    _ejecutar(schema_editor, {'sqlite': SQLITE_FTS_DROP, 'postgresql': POSTGRES_TSVECTOR_DROP})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registros', '0014_indices_paginacion_cursor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentoBusquedaParto',
+            fields=[
+                ('parto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='documento_busqueda', serialize=False, to='registros.parto')),
+                ('texto', models.TextField(blank=True, default='')),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Documento de Búsqueda de Parto',
+                'verbose_name_plural': 'Documentos de Búsqueda de Partos',
+            },
+        ),
+        migrations.RunPython(poblar_documentos, migrations.RunPython.noop),
+        migrations.RunPython(crear_indice_texto, eliminar_indice_texto),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registros', '0016_perfilimportacion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='madre',
+            index=models.Index(fields=['updated_at'], name='registros_madre_updated_idx'),
+        ),
+    ]
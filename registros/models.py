@@ -1,6 +1,53 @@
+from datetime import datetime, time, timedelta
+
 from django.db import models
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
+
+
+def inicio_dia(fecha):
+    """Primer instante del día local `fecha` (America/Santiago), con zona horaria si USE_TZ."""
+    inicio = datetime.combine(fecha, time.min)
+    return timezone.make_aware(inicio) if settings.USE_TZ else inicio
+
+
+def rango_dias(desde=None, hasta=None):
+    """Días locales [desde, hasta] como rango semiabierto de instantes (inicio, fin).
+
+    `fin` es el inicio del día siguiente a `hasta`; cualquiera de los extremos
+    puede ser None (sin límite).
+    """
+    inicio = inicio_dia(desde) if desde is not None else None
+    fin = inicio_dia(hasta + timedelta(days=1)) if hasta is not None else None
+    return inicio, fin
+
+
+class RangoFechasQuerySet(models.QuerySet):
+    """Filtro por días locales que el índice de `fecha_hora` puede usar.
+
+    `fecha_hora__date__range` envuelve la columna en una función (y no usa el
+    índice); `en_rango` compara la columna directamente con los límites del
+    rango semiabierto.
+    """
+    campo_fecha = 'fecha_hora'
+
+    def en_rango(self, desde=None, hasta=None):
+        inicio, fin = rango_dias(desde, hasta)
+        filtros = {}
+        if inicio is not None:
+            filtros[f'{self.campo_fecha}__gte'] = inicio
+        if fin is not None:
+            filtros[f'{self.campo_fecha}__lt'] = fin
+        return self.filter(**filtros)
+
+
+class PartoQuerySet(RangoFechasQuerySet):
+    campo_fecha = 'fecha_hora'
+
+
+class RecienNacidoQuerySet(RangoFechasQuerySet):
+    campo_fecha = 'parto__fecha_hora'
 
 class Madre(models.Model):
     ESTADO_CIVIL_CHOICES = [
@@ -23,8 +70,26 @@ class Madre(models.Model):
     ]
 
     rut = models.CharField(max_length=12, unique=True, verbose_name="RUT", db_index=True)
+    # Dígitos + DV sin puntos ni guion; clave de búsqueda exacta para madre_lookup
+    rut_normalizado = models.CharField(
+        max_length=12,
+        blank=True,
+        default='',
+        editable=False,
+        db_index=True,
+        verbose_name="RUT normalizado"
+    )
     nombres = models.CharField(max_length=100)
     apellidos = models.CharField(max_length=100)
+    # "nombres apellidos" en minúsculas y sin tildes; indexado para el typeahead
+    nombre_busqueda = models.CharField(
+        max_length=201,
+        blank=True,
+        default='',
+        editable=False,
+        db_index=True,
+        verbose_name="Nombre para búsqueda"
+    )
     fecha_nacimiento = models.DateField()
     estado_civil = models.CharField(max_length=20, choices=ESTADO_CIVIL_CHOICES)
     direccion = models.CharField(max_length=200)
@@ -49,6 +114,7 @@ class Madre(models.Model):
                 self.rut = format_rut(norm)
         except Exception:
             pass
+        self.sincronizar_claves_busqueda()
         from django.core.exceptions import ValidationError
         from datetime import date
         import re
@@ -97,23 +163,27 @@ class Madre(models.Model):
             if not re.match(r'^[0-9\+\s\-()]{7,20}$', self.telefono):
                 raise ValidationError('El formato del teléfono parece inválido. Use +56 9 XXXXXXXX o formato local.')
 
+    def sincronizar_claves_busqueda(self):
+        from .utils import clean_rut, fold_text
+        self.rut_normalizado = clean_rut(self.rut)
+        self.nombre_busqueda = fold_text(f"{self.nombres or ''} {self.apellidos or ''}")[:201]
+
+    def save(self, *args, **kwargs):
+        self.sincronizar_claves_busqueda()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if 'rut' in update_fields:
+                update_fields.add('rut_normalizado')
+            if update_fields & {'nombres', 'apellidos'}:
+                update_fields.add('nombre_busqueda')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
     @staticmethod
     def calcular_dv(rut):
-        multiplicador = 2
-        suma = 0
-        while rut > 0:
-            suma += (rut % 10) * multiplicador
-            multiplicador += 1
-            if multiplicador > 7:
-                multiplicador = 2
-            rut //= 10
-        resto = suma % 11
-        if resto == 0:
-            return 'K'
-        elif resto == 1:
-            return '0'
-        else:
-            return str(11 - resto)
+        from .utils import calculate_dv
+        return calculate_dv(rut)
 
     @property
     def edad(self):
@@ -129,6 +199,12 @@ class Madre(models.Model):
     class Meta:
         verbose_name = "Madre"
         verbose_name_plural = "Madres"
+        indexes = [
+            # Paginación por cursor de lista_madres
+            models.Index(fields=['created_at', 'id'], name='registros_madre_cursor_idx'),
+            # Cambios desde la última sincronización del índice de madres del navegador
+            models.Index(fields=['updated_at'], name='registros_madre_updated_idx'),
+        ]
 
 class Parto(models.Model):
     TIPO_PARTO_CHOICES = [
@@ -311,6 +387,8 @@ class Parto(models.Model):
         related_name='partos_registrados'
     )
 
+    objects = PartoQuerySet.as_manager()
+
     def clean(self):
         from django.core.exceptions import ValidationError
         from datetime import timedelta
@@ -350,6 +428,10 @@ class Parto(models.Model):
         verbose_name = "Parto"
         verbose_name_plural = "Partos"
         ordering = ['-fecha_hora']  # Ordenar por fecha descendente
+        indexes = [
+            # Paginación por cursor de lista_partos
+            models.Index(fields=['fecha_hora', 'id'], name='registros_parto_cursor_idx'),
+        ]
 
 class RecienNacido(models.Model):
     SEXO_CHOICES = [
@@ -386,6 +468,8 @@ class RecienNacido(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = RecienNacidoQuerySet.as_manager()
+
     def clean(self):
         from django.core.exceptions import ValidationError
         from datetime import datetime, timedelta
@@ -501,3 +585,173 @@ class SesionUsuario(models.Model):
     class Meta:
         verbose_name = "Sesión de Usuario"
         verbose_name_plural = "Sesiones de Usuario"
+
+
+class TrabajoExportacion(models.Model):
+    """Exportación encolada que procesa `manage.py procesar_exportaciones`.
+
+    La cola vive en la base de datos: el worker toma trabajos pendientes con un
+    UPDATE condicional sobre `estado`, de modo que varios workers pueden
+    convivir sin un broker externo.
+    """
+    TIPO_CHOICES = [
+        ('excel', 'Excel de partos'),
+        ('pdf', 'PDF de partos'),
+        ('rem', 'Reporte REM (Excel)'),
+    ]
+
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('completado', 'Completado'),
+        ('error', 'Error'),
+    ]
+
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    parametros = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
+    archivo = models.FileField(upload_to='exportaciones/%Y/%m/', blank=True)
+    nombre_archivo = models.CharField(max_length=200, blank=True)
+    error = models.TextField(blank=True)
+    intentos = models.PositiveSmallIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='exportaciones'
+    )
+
+    @property
+    def terminado(self):
+        return self.estado in ('completado', 'error')
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} #{self.pk} ({self.estado})"
+
+    class Meta:
+        verbose_name = "Trabajo de Exportación"
+        verbose_name_plural = "Trabajos de Exportación"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['estado', 'created_at'], name='registros_export_cola_idx'),
+        ]
+
+
+class ResumenDiario(models.Model):
+    """Conteo de partos y recién nacidos por día y dimensión (tabla de agregados).
+
+    Una fila por (fecha, dimensión, valor); `fecha` es el día local del parto y
+    `valor` queda vacío cuando el campo original es nulo. La mantienen las
+    señales de `registros.signals` y se reconstruye con
+    `manage.py reconstruir_resumen`.
+    """
+    DIMENSION_CHOICES = [
+        ('tipo_parto', 'Tipo de parto'),
+        ('tipo_anestesia', 'Tipo de anestesia'),
+        ('clasificacion_robson', 'Clasificación de Robson'),
+        ('edad_madre', 'Tramo de edad de la madre'),
+        ('rn_sexo', 'Sexo del recién nacido'),
+        ('rn_estado', 'Estado del recién nacido'),
+    ]
+
+    fecha = models.DateField()
+    dimension = models.CharField(max_length=30, choices=DIMENSION_CHOICES)
+    valor = models.CharField(max_length=30, blank=True, default='')
+    total = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.fecha} {self.dimension}={self.valor or '-'}: {self.total}"
+
+    class Meta:
+        verbose_name = "Resumen Diario"
+        verbose_name_plural = "Resúmenes Diarios"
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'dimension', 'valor'], name='registros_resumen_unico'),
+        ]
+
+
+class VersionDatos(models.Model):
+    """Token que cambia con cada modificación de los datos clínicos.
+
+    Sirve como parte de la clave de los cachés de reportes: cualquier cambio en
+    madres, partos o recién nacidos escribe un token nuevo (aleatorio, así no
+    se repite aunque una transacción se revierta) y los resultados cacheados
+    con el token anterior dejan de usarse. Vive en la base de datos para que
+    la web y el worker de exportaciones vean la misma versión.
+    """
+    clave = models.CharField(max_length=50, unique=True)
+    token = models.CharField(max_length=32)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.clave}: {self.token}"
+
+    class Meta:
+        verbose_name = "Versión de Datos"
+        verbose_name_plural = "Versiones de Datos"
+
+
+class DocumentoBusquedaParto(models.Model):
+    """Texto de búsqueda desnormalizado de un parto (una fila por parto).
+
+    Reúne en minúsculas y sin tildes el RUT normalizado y el nombre de la
+    madre, el profesional a cargo, el folio válido y el sexo/estado de sus
+    recién nacidos. Lo indexa FTS5 en SQLite (`registros_parto_busqueda_fts`) o
+    un índice GIN sobre `to_tsvector` en Postgres; lo mantienen las señales de
+    `registros.signals` y el importador masivo (ver `registros.search`).
+    """
+    parto = models.OneToOneField(
+        Parto,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='documento_busqueda'
+    )
+    texto = models.TextField(blank=True, default='')
+    actualizado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Búsqueda parto #{self.parto_id}"
+
+    class Meta:
+        verbose_name = "Documento de Búsqueda de Parto"
+        verbose_name_plural = "Documentos de Búsqueda de Partos"
+
+
+class PerfilImportacion(models.Model):
+    """Mapeo de columnas guardado para un formato de planilla conocido.
+
+    `huella` es el sha256 de las celdas normalizadas de la fila de cabecera:
+    al importar se calcula para las primeras filas de cada hoja y, si alguna
+    coincide con un perfil, se usan su fila y su mapeo sin volver a detectar.
+    Los perfiles detectados automáticamente se guardan sin confirmar; un
+    superusuario puede corregir el mapeo desde la vista previa y queda
+    confirmado para las próximas planillas con el mismo formato.
+    """
+    huella = models.CharField(max_length=64, unique=True)
+    encabezados = models.JSONField(default=list, blank=True)
+    columnas = models.JSONField(default=dict, blank=True)  # campo -> columna del Excel (o None)
+    confirmado = models.BooleanField(default=False)
+    confirmado_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='perfiles_importacion'
+    )
+    usos = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        estado = 'confirmado' if self.confirmado else 'automático'
+        return f"Perfil {self.huella[:12]} ({estado}, {len(self.encabezados)} columnas)"
+
+    class Meta:
+        verbose_name = "Perfil de Importación"
+        verbose_name_plural = "Perfiles de Importación"
+        ordering = ['-updated_at']
@@ -0,0 +1,122 @@
+"""Paginación por cursor (keyset) para las listas de partos y madres.
+
+En vez de `OFFSET` cada página filtra por la última clave vista
+(`(fecha_hora, id)` o `(created_at, id)`, en orden descendente), así que la
+página 100 cuesta lo mismo que la primera. Los cursores son opacos
+(base64 de un JSON con la clave y la dirección) y el total se cuenta una vez
+por versión de los datos y se guarda en la caché de Django.
+"""
+import base64
+import binascii
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .versiones import version_datos
+
+CONTEO_CACHE_SEGUNDOS = 300
+
+
+def codificar_cursor(valor, pk, direccion):
+    """Cursor opaco para la fila (`valor`, `pk`); `direccion` es 'sig' o 'ant'."""
+    datos = json.dumps([valor.isoformat(), pk, direccion], separators=(',', ':'))
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """(valor, pk, direccion) de un cursor, o None si no es válido."""
+    if not cursor:
+        return None
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        valor, pk, direccion = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        valor = parse_datetime(valor)
+    except (binascii.Error, ValueError, TypeError):
+        return None
+    if valor is None or not isinstance(pk, int) or direccion not in ('sig', 'ant'):
+        return None
+    return valor, pk, direccion
+
+
+class PaginaCursor:
+    """Una página de resultados con los cursores a la siguiente y la anterior.
+
+    Expone `has_next`/`has_previous` como `Page` para que las plantillas
+    existentes sigan funcionando.
+    """
+
+    def __init__(self, objetos, cursor_siguiente, cursor_anterior, total):
+        self.object_list = objetos
+        self.cursor_siguiente = cursor_siguiente
+        self.cursor_anterior = cursor_anterior
+        self.total = total
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.cursor_siguiente is not None
+
+    @property
+    def has_previous(self):
+        return self.cursor_anterior is not None
+
+
+def conteo_cacheado(queryset, version=None):
+    """`queryset.count()` guardado en caché mientras no cambie la versión de los datos."""
+    if version is None:
+        version = version_datos()
+    consulta = str(queryset.order_by().query)
+    clave = 'conteo:%s:%s' % (version, hashlib.sha1(consulta.encode()).hexdigest())
+    total = cache.get(clave)
+    if total is None:
+        total = queryset.count()
+        cache.set(clave, total, CONTEO_CACHE_SEGUNDOS)
+    return total
+
+
+def paginar_por_cursor(queryset, campo, cursor=None, por_pagina=10):
+    """Página de `queryset` ordenada por (`campo`, id) descendente a partir de `cursor`.
+
+    Con un cursor 'sig' trae las filas posteriores (más antiguas) a la clave;
+    con uno 'ant', las anteriores, leídas en orden ascendente y luego
+    invertidas. Se pide una fila extra para saber si hay más páginas.
+    """
+    posicion = decodificar_cursor(cursor)
+    total = conteo_cacheado(queryset)
+
+    if posicion is None:
+        filas = list(queryset.order_by(f'-{campo}', '-id')[:por_pagina + 1])
+        hay_mas, hay_antes = len(filas) > por_pagina, False
+        filas = filas[:por_pagina]
+    else:
+        valor, pk, direccion = posicion
+        if direccion == 'sig':
+            filtro = Q(**{f'{campo}__lt': valor}) | Q(**{campo: valor, 'id__lt': pk})
+            filas = list(queryset.filter(filtro).order_by(f'-{campo}', '-id')[:por_pagina + 1])
+            hay_mas, hay_antes = len(filas) > por_pagina, True
+            filas = filas[:por_pagina]
+        else:
+            filtro = Q(**{f'{campo}__gt': valor}) | Q(**{campo: valor, 'id__gt': pk})
+            filas = list(queryset.filter(filtro).order_by(campo, 'id')[:por_pagina + 1])
+            if len(filas) <= por_pagina:
+                # Se llegó al comienzo: mostrar la primera página completa
+                return paginar_por_cursor(queryset, campo, None, por_pagina)
+            hay_antes, hay_mas = True, True
+            filas = filas[:por_pagina][::-1]
+
+    siguiente = anterior = None
+    if filas and hay_mas:
+        ultima = filas[-1]
+        siguiente = codificar_cursor(getattr(ultima, campo), ultima.pk, 'sig')
+    if filas and hay_antes:
+        primera = filas[0]
+        anterior = codificar_cursor(getattr(primera, campo), primera.pk, 'ant')
+    return PaginaCursor(filas, siguiente, anterior, total)
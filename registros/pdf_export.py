@@ -1,42 +1,68 @@
-from django.http import HttpResponse
+from itertools import islice
+
+from django.conf import settings
 from django.template.loader import get_template
-from xhtml2pdf import pisa
-from io import BytesIO
-from django.utils import timezone
 from .models import Parto
+from .pdf_motor import generar_pdf_por_bloques
+from .versiones import fecha_version
+
+
+def partos_para_pdf(fecha_inicio=None, fecha_fin=None):
+    partos = Parto.objects.select_related('madre', 'created_by').prefetch_related('recien_nacidos').order_by('-fecha_hora', '-id')
+    if fecha_inicio and fecha_fin:
+        return partos.en_rango(fecha_inicio, fecha_fin)
+    return partos
 
-def exportar_datos_pdf(fecha_inicio=None, fecha_fin=None):
-    """
-    Genera un reporte PDF de los partos.
-    """
-    partos_qs = Parto.objects.select_related('madre', 'created_by').prefetch_related('recien_nacidos').order_by('-fecha_hora')
 
+def contexto_pdf_partos(fecha_inicio=None, fecha_fin=None):
     if fecha_inicio and fecha_fin:
-        partos = partos_qs.filter(fecha_hora__date__range=[fecha_inicio, fecha_fin])
         rango_fechas = f"Desde {fecha_inicio} hasta {fecha_fin}"
     else:
-        partos = partos_qs[:500] # Limit to 500 for PDF to avoid timeout/memory issues if too large
-        rango_fechas = "Todos los registros (Últimos 500)"
+        rango_fechas = "Todos los registros"
 
-    template_path = 'registros/pdf_report.html'
-    context = {
-        'partos': partos,
-        'fecha_generacion': timezone.now(),
+    return {
+        # El PDF se guarda en la caché de artefactos: lleva la fecha de los datos, no la de generación
+        'fecha_datos': fecha_version(),
         'rango_fechas': rango_fechas,
         'usuario_generador': 'Sistema' # Can be updated if request user is passed
     }
 
-    response = HttpResponse(content_type='application/pdf')
-    filename = f"Reporte_Partos_{timezone.now().strftime('%Y%m%d_%H%M')}.pdf"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
 
-    template = get_template(template_path)
-    html = template.render(context)
+def bloques_html_partos(fecha_inicio=None, fecha_fin=None, partos_por_bloque=None):
+    """Genera el HTML del reporte de a `partos_por_bloque` partos (PDF_PARTOS_POR_BLOQUE).
+
+    Los partos se leen con un iterador por lotes, así que solo un bloque vive
+    en memoria a la vez; el título va solo en el primer bloque.
+    """
+    partos_por_bloque = partos_por_bloque or settings.PDF_PARTOS_POR_BLOQUE
+    template = get_template('registros/pdf_report.html')
+    contexto = contexto_pdf_partos(fecha_inicio, fecha_fin)
+    partos = partos_para_pdf(fecha_inicio, fecha_fin).iterator(chunk_size=partos_por_bloque)
 
-    pisa_status = pisa.CreatePDF(
-       html, dest=response
+    primer_bloque = True
+    while True:
+        bloque = list(islice(partos, partos_por_bloque))
+        if not bloque and not primer_bloque:
+            return
+        yield template.render({**contexto, 'partos': bloque, 'primer_bloque': primer_bloque})
+        primer_bloque = False
+
+
+def nombre_archivo_pdf(fecha_inicio=None, fecha_fin=None):
+    if fecha_inicio and fecha_fin:
+        return f'Reporte_Partos_{fecha_inicio}_{fecha_fin}.pdf'
+    return 'Reporte_Partos_Completo.pdf'
+
+
+def generar_pdf_partos(destino, fecha_inicio=None, fecha_fin=None):
+    """
+    Escribe el reporte PDF de partos en `destino` (archivo binario abierto).
+    Los bloques se convierten en paralelo (PDF_PROCESOS) y se unen con numeración continua.
+    Devuelve el HTML del bloque con errores si xhtml2pdf los reportó, o None si todo salió bien.
+    """
+    return generar_pdf_por_bloques(
+        bloques_html_partos(fecha_inicio, fecha_fin),
+        destino,
+        procesos=settings.PDF_PROCESOS,
     )
 
-    if pisa_status.err:
-       return HttpResponse('We had some errors <pre>' + html + '</pre>')
-    return response
@@ -0,0 +1,213 @@
+"""Motor de PDF por bloques: convierte HTML a PDF en procesos aparte y une el resultado.
+
+No importa Django para que los procesos hijos (contexto 'spawn') puedan
+cargarlo sin configurar el proyecto: reciben HTML ya renderizado y escriben el
+PDF del bloque en un archivo temporal. Al unir se cuentan primero las páginas
+de cada bloque; con ese total cada bloque recibe por separado el pie "Página N
+de M" (reportlab + pypdf), así la numeración es continua. Los bloques
+numerados se copian uno a uno al destino (`_UnionIncremental`): solo un bloque
+a la vez está en memoria, y del resto se guardan las posiciones de sus objetos
+para la tabla xref.
+"""
+import gc
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject
+from reportlab.pdfgen import canvas
+
+MARGEN_PIE_CM = 0.5
+
+
+def html_a_pdf(html, ruta):
+    """Convierte un bloque de HTML a PDF en `ruta`. Devuelve True si xhtml2pdf no reportó errores."""
+    from xhtml2pdf import pisa
+    with open(ruta, 'wb') as destino:
+        return not pisa.CreatePDF(html, dest=destino).err
+
+
+def _pie_de_paginas(tamanos, primera, total):
+    """PDF con una página por tamaño que solo lleva el texto "Página N de M", con N desde `primera`."""
+    salida = io.BytesIO()
+    lienzo = canvas.Canvas(salida)
+    for numero, (ancho, alto) in enumerate(tamanos, start=primera):
+        lienzo.setPageSize((ancho, alto))
+        lienzo.setFont('Helvetica', 8)
+        lienzo.drawRightString(ancho - 28.35, MARGEN_PIE_CM * 28.35, f'Página {numero} de {total}')
+        lienzo.showPage()
+    lienzo.save()
+    salida.seek(0)
+    return PdfReader(salida)
+
+
+def _numerar_bloque(ruta, primera, total):
+    """Escribe junto a `ruta` una copia con el pie de página, numerada desde `primera`. Devuelve su ruta."""
+    escritor = PdfWriter(clone_from=ruta)
+    tamanos = [(float(p.mediabox.width), float(p.mediabox.height)) for p in escritor.pages]
+    for pagina, pie in zip(escritor.pages, _pie_de_paginas(tamanos, primera, total).pages):
+        pagina.merge_page(pie)
+        pagina.compress_content_streams()
+    numerado = f'{ruta}.numerado'
+    with open(numerado, 'wb') as archivo:
+        escritor.write(archivo)
+    return numerado
+
+
+class _UnionIncremental:
+    """Escribe un PDF agregando las páginas de otros PDF a medida que llegan.
+
+    Cada objeto se escribe apenas se copia, con un número nuevo; solo quedan en
+    memoria su posición en el archivo y los números de las páginas, que forman
+    el árbol /Pages al cerrar.
+    """
+    CATALOGO = 1
+    PAGINAS = 2
+
+    def __init__(self, destino):
+        self.destino = destino
+        self.posicion = 0
+        self.posiciones = [None, None, None]  # índice = número de objeto; 0 es el libre
+        self.paginas = []
+        self._escribir(b'%PDF-1.7\n%\xe2\xe3\xcf\xd3\n')
+
+    def _escribir(self, datos):
+        self.destino.write(datos)
+        self.posicion += len(datos)
+
+    def _nuevo_numero(self):
+        self.posiciones.append(None)
+        return len(self.posiciones) - 1
+
+    def _escribir_objeto(self, numero, objeto):
+        cuerpo = io.BytesIO()
+        objeto.write_to_stream(cuerpo)
+        self.posiciones[numero] = self.posicion
+        self._escribir(f'{numero} 0 obj\n'.encode() + cuerpo.getvalue() + b'\nendobj\n')
+
+    def agregar(self, ruta):
+        """Copia todas las páginas de `ruta` (y lo que referencian) al destino."""
+        lector = PdfReader(ruta)
+        numeros = {}
+        pendientes = []
+
+        def renumerar(referencia):
+            clave = (referencia.idnum, referencia.generation)
+            if clave not in numeros:
+                numeros[clave] = self._nuevo_numero()
+                pendientes.append(referencia)
+            return IndirectObject(numeros[clave], 0, None)
+
+        def reemplazar(objeto):
+            # Se recorre sin resolver referencias: DictionaryObject.__getitem__ las seguiría
+            if isinstance(objeto, IndirectObject):
+                return renumerar(objeto)
+            if isinstance(objeto, DictionaryObject):
+                for clave, valor in list(dict.items(objeto)):
+                    objeto[clave] = reemplazar(valor)
+            elif isinstance(objeto, ArrayObject):
+                for i, valor in enumerate(list(list.__iter__(objeto))):
+                    list.__setitem__(objeto, i, reemplazar(valor))
+            return objeto
+
+        # Las páginas se numeran primero para que los enlaces entre ellas apunten a los números nuevos
+        paginas = []
+        for pagina in lector.pages:
+            clave = (pagina.indirect_reference.idnum, pagina.indirect_reference.generation)
+            numeros[clave] = self._nuevo_numero()
+            paginas.append((numeros[clave], pagina))
+        for numero, pagina in paginas:
+            del pagina[NameObject('/Parent')]
+            reemplazar(pagina)
+            pagina[NameObject('/Parent')] = IndirectObject(self.PAGINAS, 0, None)
+            self._escribir_objeto(numero, pagina)
+            self.paginas.append(numero)
+        while pendientes:
+            referencia = pendientes.pop()
+            numero = numeros[(referencia.idnum, referencia.generation)]
+            self._escribir_objeto(numero, reemplazar(referencia.get_object()))
+
+    def cerrar(self):
+        """Escribe el catálogo, el árbol de páginas, la tabla xref y el trailer."""
+        kids = ' '.join(f'{numero} 0 R' for numero in self.paginas)
+        self.posiciones[self.CATALOGO] = self.posicion
+        self._escribir(f'{self.CATALOGO} 0 obj\n<< /Type /Catalog /Pages {self.PAGINAS} 0 R >>\nendobj\n'.encode())
+        self.posiciones[self.PAGINAS] = self.posicion
+        self._escribir(
+            f'{self.PAGINAS} 0 obj\n<< /Type /Pages /Kids [{kids}] /Count {len(self.paginas)} >>\nendobj\n'.encode()
+        )
+        inicio_xref = self.posicion
+        lineas = ['xref', f'0 {len(self.posiciones)}', '0000000000 65535 f ']
+        lineas += [f'{posicion:010d} 00000 n ' for posicion in self.posiciones[1:]]
+        lineas += ['trailer', f'<< /Size {len(self.posiciones)} /Root {self.CATALOGO} 0 R >>',
+                   'startxref', str(inicio_xref), '%%EOF']
+        self._escribir(('\n'.join(lineas) + '\n').encode())
+
+
+def unir_pdfs(rutas, destino):
+    """Concatena los PDF de `rutas` en `destino` con numeración de páginas continua."""
+    paginas = [len(PdfReader(ruta).pages) for ruta in rutas]
+    total = sum(paginas)
+    # Los objetos de pypdf se referencian en ciclo con su lector: sin recolectar
+    # cada bloque ya leído seguiría en memoria hasta una recolección completa
+    gc.collect()
+    union = _UnionIncremental(destino)
+    primera = 1
+    for ruta, cantidad in zip(rutas, paginas):
+        numerado = _numerar_bloque(ruta, primera, total)
+        union.agregar(numerado)
+        os.remove(numerado)
+        gc.collect()
+        primera += cantidad
+    union.cerrar()
+    return total
+
+
+def generar_pdf_por_bloques(bloques_html, destino, procesos=1):
+    """Convierte cada HTML de `bloques_html` (iterable, se consume de a poco) y une los PDF en `destino`.
+
+    Con `procesos` > 1 los bloques se convierten en paralelo con un
+    ProcessPoolExecutor, manteniendo a lo más dos bloques pendientes por
+    proceso para que la memoria no crezca con el largo del reporte. Devuelve
+    el HTML del primer bloque que falló, o None si todo salió bien.
+    """
+    carpeta = tempfile.mkdtemp(prefix='reporte_pdf_')
+    try:
+        rutas = []
+        if procesos <= 1:
+            for i, html in enumerate(bloques_html):
+                ruta = os.path.join(carpeta, f'{i:06d}.pdf')
+                if not html_a_pdf(html, ruta):
+                    return html
+                rutas.append(ruta)
+        else:
+            contexto = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto) as pool:
+                pendientes = []
+                for i, html in enumerate(bloques_html):
+                    ruta = os.path.join(carpeta, f'{i:06d}.pdf')
+                    pendientes.append((pool.submit(html_a_pdf, html, ruta), html, ruta))
+                    if len(pendientes) >= procesos * 2:
+                        error = _esperar(pendientes.pop(0), rutas)
+                        if error:
+                            return error
+                for pendiente in pendientes:
+                    error = _esperar(pendiente, rutas)
+                    if error:
+                        return error
+        unir_pdfs(rutas, destino)
+        return None
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+
+def _esperar(pendiente, rutas):
+    futuro, html, ruta = pendiente
+    if not futuro.result():
+        return html
+    rutas.append(ruta)
+    return None
@@ -0,0 +1,100 @@
+"""Directorio en memoria de los profesionales activos (`/api/profesionales/`).
+
+El buscador del registro de partos consulta la API en cada tecla, pero la
+nómina cambia pocas veces al mes. Cada proceso arma una vez la lista de
+profesionales activos con sus claves de búsqueda (tokens del nombre y del
+usuario sin tildes, RUN normalizado) y responde las búsquedas desde memoria,
+por prefijo de RUN o de tokens.
+
+La lista se asocia a la versión `CLAVE_PROFESIONALES` de `registros.versiones`,
+que las señales cambian al guardar o eliminar un usuario o un rol. El proceso
+que hizo el cambio descarta su lista en el acto; los demás comparan la versión
+en la base a lo más cada PROFESIONALES_VERIFICAR_SEGUNDOS.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.utils.http import quote_etag
+
+from .utils import clean_rut, fold_text
+from .versiones import version_datos
+
+CLAVE_PROFESIONALES = 'profesionales'
+MAX_RESULTADOS = 100
+# Un save() que solo toca otros campos (p. ej. last_login al iniciar sesión) no cambia el directorio
+CAMPOS_DIRECTORIO = {'username', 'first_name', 'last_name', 'run', 'is_active', 'rol'}
+
+
+def _entrada(prof):
+    nombre_completo = f"{prof.first_name or ''} {prof.last_name or ''}".strip() or prof.username
+    return {
+        'tokens': tuple(fold_text(f'{prof.first_name} {prof.last_name} {prof.username}').split()),
+        'rut': clean_rut(prof.run),
+        'dato': {
+            'id': prof.id,
+            'rut': prof.run or '',
+            'nombres': prof.first_name or '',
+            'apellidos': prof.last_name or '',
+            'area': prof.rol.nombre if prof.rol else 'Sin área',
+            'nombre_completo': nombre_completo,
+        },
+    }
+
+
+def construir_entradas():
+    from cuentas.models import Usuario
+
+    profesionales = (Usuario.objects.filter(is_active=True).select_related('rol')
+                     .only('id', 'username', 'first_name', 'last_name', 'run', 'rol__nombre')
+                     .order_by('first_name', 'last_name'))
+    return [_entrada(prof) for prof in profesionales]
+
+
+class Directorio:
+    """Lista de profesionales de este proceso y la versión con que se armó."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = None
+        self.verificado = 0.0
+        self.entradas = []
+
+    def invalidar(self):
+        with self._lock:
+            self.version = None
+
+    def actual(self):
+        """`(version, entradas)` vigentes; rearma la lista si la versión cambió."""
+        with self._lock:
+            ahora = time.monotonic()
+            if self.version is None or ahora - self.verificado >= settings.PROFESIONALES_VERIFICAR_SEGUNDOS:
+                version = version_datos(CLAVE_PROFESIONALES)
+                if version != self.version:
+                    self.entradas = construir_entradas()
+                    self.version = version
+                self.verificado = ahora
+            return self.version, self.entradas
+
+
+directorio = Directorio()
+
+
+def etag_profesionales(version, q):
+    return quote_etag(hashlib.sha256(f'{version}:{fold_text(q)}'.encode()).hexdigest()[:32])
+
+
+def buscar_profesionales(entradas, q, limite=MAX_RESULTADOS):
+    """Profesionales cuyo RUN empieza con `q` o cuyos tokens empiezan con cada palabra de `q`."""
+    palabras = fold_text(q).split()
+    rut = clean_rut(q) if any(c.isdigit() for c in q) else ''
+    resultados = []
+    for entrada in entradas:
+        if (not palabras
+                or (rut and entrada['rut'].startswith(rut))
+                or all(any(token.startswith(p) for token in entrada['tokens']) for p in palabras)):
+            resultados.append(entrada['dato'])
+            if len(resultados) >= limite:
+                break
+    return resultados
@@ -0,0 +1,264 @@
+"""Agregados diarios (`ResumenDiario`) para el dashboard y los reportes REM.
+
+La tabla guarda, por día local del parto, cuántos partos hay por tipo de
+parto, anestesia, clasificación de Robson y tramo de edad de la madre, y
+cuántos recién nacidos por sexo y estado. Las señales de `registros.signals`
+recalculan los días tocados por cada cambio y el importador masivo (que no
+dispara señales) llama a `recalcular_dias` al terminar.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, CharField, Count, Q, Sum, Value, When
+from django.db.models.functions import ExtractDay, ExtractMonth, ExtractYear, TruncDate
+from django.db.models.lookups import GreaterThan, LessThan
+from django.utils import timezone
+
+# Límite superior (exclusivo) de edad de cada tramo; el resto es '35_mas'
+TRAMOS_EDAD = [
+    (15, 'menor_15'),
+    (20, '15_19'),
+    (25, '20_24'),
+    (30, '25_29'),
+    (35, '30_34'),
+]
+TRAMO_EDAD_MAYOR = '35_mas'
+
+DIMENSIONES_PARTO = ['tipo_parto', 'tipo_anestesia', 'clasificacion_robson']
+DIMENSIONES_RN = {'rn_sexo': 'sexo', 'rn_estado': 'estado'}
+
+
+def expresion_edad_meses(campo_fecha='fecha_hora', campo_nacimiento='madre__fecha_nacimiento'):
+    """Edad en meses cumplidos calculada en la base de datos.
+
+    Usa el día local de `campo_fecha` (Extract* aplica la zona horaria actual):
+    (años * 12 + meses) de diferencia, menos uno si aún no se cumple el día del mes.
+    """
+    return (
+        (ExtractYear(campo_fecha) - ExtractYear(campo_nacimiento)) * 12
+        + ExtractMonth(campo_fecha) - ExtractMonth(campo_nacimiento)
+        - Case(
+            When(GreaterThan(ExtractDay(campo_nacimiento), ExtractDay(campo_fecha)), then=Value(1)),
+            default=Value(0),
+        )
+    )
+
+
+def expresion_tramo_edad(campo_fecha='fecha_hora', campo_nacimiento='madre__fecha_nacimiento'):
+    """Tramo de edad de la madre al momento del parto ('menor_15', ..., '35_mas') como CASE SQL."""
+    meses = expresion_edad_meses(campo_fecha, campo_nacimiento)
+    return Case(
+        *[When(LessThan(meses, limite * 12), then=Value(tramo)) for limite, tramo in TRAMOS_EDAD],
+        default=Value(TRAMO_EDAD_MAYOR),
+        output_field=CharField(),
+    )
+
+
+def fecha_local(valor):
+    """Día local de un datetime (el mismo que usaría `fecha_hora__date`)."""
+    if timezone.is_aware(valor):
+        return timezone.localtime(valor).date()
+    return valor.date()
+
+
+def filtro_tramos(campo, tramos):
+    """Q con los días locales de cada tramo `(desde, hasta)` como rango semiabierto sobre `campo`.
+
+    Equivale a `RangoFechasQuerySet.en_rango` por tramo, pero sirve también con
+    otros modelos que no tienen el manager.
+    """
+    from .models import rango_dias
+    filtro = Q()
+    for desde, hasta in tramos:
+        inicio, fin = rango_dias(desde, hasta)
+        filtro |= Q(**{f'{campo}__gte': inicio, f'{campo}__lt': fin})
+    return filtro
+
+
+def tramos_consecutivos(dias):
+    """Agrupa días en tramos `(desde, hasta)` de días consecutivos ({1, 2, 3, 7} -> [(1, 3), (7, 7)])."""
+    tramos = []
+    for dia in sorted(dias):
+        if tramos and dia == tramos[-1][1] + timedelta(days=1):
+            tramos[-1] = (tramos[-1][0], dia)
+        else:
+            tramos.append((dia, dia))
+    return tramos
+
+
+def calcular_resumen(tramos):
+    """Conteos {(fecha, dimension, valor): total} de los días de `tramos` (lista de `(desde, hasta)`)."""
+    from .models import Parto, RecienNacido
+
+    conteos = Counter()
+    partos = Parto.objects.filter(filtro_tramos('fecha_hora', tramos)).annotate(dia=TruncDate('fecha_hora'))
+    for dimension in DIMENSIONES_PARTO:
+        for fila in partos.values('dia', dimension).annotate(total=Count('id')).order_by():
+            conteos[(fila['dia'], dimension, fila[dimension] or '')] += fila['total']
+
+    por_tramo = partos.annotate(tramo=expresion_tramo_edad()).values('dia', 'tramo').annotate(total=Count('id'))
+    for fila in por_tramo.order_by():
+        conteos[(fila['dia'], 'edad_madre', fila['tramo'])] += fila['total']
+
+    recien_nacidos = RecienNacido.objects.filter(
+        filtro_tramos('parto__fecha_hora', tramos)
+    ).annotate(dia=TruncDate('parto__fecha_hora'))
+    for dimension, campo in DIMENSIONES_RN.items():
+        for fila in recien_nacidos.values('dia', campo).annotate(total=Count('id')).order_by():
+            conteos[(fila['dia'], dimension, fila[campo] or '')] += fila['total']
+    return conteos
+
+
+def _guardar(tramos, conteos, ResumenDiario):
+    """Escribe los conteos de `tramos` con upsert y borra las filas que quedaron en cero.
+
+    El upsert sobre (fecha, dimension, valor) evita el IntegrityError de dos
+    guardados concurrentes del mismo día que insertan la misma fila.
+    """
+    filtro = Q()
+    for desde, hasta in tramos:
+        filtro |= Q(fecha__range=[desde, hasta])
+    with transaction.atomic():
+        ResumenDiario.objects.bulk_create(
+            [
+                ResumenDiario(fecha=fecha, dimension=dimension, valor=valor, total=total)
+                for (fecha, dimension, valor), total in conteos.items()
+            ],
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['fecha', 'dimension', 'valor'],
+            update_fields=['total'],
+        )
+        existentes = ResumenDiario.objects.filter(filtro).values_list('id', 'fecha', 'dimension', 'valor')
+        sobrantes = [pk for pk, *clave in existentes if tuple(clave) not in conteos]
+        if sobrantes:
+            ResumenDiario.objects.filter(id__in=sobrantes).delete()
+
+
+def recalcular_dias(dias):
+    """Recalcula el resumen solo de los días indicados (se ignoran los None), por tramos consecutivos."""
+    from .models import ResumenDiario
+    tramos = tramos_consecutivos({d for d in dias if d is not None})
+    if tramos:
+        _guardar(tramos, calcular_resumen(tramos), ResumenDiario)
+
+
+def reconstruir_resumen(dias_por_tramo=366):
+    """Recalcula toda la tabla por tramos de `dias_por_tramo` días. Devuelve las filas escritas."""
+    from .models import Parto, RecienNacido, ResumenDiario
+
+    primero = Parto.objects.order_by('fecha_hora').values_list('fecha_hora', flat=True).first()
+    ultimo = Parto.objects.order_by('-fecha_hora').values_list('fecha_hora', flat=True).first()
+    if primero is None:
+        ResumenDiario.objects.all().delete()
+        return 0
+
+    desde, fin = fecha_local(primero), fecha_local(ultimo)
+    with transaction.atomic():
+        ResumenDiario.objects.exclude(fecha__range=[desde, fin]).delete()
+        total = 0
+        while desde <= fin:
+            hasta = min(desde + timedelta(days=dias_por_tramo - 1), fin)
+            conteos = calcular_resumen([(desde, hasta)])
+            _guardar([(desde, hasta)], conteos, ResumenDiario)
+            total += len(conteos)
+            desde = hasta + timedelta(days=1)
+    return total
+
+
+def conteos_resumen(desde, hasta, dimensiones):
+    """{dimension: {valor: total}} sumando los días [desde, hasta] (None = sin límite), en una consulta."""
+    from .models import ResumenDiario
+
+    filas = ResumenDiario.objects.filter(dimension__in=dimensiones)
+    if desde is not None:
+        filas = filas.filter(fecha__gte=desde)
+    if hasta is not None:
+        filas = filas.filter(fecha__lte=hasta)
+    conteos = {dimension: {} for dimension in dimensiones}
+    for fila in filas.values('dimension', 'valor').annotate(total=Sum('total')).order_by():
+        conteos[fila['dimension']][fila['valor']] = fila['total']
+    return conteos
+
+
+def totales_resumen(desde, hasta, dimension):
+    """{valor: total} de una dimensión sumando los días [desde, hasta] (None = sin límite)."""
+    return conteos_resumen(desde, hasta, [dimension])[dimension]
+
+
+def conteos_bs22(desde, hasta):
+    """Conteos del REM-BS22 leídos del resumen diario (una consulta).
+
+    Devuelve {'total', 'tipo_parto', 'tipo_anestesia', 'edad_madre'}; los
+    valores nulos del campo original quedan con clave None.
+    """
+    conteos = conteos_resumen(desde, hasta, ['tipo_parto', 'tipo_anestesia', 'edad_madre'])
+    for dimension in ('tipo_parto', 'tipo_anestesia'):
+        conteos[dimension] = {valor or None: total for valor, total in conteos[dimension].items()}
+    conteos['total'] = sum(conteos['tipo_parto'].values())
+    return conteos
+
+
+def conteos_rn(desde, hasta):
+    """Recién nacidos por sexo y estado ({'rn_sexo', 'rn_estado'}) leídos del resumen diario."""
+    return conteos_resumen(desde, hasta, list(DIMENSIONES_RN))
+
+
+def conteos_rn_directo(desde, hasta):
+    """Mismos conteos que `conteos_rn` en una consulta sobre recién nacidos (join por parto_id)."""
+    from .models import RecienNacido
+
+    conteos = {dimension: {} for dimension in DIMENSIONES_RN}
+    filas = (
+        RecienNacido.objects.en_rango(desde, hasta)
+        .values(*DIMENSIONES_RN.values())
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    for fila in filas:
+        for dimension, campo in DIMENSIONES_RN.items():
+            valor = fila[campo] or ''
+            conteos[dimension][valor] = conteos[dimension].get(valor, 0) + fila['total']
+    return conteos
+
+
+def conteos_bs22_directo(desde, hasta):
+    """Mismos conteos que `conteos_bs22`, calculados sobre los partos en una sola consulta.
+
+    Agregación condicional (COUNT ... FILTER / CASE) sobre tipo de parto,
+    anestesia y tramo de edad, sin instanciar partos ni madres.
+    """
+    from .models import Parto
+
+    columnas = {
+        'tipo_parto': [valor for valor, _ in Parto.TIPO_PARTO_CHOICES] + [None],
+        'tipo_anestesia': [valor for valor, _ in Parto.TIPO_ANESTESIA_CHOICES] + [None],
+        'edad_madre': [tramo for _, tramo in TRAMOS_EDAD] + [TRAMO_EDAD_MAYOR],
+    }
+    agregados = {'total': Count('id')}
+    alias = {}
+    for dimension, valores in columnas.items():
+        campo = 'tramo' if dimension == 'edad_madre' else dimension
+        for i, valor in enumerate(valores):
+            nombre = f'{dimension}_{i}'
+            alias[nombre] = (dimension, valor)
+            filtro = Q(**{f'{campo}__isnull': True}) if valor is None else Q(**{campo: valor})
+            agregados[nombre] = Count('id', filter=filtro)
+
+    fila = (
+        Parto.objects.en_rango(desde, hasta)
+        .annotate(tramo=expresion_tramo_edad())
+        .aggregate(**agregados)
+    )
+    # Como en el resumen (GROUP BY), solo aparecen los valores con partos
+    conteos = {dimension: {} for dimension in columnas}
+    for nombre, (dimension, valor) in alias.items():
+        if fila[nombre]:
+            conteos[dimension][valor] = fila[nombre]
+    conteos['total'] = fila['total']
+    return conteos
+
+
+def total_partos(desde=None, hasta=None):
+    return sum(totales_resumen(desde, hasta, 'tipo_parto').values())
@@ -0,0 +1,215 @@
+"""Motores de búsqueda de madres (typeahead) y de partos (lista_partos).
+
+Madres: dos caminos, ambos acotados con LIMIT en SQL:
+
+* Prefijo de RUT sobre `Madre.rut_normalizado` como rango (>=, <) para que
+  cualquier motor use el índice B-tree.
+* Tokens de nombre sin tildes sobre `Madre.nombre_busqueda`: FTS5 en SQLite,
+  trigramas (pg_trgm) en Postgres y `LIKE` sobre el campo indexado en el resto.
+
+Lotes de RUT (`resolver_ruts`): una sola consulta `IN` sobre
+`Madre.rut_normalizado` con las claves distintas del lote.
+
+Partos: una consulta de coincidencia sobre `DocumentoBusquedaParto.texto`
+(FTS5 en SQLite, `tsvector` en Postgres), que se reescribe con
+`actualizar_documentos` cada vez que cambia el parto, su madre o sus
+recién nacidos.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+from .models import Madre
+from .utils import clean_rut, fold_text, normalize_rut
+
+FTS_MADRES = 'registros_madre_fts'
+FTS_PARTOS = 'registros_parto_busqueda_fts'
+LOTE_DOCUMENTOS = 1000
+
+_fts_disponible = {}
+
+
+def siguiente_prefijo(prefijo):
+    """Menor cadena mayor que todas las que empiezan con `prefijo` ('123' -> '124')."""
+    return prefijo[:-1] + chr(ord(prefijo[-1]) + 1)
+
+
+def tokens_nombre(texto):
+    return re.findall(r'\w+', fold_text(texto))
+
+
+def tabla_fts_disponible(tabla):
+    """True si la tabla virtual FTS5 existe en la base de datos actual (cacheado por base)."""
+    if connection.vendor != 'sqlite':
+        return False
+    clave = (connection.settings_dict['NAME'], tabla)
+    if clave not in _fts_disponible:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [tabla]
+            )
+            _fts_disponible[clave] = cursor.fetchone() is not None
+    return _fts_disponible[clave]
+
+
+def expresion_fts(tokens):
+    """Consulta FTS5 con prefijo por token: ["ana", "per"] -> '"ana"* AND "per"*'."""
+    return ' AND '.join('"%s"*' % t.replace('"', '""') for t in tokens)
+
+
+def _ids_por_rut(prefijo, limite):
+    return list(
+        Madre.objects.filter(
+            rut_normalizado__gte=prefijo,
+            rut_normalizado__lt=siguiente_prefijo(prefijo),
+        ).order_by('rut_normalizado').values_list('id', flat=True)[:limite]
+    )
+
+
+def _ids_por_nombre(tokens, limite):
+    if tabla_fts_disponible(FTS_MADRES):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_MADRES} WHERE {FTS_MADRES} MATCH %s "
+                f"ORDER BY bm25({FTS_MADRES}) LIMIT %s",
+                [expresion_fts(tokens), limite],
+            )
+            return [fila[0] for fila in cursor.fetchall()]
+
+    qs = Madre.objects.all()
+    for token in tokens:
+        qs = qs.filter(nombre_busqueda__contains=token)
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramSimilarity
+        qs = qs.annotate(similitud=TrigramSimilarity('nombre_busqueda', ' '.join(tokens)))
+        qs = qs.order_by('-similitud', 'nombre_busqueda')
+    else:
+        qs = qs.order_by('nombre_busqueda')
+    return list(qs.values_list('id', flat=True)[:limite])
+
+
+def buscar_madres(q, limite=10):
+    """Devuelve hasta `limite` madres que coinciden con `q`, ordenadas por relevancia.
+
+    Las coincidencias por prefijo de RUT van primero (la exacta antes que las
+    más largas), seguidas por las coincidencias por nombre.
+    """
+    q = (q or '').strip()
+    if not q:
+        return []
+
+    ids = []
+    if any(c.isdigit() for c in q):
+        prefijo = clean_rut(q)
+        if prefijo:
+            ids.extend(_ids_por_rut(prefijo, limite))
+
+    tokens = [t for t in tokens_nombre(q) if not t.isdigit()]
+    if tokens and len(ids) < limite:
+        for madre_id in _ids_por_nombre(tokens, limite):
+            if madre_id not in ids:
+                ids.append(madre_id)
+
+    ids = ids[:limite]
+    if not ids:
+        return []
+    por_id = Madre.objects.only('id', 'rut', 'nombres', 'apellidos').in_bulk(ids)
+    return [por_id[i] for i in ids if i in por_id]
+
+
+def resolver_ruts(entradas):
+    """Resuelve un lote de RUT tal como llegaron, en orden.
+
+    Devuelve una tupla `(entrada, rut_normalizado, madre)` por entrada:
+    `rut_normalizado` vacío si el RUT es inválido y `madre` None si no existe.
+    """
+    normalizados = [normalize_rut('' if entrada is None else str(entrada)) for entrada in entradas]
+    claves = {rut for rut in normalizados if rut}
+    madres = {}
+    if claves:
+        # Igual que madre_lookup, si dos RUT escritos distinto comparten clave gana la primera madre
+        for madre in Madre.objects.filter(rut_normalizado__in=claves).order_by('pk'):
+            madres.setdefault(madre.rut_normalizado, madre)
+    return [(entrada, rut, madres.get(rut)) for entrada, rut in zip(entradas, normalizados)]
+
+
+def texto_documento_parto(parto):
+    """Texto de búsqueda de un parto (con `madre` y `recien_nacidos` ya cargados)."""
+    madre = parto.madre
+    partes = [madre.rut_normalizado, madre.nombres, madre.apellidos, parto.profesional_a_cargo, parto.folio_valido]
+    for rn in parto.recien_nacidos.all():
+        partes += [rn.get_sexo_display(), rn.get_estado_display()]
+    return fold_text(' '.join(p for p in partes if p))
+
+
+def actualizar_documentos(parto_ids=None, madre_ids=None, Parto=None, DocumentoBusquedaParto=None):
+    """Reescribe los documentos de búsqueda de los partos indicados.
+
+    Se filtra por ids de parto, por ids de madre o por ambos; sin filtros se
+    reescriben todos. Los modelos se pueden pasar explícitamente para usar la
+    función desde una migración. Devuelve la cantidad de documentos escritos.
+    """
+    if Parto is None or DocumentoBusquedaParto is None:
+        from .models import DocumentoBusquedaParto, Parto
+
+    partos = Parto.objects.select_related('madre').prefetch_related('recien_nacidos').order_by('id')
+    if parto_ids is not None:
+        partos = partos.filter(id__in=list(parto_ids))
+    if madre_ids is not None:
+        partos = partos.filter(madre_id__in=list(madre_ids))
+
+    total = 0
+    lote = []
+    with transaction.atomic():
+        for parto in partos.iterator(chunk_size=LOTE_DOCUMENTOS):
+            lote.append(DocumentoBusquedaParto(parto_id=parto.pk, texto=texto_documento_parto(parto)))
+            if len(lote) >= LOTE_DOCUMENTOS:
+                total += _guardar_documentos(lote, DocumentoBusquedaParto)
+                lote = []
+        if lote:
+            total += _guardar_documentos(lote, DocumentoBusquedaParto)
+    return total
+
+
+def _guardar_documentos(documentos, DocumentoBusquedaParto):
+    DocumentoBusquedaParto.objects.filter(parto_id__in=[d.parto_id for d in documentos]).delete()
+    DocumentoBusquedaParto.objects.bulk_create(documentos)
+    return len(documentos)
+
+
+def tokens_busqueda_parto(q):
+    """Tokens de la búsqueda de partos: un RUT (con o sin puntos y guion) queda como un solo token."""
+    q = (q or '').strip()
+    if re.fullmatch(r'[\d.\-\skK]+', q) and any(c.isdigit() for c in q):
+        return [clean_rut(q).lower()]
+    return tokens_nombre(q)
+
+
+def expresion_tsquery(tokens):
+    """Consulta `to_tsquery` con prefijo por token: ["ana", "per"] -> "'ana':* & 'per':*"."""
+    return ' & '.join("'%s':*" % t.replace("'", "''") for t in tokens)
+
+
+def filtrar_partos(partos, q):
+    """Filtra `partos` por la búsqueda `q` con una sola subconsulta sobre el índice de texto.
+
+    Cada token debe aparecer como prefijo de alguna palabra del documento
+    (RUT, nombre de la madre, profesional, folio, sexo o estado del RN).
+    """
+    tokens = tokens_busqueda_parto(q)
+    if not tokens:
+        return partos
+    if tabla_fts_disponible(FTS_PARTOS):
+        ids = RawSQL(f"SELECT rowid FROM {FTS_PARTOS} WHERE {FTS_PARTOS} MATCH %s", [expresion_fts(tokens)])
+        return partos.filter(id__in=ids)
+    if connection.vendor == 'postgresql':
+        ids = RawSQL(
+            "SELECT parto_id FROM registros_documentobusquedaparto "
+            "WHERE to_tsvector('simple', texto) @@ to_tsquery('simple', %s)",
+            [expresion_tsquery(tokens)],
+        )
+        return partos.filter(id__in=ids)
+    for token in tokens:
+        partos = partos.filter(documento_busqueda__texto__contains=token)
+    return partos
@@ -0,0 +1,153 @@
+"""Mantiene `ResumenDiario` al día: cada cambio recalcula los días que toca.
+
+`pre_save` recuerda el día anterior del registro (si cambió la fecha del parto
+hay que corregir ambos días) y `post_save`/`post_delete` recalculan. Los
+mismos cambios reescriben el `DocumentoBusquedaParto` de los partos afectados
+y marcan una nueva versión de los datos (`registros.versiones`).
+
+Los cambios de usuarios y roles marcan la versión del directorio de
+profesionales (`registros.profesionales`) y eliminar una madre, la del índice
+de madres del navegador (`registros.indice_madres`).
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from cuentas.models import Rol
+
+from .indice_madres import CLAVE_INDICE_MADRES
+from .models import Madre, Parto, RecienNacido
+from .profesionales import CAMPOS_DIRECTORIO, CLAVE_PROFESIONALES, directorio
+from .resumen import fecha_local, recalcular_dias
+from .search import actualizar_documentos
+from .versiones import marcar_cambio
+
+
+def _dia_parto(parto_id):
+    fecha_hora = Parto.objects.filter(pk=parto_id).values_list('fecha_hora', flat=True).first()
+    return fecha_local(fecha_hora) if fecha_hora else None
+
+
+@receiver(pre_save, sender=Parto)
+def recordar_dia_parto(sender, instance, raw=False, **kwargs):
+    instance._dia_resumen_anterior = _dia_parto(instance.pk) if instance.pk and not raw else None
+
+
+@receiver(post_save, sender=Parto)
+def actualizar_resumen_parto(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    recalcular_dias({getattr(instance, '_dia_resumen_anterior', None), fecha_local(instance.fecha_hora)})
+
+
+@receiver(post_delete, sender=Parto)
+def quitar_parto_del_resumen(sender, instance, **kwargs):
+    recalcular_dias({fecha_local(instance.fecha_hora)})
+
+
+@receiver(pre_save, sender=RecienNacido)
+def recordar_parto_recien_nacido(sender, instance, raw=False, **kwargs):
+    anterior = parto_anterior = None
+    if instance.pk and not raw:
+        parto_id = RecienNacido.objects.filter(pk=instance.pk).values_list('parto_id', flat=True).first()
+        if parto_id and parto_id != instance.parto_id:
+            anterior = _dia_parto(parto_id)
+            parto_anterior = parto_id
+    instance._dia_resumen_anterior = anterior
+    instance._parto_anterior_id = parto_anterior
+
+
+@receiver(post_save, sender=RecienNacido)
+def actualizar_resumen_recien_nacido(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    recalcular_dias({getattr(instance, '_dia_resumen_anterior', None), _dia_parto(instance.parto_id)})
+
+
+@receiver(post_delete, sender=RecienNacido)
+def quitar_recien_nacido_del_resumen(sender, instance, **kwargs):
+    # Si el parto también se está borrando, su propio post_delete corrige el día
+    recalcular_dias({_dia_parto(instance.parto_id)})
+
+
+@receiver(pre_save, sender=Madre)
+def recordar_datos_madre(sender, instance, raw=False, **kwargs):
+    anterior = None
+    if instance.pk and not raw:
+        anterior = Madre.objects.filter(pk=instance.pk).values_list(
+            'fecha_nacimiento', 'rut_normalizado', 'nombre_busqueda'
+        ).first()
+    instance._fecha_nacimiento_anterior = anterior[0] if anterior else None
+    instance._claves_busqueda_anteriores = anterior[1:] if anterior else None
+
+
+@receiver(post_save, sender=Madre)
+def actualizar_resumen_madre(sender, instance, created=False, raw=False, **kwargs):
+    # El tramo de edad de sus partos depende de la fecha de nacimiento
+    anterior = getattr(instance, '_fecha_nacimiento_anterior', None)
+    if raw or created or anterior is None or anterior == instance.fecha_nacimiento:
+        return
+    fechas = instance.partos.values_list('fecha_hora', flat=True)
+    recalcular_dias({fecha_local(f) for f in fechas})
+
+
+def _borrado_en_cascada(origin, modelos):
+    """True si el borrado partió de una instancia o queryset de `modelos`."""
+    modelo = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return modelo in modelos
+
+
+@receiver(post_save, sender=Parto)
+def actualizar_busqueda_parto(sender, instance, raw=False, **kwargs):
+    if not raw:
+        actualizar_documentos(parto_ids=[instance.pk])
+
+
+@receiver(post_save, sender=RecienNacido)
+def actualizar_busqueda_recien_nacido(sender, instance, raw=False, **kwargs):
+    if not raw:
+        partos = {instance.parto_id, getattr(instance, '_parto_anterior_id', None)}
+        actualizar_documentos(parto_ids=partos - {None})
+
+
+@receiver(post_delete, sender=RecienNacido)
+def quitar_recien_nacido_de_busqueda(sender, instance, origin=None, **kwargs):
+    # Al borrar el parto (o la madre) el documento se elimina en cascada
+    if not _borrado_en_cascada(origin, (Parto, Madre)):
+        actualizar_documentos(parto_ids=[instance.parto_id])
+
+
+@receiver(post_save, sender=Madre)
+def actualizar_busqueda_madre(sender, instance, created=False, raw=False, **kwargs):
+    anteriores = getattr(instance, '_claves_busqueda_anteriores', None)
+    if raw or created or anteriores == (instance.rut_normalizado, instance.nombre_busqueda):
+        return
+    actualizar_documentos(madre_ids=[instance.pk])
+
+
+@receiver(post_save, sender=Madre)
+@receiver(post_save, sender=Parto)
+@receiver(post_save, sender=RecienNacido)
+@receiver(post_delete, sender=Madre)
+@receiver(post_delete, sender=Parto)
+@receiver(post_delete, sender=RecienNacido)
+def nueva_version_datos(sender, raw=False, **kwargs):
+    if not raw:
+        marcar_cambio()
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_save, sender=Rol)
+@receiver(post_delete, sender=get_user_model())
+@receiver(post_delete, sender=Rol)
+def nueva_version_profesionales(sender, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not CAMPOS_DIRECTORIO & set(update_fields)):
+        return
+    marcar_cambio(CLAVE_PROFESIONALES)
+    directorio.invalidar()
+
+
+@receiver(post_delete, sender=Madre)
+def nueva_version_indice_madres(sender, **kwargs):
+    marcar_cambio(CLAVE_INDICE_MADRES)
@@ -0,0 +1,255 @@
+"""Datos sintéticos para medir la aplicación a escala (`manage.py generar_datos_sinteticos`).
+
+Genera madres, partos y recién nacidos con distribuciones plausibles sobre
+los choices del modelo (tipo de parto, Robson, anestesia, APGAR, peso y talla
+según semanas) y RUT válidos (`utils.calculate_dv`). Escribe por lotes con
+bulk_create, así que al final hace lo mismo que el importador masivo:
+documentos de búsqueda, resumen diario y versión de datos.
+
+Los registros quedan a nombre del usuario USUARIO_SINTETICO, lo que permite
+a `benchmark.hay_datos_reales` (usado por `manage.py benchmark`) distinguir una
+base sintética de una real.
+"""
+import random
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Madre, Parto, RecienNacido
+from .resumen import fecha_local, recalcular_dias
+from .search import actualizar_documentos
+from .utils import calculate_dv, format_rut
+from .versiones import marcar_cambio
+
+USUARIO_SINTETICO = 'datos_sinteticos'
+LOTE_SINTETICOS = 1000
+
+NOMBRES = [
+    'María', 'Catalina', 'Javiera', 'Constanza', 'Francisca', 'Valentina', 'Camila', 'Fernanda',
+    'Daniela', 'Carolina', 'Paula', 'Antonia', 'Josefa', 'Isidora', 'Sofía', 'Ignacia', 'Macarena',
+    'Bárbara', 'Nicole', 'Tamara', 'Yasna', 'Karen', 'Paola', 'Andrea', 'Marcela', 'Claudia',
+]
+SEGUNDOS_NOMBRES = ['José', 'Paz', 'Ignacia', 'Belén', 'Jesús', 'Antonia', 'Fernanda', 'Isabel', '']
+APELLIDOS = [
+    'González', 'Muñoz', 'Rojas', 'Díaz', 'Pérez', 'Soto', 'Contreras', 'Silva', 'Martínez',
+    'Sepúlveda', 'Morales', 'Rodríguez', 'López', 'Fuentes', 'Hernández', 'Torres', 'Araya',
+    'Flores', 'Espinoza', 'Valenzuela', 'Castillo', 'Tapia', 'Reyes', 'Gutiérrez', 'Castro',
+    'Pizarro', 'Álvarez', 'Vásquez', 'Sánchez', 'Fernández', 'Ramírez', 'Carrasco', 'Gómez',
+]
+CALLES = ['Los Aromos', 'Av. Alemania', 'Caupolicán', 'Prat', 'O\'Higgins', 'Balmaceda', 'Lautaro', 'Rodríguez']
+PROFESIONALES = [
+    'Matrona Ana Fuentes', 'Matrona Carla Soto', 'Matrona Pía Morales', 'Matrón Luis Araya',
+    'Matrona Daniela Reyes', 'Matrona Javiera Tapia', 'Dr. Pedro Castillo', 'Dra. Marta Vásquez',
+]
+CAUSAS_CESAREA = ['Sufrimiento fetal agudo', 'Cesárea anterior', 'Podálica', 'Prueba de trabajo de parto fracasada',
+                  'Desproporción cefalopélvica', 'Síndrome hipertensivo del embarazo']
+
+# (valor, peso) sobre los choices de los modelos
+PESOS_TIPO_PARTO = [('eutocico', 58), ('cesarea_urgencia', 20), ('cesarea_electiva', 14), ('distocico', 8)]
+PESOS_ROBSON = [
+    ('grupo_1', 20), ('grupo_2a', 8), ('grupo_2b', 6), ('grupo_3', 25), ('grupo_4a', 7), ('grupo_4b', 4),
+    ('grupo_5a', 15), ('grupo_5b', 3), ('grupo_6', 2), ('grupo_7', 2), ('grupo_8', 2), ('grupo_10', 6),
+]
+PESOS_ANESTESIA_VAGINAL = [('epidural', 55), ('ninguna', 30), ('local', 15)]
+PESOS_ANESTESIA_CESAREA = [('raquidea', 85), ('epidural', 10), ('general', 5)]
+PESOS_ESTADO_CIVIL = [('soltera', 45), ('conviviente', 30), ('casada', 20), ('divorciada', 4), ('viuda', 1)]
+PESOS_PREVISION = [
+    ('fonasa_a', 25), ('fonasa_b', 30), ('fonasa_c', 12), ('fonasa_d', 10), ('isapre', 15),
+    ('particular', 3), ('prais', 3), ('otra', 2),
+]
+PESOS_ACOMPANANTE = [('pareja', 75), ('padre_madre', 12), ('hermano', 7), ('suegro', 3), ('tio', 3)]
+PESOS_APGAR_1 = [(9, 55), (8, 28), (7, 7), (6, 3), (5, 2), (4, 2), (3, 1), (2, 1), (1, 1)]
+
+
+def _elegir(rng, pesos):
+    valores, ponderaciones = zip(*pesos)
+    return rng.choices(valores, weights=ponderaciones)[0]
+
+
+def _acotar(valor, minimo, maximo):
+    return max(minimo, min(maximo, valor))
+
+
+class GeneradorSintetico:
+    """Genera registros con un `random.Random` propio (reproducible con `semilla`)."""
+
+    def __init__(self, semilla=None, dias=365, hasta=None):
+        self.rng = random.Random(semilla)
+        self.dias = dias
+        self.hasta = hasta or timezone.now()
+        self.ruts_usados = set()
+
+    def excluir_ruts_existentes(self):
+        """Evita generar RUT que ya están en la base."""
+        for rut in Madre.objects.values_list('rut_normalizado', flat=True).iterator():
+            if rut[:-1].isdigit():
+                self.ruts_usados.add(int(rut[:-1]))
+
+    def rut(self):
+        while True:
+            numero = self.rng.randrange(5_000_000, 26_000_000)
+            if numero not in self.ruts_usados:
+                self.ruts_usados.add(numero)
+                return f'{numero}{calculate_dv(numero)}'
+
+    def madre(self, rut_normalizado, usuario):
+        rng = self.rng
+        edad = _acotar(round(rng.gauss(29, 6)), 14, 48)
+        nacimiento = date.today() - timedelta(days=edad * 365 + rng.randrange(365))
+        nombres = f'{rng.choice(NOMBRES)} {rng.choice(SEGUNDOS_NOMBRES)}'.strip()
+        madre = Madre(
+            rut=format_rut(rut_normalizado),
+            nombres=nombres,
+            apellidos=f'{rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}',
+            fecha_nacimiento=nacimiento,
+            estado_civil=_elegir(rng, PESOS_ESTADO_CIVIL),
+            direccion=f'{rng.choice(CALLES)} {rng.randrange(1, 3000)}',
+            telefono=f'+56 9 {rng.randrange(10_000_000, 99_999_999)}',
+            prevision=_elegir(rng, PESOS_PREVISION),
+            created_by=usuario,
+        )
+        madre.sincronizar_claves_busqueda()
+        return madre
+
+    def parto(self, madre, usuario, folio):
+        rng = self.rng
+        fecha_hora = self.hasta - timedelta(seconds=rng.randrange(self.dias * 86400))
+        semanas = _acotar(round(rng.gauss(39, 1.6)), 24, 42)
+        tipo = _elegir(rng, PESOS_TIPO_PARTO)
+        cesarea = tipo.startswith('cesarea')
+        acompanada = rng.random() < 0.85
+        return Parto(
+            madre=madre,
+            fecha_hora=fecha_hora,
+            paridad=min(int(rng.expovariate(0.9)), 8),
+            semanas_obstetricas=semanas,
+            semanas_obstetricas_dias=rng.randrange(7),
+            semanas_gestacion=semanas,
+            monitor=rng.random() < 0.8,
+            ttc=rng.random() < 0.1,
+            induccion=rng.random() < 0.25,
+            tipo_parto=tipo,
+            alumbramiento_dirigido=not cesarea and rng.random() < 0.9,
+            clasificacion_robson=_elegir(rng, PESOS_ROBSON),
+            tipo_anestesia=_elegir(rng, PESOS_ANESTESIA_CESAREA if cesarea else PESOS_ANESTESIA_VAGINAL),
+            acompanamiento_parto=acompanada,
+            persona_acompanante=_elegir(rng, PESOS_ACOMPANANTE) if acompanada else None,
+            motivo_parto_no_acompanado='' if acompanada else 'Sin acompañante disponible',
+            acompanante_secciona_cordon=acompanada and not cesarea and rng.random() < 0.5,
+            profesional_a_cargo=rng.choice(PROFESIONALES),
+            causa_cesarea=rng.choice(CAUSAS_CESAREA) if cesarea else '',
+            uso_sala_saip=rng.random() < 0.3,
+            retira_placenta=rng.random() < 0.2,
+            estampado_placenta=rng.random() < 0.4,
+            folio_valido=str(folio),
+            created_by=usuario,
+        )
+
+    def recien_nacido(self, parto):
+        """Peso y talla según semanas, dentro de los rangos que acepta `RecienNacido.clean`."""
+        rng = self.rng
+        semanas = parto.semanas_gestacion
+        if semanas >= 37:
+            peso = _acotar(rng.gauss(3.35 - 0.12 * (40 - semanas), 0.42), 2.0, 5.0)
+        else:
+            peso = _acotar(rng.gauss(3.0 - 0.22 * (37 - semanas), 0.35), 0.4, 4.0)
+        talla = _acotar(rng.gauss(50 - 1.1 * max(0, 39 - semanas), 2.2), 30, 58)
+        apgar_1 = _elegir(rng, PESOS_APGAR_1)
+        fallecido = rng.random() < 0.003
+        return RecienNacido(
+            parto=parto,
+            hora_nacimiento=timezone.localtime(parto.fecha_hora).time().replace(microsecond=0),
+            sexo='M' if rng.random() < 0.51 else 'F',
+            peso=round(peso, 3),
+            talla=round(talla, 1),
+            apgar_1=apgar_1,
+            apgar_5=min(10, apgar_1 + rng.choice([0, 1, 1, 1, 2])),
+            estado='fallecido' if fallecido else 'vivo',
+        )
+
+
+def usuario_sintetico():
+    usuario, creado = get_user_model().objects.get_or_create(
+        username=USUARIO_SINTETICO, defaults={'first_name': 'Datos', 'last_name': 'sintéticos'},
+    )
+    if creado:
+        usuario.set_unusable_password()
+        usuario.save(update_fields=['password'])
+    return usuario
+
+
+def generar_datos(partos, semilla=None, dias=365, lote=LOTE_SINTETICOS, progreso=None):
+    """Crea `partos` partos sintéticos (con sus madres y recién nacidos) repartidos en los últimos `dias` días.
+
+    Alrededor de un 13 % de los partos reutiliza una madre ya generada y un
+    1,5 % son gemelares. `progreso(creados)` se llama tras cada lote.
+    Devuelve los conteos {'madres', 'partos', 'rn'}.
+    """
+    generador = GeneradorSintetico(semilla, dias)
+    generador.excluir_ruts_existentes()
+    usuario = usuario_sintetico()
+    folio = Parto.objects.count() + 1
+    conteos = {'madres': 0, 'partos': 0, 'rn': 0}
+    dias_tocados = set()
+    anteriores = []  # madres ya guardadas que pueden tener otro parto
+
+    for inicio in range(0, partos, lote):
+        cantidad = min(lote, partos - inicio)
+        with transaction.atomic():
+            madres_nuevas = []
+            madres_lote = []
+            for _ in range(cantidad):
+                if anteriores and generador.rng.random() < 0.13:
+                    madres_lote.append(generador.rng.choice(anteriores))
+                else:
+                    madre = generador.madre(generador.rut(), usuario)
+                    madres_nuevas.append(madre)
+                    madres_lote.append(madre)
+            Madre.objects.bulk_create(madres_nuevas)
+            if madres_nuevas and not connection.features.can_return_rows_from_bulk_insert:
+                ids = dict(Madre.objects.filter(rut_normalizado__in=[m.rut_normalizado for m in madres_nuevas])
+                           .values_list('rut_normalizado', 'id'))
+                for madre in madres_nuevas:
+                    madre.pk = ids[madre.rut_normalizado]
+
+            partos_lote = []
+            for madre in madres_lote:
+                partos_lote.append(generador.parto(madre, usuario, folio))
+                folio += 1
+            Parto.objects.bulk_create(partos_lote)
+            if not connection.features.can_return_rows_from_bulk_insert:
+                ids = {
+                    (madre_id, fecha_hora): pk
+                    for pk, madre_id, fecha_hora in Parto.objects.filter(
+                        madre_id__in={p.madre.pk for p in partos_lote},
+                        fecha_hora__in={p.fecha_hora for p in partos_lote},
+                    ).values_list('id', 'madre_id', 'fecha_hora')
+                }
+                for parto in partos_lote:
+                    parto.pk = ids[(parto.madre.pk, parto.fecha_hora)]
+
+            recien_nacidos = []
+            for parto in partos_lote:
+                recien_nacidos.append(generador.recien_nacido(parto))
+                if generador.rng.random() < 0.015:
+                    recien_nacidos.append(generador.recien_nacido(parto))
+            RecienNacido.objects.bulk_create(recien_nacidos, batch_size=lote)
+
+            actualizar_documentos(parto_ids=[p.pk for p in partos_lote])
+
+        anteriores.extend(madres_nuevas)
+        if len(anteriores) > 10 * lote:
+            anteriores = anteriores[-lote:]
+        dias_tocados.update(fecha_local(p.fecha_hora) for p in partos_lote)
+        conteos['madres'] += len(madres_nuevas)
+        conteos['partos'] += len(partos_lote)
+        conteos['rn'] += len(recien_nacidos)
+        if progreso:
+            progreso(conteos['partos'])
+
+    recalcular_dias(dias_tocados)
+    if conteos['partos']:
+        marcar_cambio()
+    return conteos
@@ -1,9 +1,12 @@
+import json
+
 from django.test import TestCase, Client
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from .models import Madre
+from .search import filtrar_partos, resolver_ruts
 from .utils import normalize_rut, format_rut
-from datetime import date, datetime, timedelta
+from datetime import date, datetime, timedelta, timezone as dt_timezone
 from .forms import PartoCompletoForm
 
 
@@ -235,3 +238,1367 @@ class MadreCreateAPITests(TestCase):
         json = response.json()
         self.assertFalse(json.get('created'))
         self.assertIn('rut', json.get('errors', {}))
+
+
+class RutNormalizadoTests(TestCase):
+    """La clave `rut_normalizado` se mantiene sincronizada y sirve a madre_lookup."""
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='tester3', password='testpass')
+        self.client.login(username='tester3', password='testpass')
+        self.madre = Madre.objects.create(
+            rut='12.345.678-5',
+            nombres='Rosa',
+            apellidos='Soto',
+            fecha_nacimiento=date(1991, 5, 5),
+            estado_civil='soltera',
+            direccion='Calle 1',
+            telefono='+56 9 9123 4567',
+            prevision='fonasa_a'
+        )
+
+    def test_save_sincroniza_rut_normalizado(self):
+        self.assertEqual(self.madre.rut_normalizado, '123456785')
+        self.madre.rut = '12.345.679-3'
+        self.madre.save(update_fields=['rut'])
+        self.madre.refresh_from_db()
+        self.assertEqual(self.madre.rut_normalizado, '123456793')
+
+    def test_lookup_acepta_rut_sin_formato(self):
+        url = reverse('registros:madre_lookup')
+        for rut in ('123456785', '12345678-5', '12.345.678-5'):
+            data = self.client.get(url, {'rut': rut}).json()
+            self.assertTrue(data.get('found'), rut)
+            self.assertEqual(data.get('nombres'), 'Rosa')
+
+    def test_lookup_rut_invalido_no_encuentra(self):
+        url = reverse('registros:madre_lookup')
+        data = self.client.get(url, {'rut': '12.345.678-0'}).json()
+        self.assertFalse(data.get('found'))
+
+
+class MadreTypeaheadTests(TestCase):
+    """Búsqueda indexada del typeahead: prefijo de RUT y tokens sin tildes."""
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='tester4', password='testpass')
+        self.client.login(username='tester4', password='testpass')
+        base = dict(fecha_nacimiento=date(1990, 1, 1), estado_civil='soltera',
+                    direccion='X', telefono='+56 9 9123 4567', prevision='fonasa_a')
+        self.maria = Madre.objects.create(rut='12.345.678-5', nombres='María José',
+                                          apellidos='Muñoz Pérez', **base)
+        self.otra = Madre.objects.create(rut='12.345.679-3', nombres='Ana',
+                                         apellidos='Rojas', **base)
+
+    def buscar(self, q):
+        url = reverse('registros:madre_typeahead')
+        return self.client.get(url, {'q': q}).json()['results']
+
+    def test_prefijo_rut_ordena_exacto_primero(self):
+        results = self.buscar('12.345.67')
+        self.assertEqual([r['id'] for r in results], [self.maria.id, self.otra.id])
+        self.assertEqual(self.buscar('123456793')[0]['id'], self.otra.id)
+
+    def test_nombre_sin_tildes_y_por_prefijo(self):
+        self.assertEqual([r['id'] for r in self.buscar('maria mun')], [self.maria.id])
+        self.assertEqual([r['id'] for r in self.buscar('PÉREZ')], [self.maria.id])
+
+    def test_indice_sigue_cambios_de_nombre(self):
+        self.otra.apellidos = 'Álvarez'
+        self.otra.save()
+        self.assertEqual([r['id'] for r in self.buscar('alvarez')], [self.otra.id])
+        self.assertEqual(self.buscar('rojas'), [])
+
+    def test_contrato_json(self):
+        results = self.buscar('ana')
+        self.assertEqual(set(results[0].keys()), {'id', 'rut', 'nombres', 'apellidos'})
+
+
+class ExportacionExcelStreamingTests(TestCase):
+    """Exportación XLSX en modo write-only sin tope de filas."""
+    def setUp(self):
+        from django.utils import timezone
+        from .models import Parto, RecienNacido
+        User = get_user_model()
+        self.user = User.objects.create_user(username='tester5', password='testpass')
+        self.client.login(username='tester5', password='testpass')
+        madre = Madre.objects.create(rut='12.345.678-5', nombres='Ana', apellidos='Rojas',
+                                     fecha_nacimiento=date(1990, 1, 1), estado_civil='soltera',
+                                     direccion='Una dirección bastante larga para medir', telefono='+56 9 9123 4567',
+                                     prevision='fonasa_a')
+        ahora = timezone.now()
+        for i in range(5):
+            parto = Parto.objects.create(madre=madre, fecha_hora=ahora - timedelta(days=i), tipo_parto='eutocico')
+            RecienNacido.objects.create(parto=parto, hora_nacimiento=(ahora - timedelta(days=i)).time(),
+                                        sexo='F', peso='3.200', talla='50.0', apgar_1=8, apgar_5=9)
+
+    def leer(self, contenido):
+        from io import BytesIO
+        from openpyxl import load_workbook
+        return load_workbook(BytesIO(contenido))
+
+    def test_escribe_todas_las_filas_por_chunks(self):
+        from io import BytesIO
+        from .excel_export import escribir_excel_partos
+        destino = BytesIO()
+        escribir_excel_partos(destino, chunk_size=2, muestra=2)
+        libro = self.leer(destino.getvalue())
+        self.assertEqual(libro.sheetnames, ['Madres', 'Partos', 'Recién Nacidos'])
+        self.assertEqual(libro['Partos'].max_row, 6)
+        self.assertEqual(libro['Recién Nacidos'].max_row, 6)
+        self.assertEqual(libro['Madres']['A1'].value, 'RUT')
+        self.assertEqual(libro['Madres'].column_dimensions['G'].width, len('Una dirección bastante larga para medir') + 2)
+
+    def test_respuesta_streaming(self):
+        from .excel_export import exportar_datos_excel
+        resp = exportar_datos_excel()
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('attachment', resp['Content-Disposition'])
+        libro = self.leer(b''.join(resp.streaming_content))
+        self.assertEqual(libro['Partos'].max_row, 6)
+
+
+class ExportacionEnSegundoPlanoTests(TestCase):
+    """Los botones de exportación encolan un trabajo que procesa el worker."""
+    def setUp(self):
+        import tempfile
+        from django.test import override_settings
+        self.media = tempfile.TemporaryDirectory()
+        self.override = override_settings(MEDIA_ROOT=self.media.name, EXPORTACIONES_EN_SEGUNDO_PLANO=True)
+        self.override.enable()
+        User = get_user_model()
+        self.user = User.objects.create_user(username='tester6', password='testpass')
+        self.client.login(username='tester6', password='testpass')
+
+    def tearDown(self):
+        self.override.disable()
+        self.media.cleanup()
+
+    def test_excel_se_encola_y_el_worker_lo_completa(self):
+        from django.core.management import call_command
+        from io import StringIO
+        from .models import TrabajoExportacion
+
+        resp = self.client.get(reverse('registros:exportar_partos'), {'start': '2025-01-01', 'end': '2025-01-31'})
+        trabajo = TrabajoExportacion.objects.get()
+        self.assertRedirects(resp, reverse('registros:exportacion_estado', args=[trabajo.id]))
+        self.assertEqual(trabajo.estado, 'pendiente')
+        self.assertEqual(trabajo.parametros, {'fecha_inicio': '2025-01-01', 'fecha_fin': '2025-01-31'})
+
+        estado = self.client.get(reverse('registros:exportacion_estado', args=[trabajo.id]), {'format': 'json'}).json()
+        self.assertFalse(estado['terminado'])
+
+        call_command('procesar_exportaciones', '--una-vez', stdout=StringIO())
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'completado', trabajo.error)
+        self.assertTrue(trabajo.archivo.name.startswith('exportaciones/'))
+
+        estado = self.client.get(reverse('registros:exportacion_estado', args=[trabajo.id]), {'format': 'json'}).json()
+        self.assertEqual(estado['descarga'], reverse('registros:exportacion_descargar', args=[trabajo.id]))
+        descarga = self.client.get(estado['descarga'])
+        self.assertEqual(descarga.status_code, 200)
+        self.assertIn('Registros_Partos_2025-01-01_2025-01-31.xlsx', descarga['Content-Disposition'])
+        descarga.close()
+
+    def test_pendiente_sin_worker_se_marca_con_error(self):
+        from django.utils import timezone
+        from .exportaciones import latido_worker
+        from .models import TrabajoExportacion
+        self.client.get(reverse('registros:exportar_partos'), {'start': '2025-01-01', 'end': '2025-01-31'})
+        trabajo = TrabajoExportacion.objects.get()
+        url = reverse('registros:exportacion_estado', args=[trabajo.id])
+        self.assertEqual(self.client.get(url, {'format': 'json'}).json()['estado'], 'pendiente')
+
+        TrabajoExportacion.objects.update(created_at=timezone.now() - timedelta(minutes=30))
+        # Con un worker vivo (cola larga) el trabajo sigue esperando
+        latido_worker()
+        self.assertEqual(self.client.get(url, {'format': 'json'}).json()['estado'], 'pendiente')
+
+        with self.settings(EXPORTACIONES_SIN_WORKER_MINUTOS=0):
+            estado = self.client.get(url, {'format': 'json'}).json()
+        self.assertEqual((estado['estado'], estado['terminado']), ('error', True))
+        self.assertIn('worker', estado['error'])
+
+    def test_trabajo_solo_se_toma_una_vez(self):
+        from .exportaciones import tomar_trabajo
+        from .models import TrabajoExportacion
+        trabajo = TrabajoExportacion.objects.create(tipo='excel', created_by=self.user)
+        self.assertTrue(tomar_trabajo(trabajo.id))
+        self.assertFalse(tomar_trabajo(trabajo.id))
+
+    def test_otro_usuario_no_ve_la_exportacion(self):
+        from .models import TrabajoExportacion
+        User = get_user_model()
+        otro = User.objects.create_user(username='otro6', password='x')
+        trabajo = TrabajoExportacion.objects.create(tipo='pdf', created_by=otro)
+        resp = self.client.get(reverse('registros:exportacion_estado', args=[trabajo.id]))
+        self.assertEqual(resp.status_code, 404)
+
+
+def planilla_partos(filas):
+    """Libro de partos mínimo en memoria: una fila de título y la cabecera en la fila 2."""
+    from io import BytesIO
+    from openpyxl import Workbook
+    libro = Workbook()
+    hoja = libro.active
+    hoja.append(['LIBRO DE PARTOS'])
+    hoja.append(['FECHA', 'Hora', 'Nombre  completo', 'RUN', 'DV', 'Edad', 'Tipo de parto',
+                 'Sem. Obst. (semanas)', 'Sexo', 'Peso ', 'Talla', 'Apgar al minuto', 'Apgar a los 5 min'])
+    for fila in filas:
+        hoja.append(fila)
+    archivo = BytesIO()
+    libro.save(archivo)
+    archivo.seek(0)
+    return archivo
+
+
+class ImportacionMasivaTests(TestCase):
+    """Importador por lotes: consultas acotadas por lote y errores con número de fila."""
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='tester7', password='testpass')
+
+    def test_crea_y_actualiza_por_lotes(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from django.utils import timezone
+        from .import_data import importar_datos_excel
+        from .models import Parto, RecienNacido
+        filas = [
+            [datetime(2025, 9, 1), '09:56', 'ANA MARIA ROJAS SOTO', 12345678, '5', 27, 'CES.ELECTIVA', 38, 'FEMENINO', 3450, 50, 8, 9],
+            [datetime(2025, 9, 2), '11:50', 'CLARA DIAZ', 11111111, '1', 25, 'EUTOCICO', 39, 'MASCULINO', 3100, 49, 9, 10],
+        ]
+        with CaptureQueriesContext(connection) as consultas:
+            resultado = importar_datos_excel(planilla_partos(filas), self.user)
+        self.assertTrue(resultado['success'], resultado)
+        self.assertEqual(resultado['counts'], {'madres': 2, 'partos': 2, 'rn': 2})
+        self.assertLess(len(consultas), 32)  # incluye el resumen diario, los documentos de búsqueda y el perfil de importación
+
+        madre = Madre.objects.get(rut_normalizado='123456785')
+        self.assertEqual((madre.rut, madre.nombres, madre.apellidos), ('12.345.678-5', 'ANA MARIA', 'ROJAS SOTO'))
+        self.assertEqual(madre.nombre_busqueda, 'ana maria rojas soto')
+        parto = madre.partos.get()
+        self.assertEqual(parto.tipo_parto, 'cesarea_electiva')
+        self.assertEqual(parto.semanas_gestacion, 38)
+        self.assertEqual(timezone.localtime(parto.fecha_hora).replace(tzinfo=None), datetime(2025, 9, 1, 9, 56))
+        rn = parto.recien_nacidos.get()
+        self.assertEqual((rn.sexo, float(rn.peso), rn.apgar_5), ('F', 3.45, 9))
+
+        filas[0][6] = 'CES. URGENCIA'
+        resultado = importar_datos_excel(planilla_partos(filas), self.user)
+        self.assertEqual(resultado['counts'], {'madres': 0, 'partos': 0, 'rn': 0})
+        self.assertEqual(resultado['updated'], {'madres': 2, 'partos': 2, 'rn': 2})
+        self.assertEqual(Parto.objects.count(), 2)
+        self.assertEqual(RecienNacido.objects.count(), 2)
+        self.assertEqual(Parto.objects.get(madre=madre).tipo_parto, 'cesarea_urgencia')
+
+    def test_fila_sin_edad_no_pisa_la_fecha_de_nacimiento(self):
+        from .import_data import FECHA_NACIMIENTO_DESCONOCIDA, importar_datos_excel
+        Madre.objects.create(rut='12.345.678-5', nombres='Ana', apellidos='Rojas', fecha_nacimiento=date(1994, 7, 3),
+                             estado_civil='soltera', direccion='x', telefono='123456789', prevision='fonasa_a')
+        filas = [
+            [datetime(2025, 9, 1), '09:56', 'ANA ROJAS', 12345678, '5', None, 'EUTOCICO', 38, 'FEMENINO', 3450, 50, 8, 9],
+            [datetime(2025, 9, 2), '11:50', 'CLARA DIAZ', 11111111, '1', None, 'EUTOCICO', 39, 'MASCULINO', 3100, 49, 9, 10],
+        ]
+        resultado = importar_datos_excel(planilla_partos(filas), self.user)
+        self.assertTrue(resultado['success'], resultado)
+        self.assertEqual(Madre.objects.get(rut_normalizado='123456785').fecha_nacimiento, date(1994, 7, 3))
+        self.assertEqual(Madre.objects.get(rut_normalizado='111111111').fecha_nacimiento, FECHA_NACIMIENTO_DESCONOCIDA)
+
+    def test_errores_con_numero_de_fila(self):
+        from .import_data import importar_datos_excel
+        filas = [
+            [datetime(2025, 9, 1), '09:56', 'ANA ROJAS', 12345678, '5', 27, 'EUTOCICO', 38, 'FEMENINO', 3450, 50, 8, 9],
+            ['sin fecha', '10:00', 'EVA PEREZ', 11111111, '1', 30, 'EUTOCICO', 39, 'FEMENINO', 3200, 50, 9, 10],
+            [datetime(2025, 9, 3), '12:00', 'SIN RUT', None, None, 30, 'EUTOCICO', 39, 'FEMENINO', 3200, 50, 9, 10],
+        ]
+        resultado = importar_datos_excel(planilla_partos(filas), self.user)
+        self.assertTrue(resultado['success'], resultado)
+        self.assertEqual(resultado['counts']['partos'], 1)
+        self.assertEqual(resultado['errors'], ['Fila 4: Fecha de parto inválida o vacía'])
+
+    def test_lote_fallido_se_reintenta_fila_por_fila(self):
+        from unittest import mock
+        from .import_data import importar_filas, _importar_lote
+
+        def falla_con_rut_invalido(filas, user):
+            if any(f['rut_normalizado'] == '111111111' for f in filas):
+                raise ValueError('dato rechazado')
+            return _importar_lote(filas, user)
+
+        filas = [
+            {'fila_excel': 3, 'rut_normalizado': '123456785'},
+            {'fila_excel': 4, 'rut_normalizado': '111111111'},
+        ]
+        for fila in filas:
+            fila.update(nombres='Ana', apellidos='Rojas', fecha_nacimiento=date(1995, 1, 1), direccion='',
+                        tiene_direccion=False, fecha_hora=datetime(2025, 9, 1, 10, 0, tzinfo=dt_timezone.utc),
+                        tipo_parto='eutocico', semanas_gestacion=39, sexo='F', peso=3.2, talla=50.0,
+                        apgar_1=9, apgar_5=10)
+        with mock.patch('registros.import_data._importar_lote', side_effect=falla_con_rut_invalido):
+            stats = importar_filas(filas, self.user, chunk_size=10)
+        self.assertEqual(stats['partos']['creados'], 1)
+        self.assertEqual(stats['errors'], ['Fila 4: dato rechazado'])
+        self.assertTrue(Madre.objects.filter(rut_normalizado='123456785').exists())
+
+
+class ImportacionVistaPreviaTests(TestCase):
+    """Importación en dos fases: vista previa desde el análisis cacheado y luego confirmación."""
+    def setUp(self):
+        import tempfile
+        from django.test import override_settings
+        User = get_user_model()
+        User.objects.create_user(username='tester8', password='testpass')
+        self.media = tempfile.TemporaryDirectory()
+        self.override = override_settings(MEDIA_ROOT=self.media.name)
+        self.override.enable()
+        self.client.login(username='tester8', password='testpass')
+
+    def tearDown(self):
+        self.override.disable()
+        self.media.cleanup()
+
+    def subir(self, contenido):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        archivo = SimpleUploadedFile('libro.xlsx', contenido)
+        return self.client.post(reverse('registros:importar_partos'), {'file': archivo})
+
+    def test_vista_previa_y_confirmacion(self):
+        from unittest import mock
+        from .models import Parto
+        filas = [
+            [datetime(2025, 9, 1), '09:56', 'ANA ROJAS', 12345678, '5', 27, 'EUTOCICO', 38, 'FEMENINO', 3450, 50, 8, 9],
+            ['sin fecha', '10:00', 'EVA PEREZ', 11111111, '1', 30, 'EUTOCICO', 39, 'FEMENINO', 3200, 50, 9, 10],
+        ]
+        contenido = planilla_partos(filas).getvalue()
+        resp = self.subir(contenido)
+        clave = resp.url.rstrip('/').split('/')[-1]
+        self.assertRedirects(resp, reverse('registros:importar_vista_previa', args=[clave]))
+        self.assertEqual(Parto.objects.count(), 0)
+
+        preview = self.client.get(resp.url)
+        self.assertContains(preview, 'Nombre completo')
+        self.assertContains(preview, 'NOMBRE COMPLETO')
+        self.assertContains(preview, 'Fila 4: Fecha de parto inválida o vacía')
+        self.assertEqual(preview.context['total_filas'], 1)
+
+        # El mismo archivo no se vuelve a parsear
+        with mock.patch('registros.import_data.leer_hojas') as leer:
+            self.assertEqual(self.subir(contenido).url, resp.url)
+            leer.assert_not_called()
+            confirmado = self.client.post(reverse('registros:importar_confirmar', args=[clave]))
+            leer.assert_not_called()
+        self.assertRedirects(confirmado, reverse('registros:lista_partos'), fetch_redirect_response=False)
+        self.assertEqual(Parto.objects.count(), 1)
+
+    def test_clave_desconocida(self):
+        resp = self.client.post(reverse('registros:importar_confirmar', args=['0' * 64]))
+        self.assertRedirects(resp, reverse('registros:importar_partos'))
+        resp = self.client.get(reverse('registros:importar_vista_previa', args=['no-es-un-hash']))
+        self.assertRedirects(resp, reverse('registros:importar_partos'))
+
+
+class PerfilesImportacionTests(TestCase):
+    """Perfiles de mapeo por huella de cabecera, corrección por superusuario y libros con varias hojas."""
+    def setUp(self):
+        import tempfile
+        from django.test import override_settings
+        from cuentas.models import Rol
+        User = get_user_model()
+        self.admin = User.objects.create_user(username='jefa9', password='testpass',
+                                              rol=Rol.objects.create(nombre='superusuario'))
+        User.objects.create_user(username='tester9', password='testpass')
+        self.media = tempfile.TemporaryDirectory()
+        self.override = override_settings(MEDIA_ROOT=self.media.name)
+        self.override.enable()
+
+    def tearDown(self):
+        self.override.disable()
+        self.media.cleanup()
+
+    FILA = [datetime(2025, 9, 1), '09:56', 'ANA ROJAS', 12345678, '5', 27, 'EUTOCICO', 38, 'FEMENINO', 3450, 50, 8, 9]
+
+    def test_formato_conocido_no_se_vuelve_a_detectar(self):
+        from unittest import mock
+        from .import_data import analizar_excel
+        from .models import PerfilImportacion
+        primero = analizar_excel(planilla_partos([self.FILA]))
+        perfil = PerfilImportacion.objects.get()
+        self.assertEqual((perfil.confirmado, perfil.usos), (False, 1))
+        self.assertEqual(perfil.columnas['nombre'], 'NOMBRE COMPLETO')
+        self.assertFalse(primero['hojas'][0]['desde_perfil'])
+
+        with mock.patch('registros.import_data.detectar_cabecera') as cabecera, \
+                mock.patch('registros.import_data.detectar_columnas') as columnas:
+            segundo = analizar_excel(planilla_partos([self.FILA]))
+            cabecera.assert_not_called()
+            columnas.assert_not_called()
+        self.assertTrue(segundo['hojas'][0]['desde_perfil'])
+        self.assertEqual(segundo['hojas'][0]['header_row'], 2)
+        self.assertEqual(segundo['filas'], primero['filas'])
+        perfil.refresh_from_db()
+        self.assertEqual(perfil.usos, 2)
+
+    def test_recorre_todas_las_hojas(self):
+        from io import BytesIO
+        from openpyxl import Workbook
+        from .import_data import analizar_excel
+        libro = Workbook()
+        libro.active.title = 'Resumen'
+        libro.active.append(['Total partos', 2])
+        septiembre = libro.create_sheet('Septiembre')
+        septiembre.append(['LIBRO DE PARTOS'])
+        septiembre.append(['FECHA', 'Hora', 'Nombre completo', 'RUN', 'DV', 'Edad', 'Tipo de parto'])
+        septiembre.append(self.FILA[:7])
+        octubre = libro.create_sheet('Octubre')
+        octubre.append(['RUT', 'NOMBRE', 'FECHA PARTO', 'HORA'])
+        octubre.append(['11.111.111-1', 'CLARA DIAZ', datetime(2025, 10, 2), '11:50'])
+        octubre.append(['22.222.222-2', 'EVA PEREZ', 'sin fecha', '10:00'])
+        archivo = BytesIO()
+        libro.save(archivo)
+        archivo.seek(0)
+
+        analisis = analizar_excel(archivo)
+        hojas = {hoja['nombre']: hoja for hoja in analisis['hojas']}
+        self.assertTrue(hojas['Resumen']['omitida'])
+        self.assertEqual((hojas['Septiembre']['header_row'], hojas['Septiembre']['filas']), (2, 1))
+        self.assertEqual((hojas['Octubre']['header_row'], hojas['Octubre']['filas']), (1, 1))
+        self.assertEqual([(f['hoja'], f['rut_normalizado']) for f in analisis['filas']],
+                         [('Septiembre', '123456785'), ('Octubre', '111111111')])
+        self.assertEqual(analisis['errores'], ["Hoja 'Octubre', fila 3: Fecha de parto inválida o vacía"])
+
+    def test_superusuario_corrige_y_confirma_el_mapeo(self):
+        from io import BytesIO
+        from openpyxl import Workbook
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from .models import PerfilImportacion
+
+        def planilla(nombre):
+            libro = Workbook()
+            libro.active.append(['FECHA', 'HORA', 'PACIENTE', 'RUT'])
+            libro.active.append([datetime(2025, 9, 1), '09:56', nombre, '12.345.678-5'])
+            archivo = BytesIO()
+            libro.save(archivo)
+            return archivo.getvalue()
+
+        self.client.login(username='jefa9', password='testpass')
+        resp = self.client.post(reverse('registros:importar_partos'),
+                                {'file': SimpleUploadedFile('libro.xlsx', planilla('ANA ROJAS'))})
+        clave = resp.url.rstrip('/').split('/')[-1]
+        self.assertEqual(self.client.get(resp.url).context['muestra'][0]['nombres'], 'Desconocida')
+
+        url = reverse('registros:importar_perfil', args=[clave, 0])
+        mapeo = {'rut': 'RUT', 'fecha': 'FECHA', 'hora': 'HORA', 'nombre': 'PACIENTE'}
+        self.assertRedirects(self.client.post(url, {**mapeo, 'edad': 'NO EXISTE'}),
+                             reverse('registros:importar_vista_previa', args=[clave]), fetch_redirect_response=False)
+        self.assertFalse(PerfilImportacion.objects.filter(confirmado=True).exists())
+
+        self.assertRedirects(self.client.post(url, mapeo),
+                             reverse('registros:importar_vista_previa', args=[clave]), fetch_redirect_response=False)
+        perfil = PerfilImportacion.objects.get()
+        self.assertTrue(perfil.confirmado)
+        self.assertEqual(perfil.confirmado_por, self.admin)
+        self.assertEqual(perfil.columnas['nombre'], 'PACIENTE')
+        preview = self.client.get(resp.url)
+        self.assertEqual(preview.context['muestra'][0]['nombres'], 'ANA')
+        self.assertContains(preview, 'Perfil confirmado')
+
+        # Otra planilla con el mismo formato usa el mapeo confirmado; un usuario común no puede cambiarlo
+        self.client.login(username='tester9', password='testpass')
+        resp = self.client.post(reverse('registros:importar_partos'),
+                                {'file': SimpleUploadedFile('otro.xlsx', planilla('CLARA DIAZ'))})
+        preview = self.client.get(resp.url)
+        self.assertEqual(preview.context['muestra'][0]['apellidos'], 'DIAZ')
+        self.assertNotContains(preview, '<select')
+        clave = resp.url.rstrip('/').split('/')[-1]
+        self.assertEqual(self.client.post(reverse('registros:importar_perfil', args=[clave, 0]), mapeo).status_code, 403)
+
+
+class EditarPartoTests(TestCase):
+    """El formulario de edición acepta el profesional a cargo guardado como texto."""
+    def test_editar_parto_con_profesional_a_cargo(self):
+        from django.utils import timezone
+        from .models import Parto
+        User = get_user_model()
+        User.objects.create_user(username='tester10', password='testpass')
+        self.client.login(username='tester10', password='testpass')
+        madre = Madre.objects.create(rut='12.345.678-5', nombres='Ana', apellidos='Rojas',
+                                     fecha_nacimiento=date(1995, 5, 1), estado_civil='soltera',
+                                     direccion='x', telefono='+56 9 9123 4567', prevision='fonasa_a')
+        parto = Parto.objects.create(madre=madre, fecha_hora=timezone.now(), tipo_parto='eutocico',
+                                     tipo_anestesia='ninguna', profesional_a_cargo='Carla Soto - 11111111-1 (usuario)')
+        respuesta = self.client.get(reverse('registros:editar_parto', args=[parto.pk]))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertContains(respuesta, 'Carla Soto - 11111111-1 (usuario)')
+
+
+class DirectorioProfesionalesTests(TestCase):
+    """/api/profesionales/ responde desde el directorio en memoria, con ETag por versión."""
+    def setUp(self):
+        from cuentas.models import Rol
+        User = get_user_model()
+        matrona = Rol.objects.create(nombre='matrona')
+        self.carla = User.objects.create_user(username='csoto', password='testpass', first_name='Carla',
+                                              last_name='Soto Núñez', run='11111111-1', rol=matrona)
+        User.objects.create_user(username='jperez', password='testpass', first_name='José', last_name='Pérez',
+                                 run='22222222-2')
+        self.client.login(username='csoto', password='testpass')
+        self.url = reverse('registros:profesionales_list')
+
+    def buscar(self, q, **encabezados):
+        return self.client.get(self.url, {'q': q}, **encabezados)
+
+    def nombres(self, q):
+        return [p['nombre_completo'] for p in self.buscar(q).json()['profesionales']]
+
+    def test_busqueda_por_prefijo_y_tokens(self):
+        self.assertEqual(self.nombres(''), ['Carla Soto Núñez', 'José Pérez'])
+        self.assertEqual(self.nombres('nun car'), ['Carla Soto Núñez'])
+        self.assertEqual(self.nombres('JOSE'), ['José Pérez'])
+        self.assertEqual(self.nombres('11.111'), ['Carla Soto Núñez'])
+        self.assertEqual(self.nombres('jper'), ['José Pérez'])
+        self.assertEqual(self.nombres('oto'), [])
+        carla = self.buscar('carla').json()['profesionales'][0]
+        self.assertEqual((carla['rut'], carla['area']), ('11111111-1', 'matrona'))
+        self.assertEqual(self.buscar('jose').json()['profesionales'][0]['area'], 'Sin área')
+
+    def test_directorio_en_memoria_y_version(self):
+        from django.test import override_settings
+        from .profesionales import directorio
+        self.buscar('')
+        with self.assertNumQueries(0):
+            directorio.actual()
+        with override_settings(PROFESIONALES_VERIFICAR_SEGUNDOS=0), self.assertNumQueries(1):
+            directorio.actual()  # solo compara la versión
+
+        etag = self.buscar('car')['ETag']
+        self.assertEqual(self.buscar('car', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertNotEqual(self.buscar('jos')['ETag'], etag)
+
+        # Iniciar sesión actualiza last_login pero no cambia el directorio
+        self.client.login(username='jperez', password='testpass')
+        self.assertEqual(self.buscar('car', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.carla.is_active = False
+        self.carla.save()
+        respuesta = self.buscar('car', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['profesionales'], [])
+
+
+class IndiceMadresTests(TestCase):
+    """Índice de madres recientes para el typeahead del navegador y su delta."""
+    def setUp(self):
+        from django.utils import timezone
+        from .models import Parto
+        User = get_user_model()
+        User.objects.create_user(username='tester11', password='testpass')
+        self.client.login(username='tester11', password='testpass')
+        datos = dict(fecha_nacimiento=date(1995, 5, 1), estado_civil='soltera', direccion='x',
+                     telefono='+56 9 9123 4567', prevision='fonasa_a')
+        self.reciente = Madre.objects.create(rut='12.345.678-5', nombres='Ana María', apellidos='Rojas', **datos)
+        self.con_parto = Madre.objects.create(rut='11.111.111-1', nombres='Clara', apellidos='Díaz', **datos)
+        self.antigua = Madre.objects.create(rut='22.222.222-2', nombres='Eva', apellidos='Pérez', **datos)
+        ahora = timezone.now()
+        Parto.objects.create(madre=self.con_parto, fecha_hora=ahora - timedelta(days=5), tipo_parto='eutocico',
+                             tipo_anestesia='ninguna')
+        Madre.objects.filter(pk=self.reciente.pk).update(updated_at=ahora - timedelta(days=10))
+        Madre.objects.filter(pk__in=[self.con_parto.pk, self.antigua.pk]).update(updated_at=ahora - timedelta(days=400))
+
+    def test_indice_y_delta(self):
+        indice = self.client.get(reverse('registros:madre_indice')).json()
+        self.assertTrue(indice['completo'])
+        self.assertEqual(indice['campos'], ['id', 'rut', 'nombre'])
+        self.assertEqual(indice['filas'], [[self.reciente.pk, '123456785', 'ana maria rojas'],
+                                           [self.con_parto.pk, '111111111', 'clara diaz']])
+
+        url_delta = reverse('registros:madre_indice_delta')
+        parametros = {'desde': indice['hasta'], 'version': indice['version']}
+        delta = self.client.get(url_delta, parametros).json()
+        self.assertEqual((delta['completo'], delta['filas']), (False, []))
+
+        self.antigua.nombres = 'Eva Luz'
+        self.antigua.save()
+        delta = self.client.get(url_delta, parametros).json()
+        self.assertEqual(delta['filas'], [[self.antigua.pk, '222222222', 'eva luz perez']])
+
+        # Una madre eliminada no se puede expresar como cambio: se envía el índice completo
+        self.reciente.delete()
+        delta = self.client.get(url_delta, {'desde': delta['hasta'], 'version': delta['version']}).json()
+        self.assertTrue(delta['completo'])
+        self.assertEqual([f[0] for f in delta['filas']], [self.antigua.pk, self.con_parto.pk])
+        self.assertTrue(self.client.get(url_delta, {'desde': 'no-es-fecha', 'version': ''}).json()['completo'])
+
+    def test_delta_antiguo_o_grande_entrega_el_indice_completo(self):
+        from django.utils import timezone
+        url_delta = reverse('registros:madre_indice_delta')
+        version = self.client.get(reverse('registros:madre_indice')).json()['version']
+        # Un `desde` de hace décadas no trae la tabla entera, solo las madres recientes
+        delta = self.client.get(url_delta, {'desde': '1970-01-01T00:00:00+00:00', 'version': version}).json()
+        self.assertTrue(delta['completo'])
+        self.assertEqual([f[0] for f in delta['filas']], [self.reciente.pk, self.con_parto.pk])
+
+        desde = (timezone.now() - timedelta(days=30)).isoformat()
+        delta = self.client.get(url_delta, {'desde': desde, 'version': version}).json()
+        self.assertEqual((delta['completo'], [f[0] for f in delta['filas']]), (False, [self.reciente.pk]))
+        Madre.objects.filter(pk=self.antigua.pk).update(updated_at=timezone.now())
+        with self.settings(INDICE_MADRES_MAX=1):
+            delta = self.client.get(url_delta, {'desde': desde, 'version': version}).json()
+        self.assertTrue(delta['completo'])
+        self.assertEqual([f[0] for f in delta['filas']], [self.antigua.pk])
+
+    def test_indice_no_queda_en_el_navegador_sin_sesion(self):
+        pagina = self.client.get(reverse('registros:registro_parto')).content.decode()
+        self.assertIn("sessionStorage.setItem(CLAVE", pagina)
+        self.assertNotIn("sessionStorage.removeItem('registros.indiceMadres')", pagina)
+        self.client.get(reverse('cuentas:logout'))
+        login = self.client.get(reverse('cuentas:login')).content.decode()
+        self.assertIn("sessionStorage.removeItem('registros.indiceMadres')", login)
+        self.assertIn("localStorage.removeItem('registros.indiceMadres')", login)
+
+
+class MadreLookupLoteTests(TestCase):
+    """Búsqueda de muchas madres por RUT en una sola consulta."""
+    def setUp(self):
+        User = get_user_model()
+        User.objects.create_user(username='tester12', password='testpass')
+        self.client.login(username='tester12', password='testpass')
+        datos = dict(fecha_nacimiento=date(1995, 5, 1), estado_civil='soltera', direccion='x',
+                     telefono='+56 9 9123 4567', prevision='fonasa_a')
+        Madre.objects.create(rut='12.345.678-5', nombres='Ana', apellidos='Rojas', **datos)
+        Madre.objects.create(rut='11.111.111-1', nombres='Clara', apellidos='Díaz', **datos)
+        self.url = reverse('registros:madre_lookup_lote')
+
+    def test_resultados_en_orden(self):
+        entradas = ['11111111-1', '12345678-9', 'abc', '12.345.678-5', '22.222.222-2', '111111111']
+        with self.assertNumQueries(1):
+            resolver_ruts(entradas)
+        respuesta = self.client.post(self.url, json.dumps({'ruts': entradas}), content_type='application/json')
+        self.assertEqual(respuesta.status_code, 200)
+        resultados = respuesta.json()['resultados']
+        self.assertEqual([r['entrada'] for r in resultados], entradas)
+        self.assertEqual([r['estado'] for r in resultados],
+                         ['encontrada', 'invalido', 'invalido', 'encontrada', 'no_encontrada', 'encontrada'])
+        self.assertEqual(resultados[0]['madre']['nombres'], 'Clara')
+        # Mismos datos que madre_lookup
+        uno = self.client.get(reverse('registros:madre_lookup'), {'rut': '12345678-5'}).json()
+        self.assertEqual(resultados[3]['madre'], {k: v for k, v in uno.items() if k != 'found'})
+        self.assertNotIn('madre', resultados[1])
+
+        # Formulario: un RUT por línea, como una lista pegada
+        respuesta = self.client.post(self.url, {'ruts': '12.345.678-5\n\n  22.222.222-2 \n'})
+        self.assertEqual([r['estado'] for r in respuesta.json()['resultados']], ['encontrada', 'no_encontrada'])
+
+    def test_rechaza_pedidos_invalidos(self):
+        self.assertEqual(self.client.get(self.url, {'ruts': '12.345.678-5'}).status_code, 405)
+        self.assertEqual(self.client.post(self.url, '{', content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.post(self.url, '[]', content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.post(self.url, {'ruts': ''}).status_code, 400)
+        for entrada in ({'a': 1}, ['12.345.678-5'], None, True):
+            respuesta = self.client.post(self.url, json.dumps({'ruts': ['12.345.678-5', entrada]}),
+                                         content_type='application/json')
+            self.assertEqual(respuesta.status_code, 400, entrada)
+        respuesta = self.client.post(self.url, json.dumps({'ruts': [123456785, '12.345.678-5']}),
+                                     content_type='application/json')
+        self.assertEqual(respuesta.status_code, 200)
+        with self.settings(MADRE_LOOKUP_LOTE_MAX=3):
+            respuesta = self.client.post(self.url, json.dumps({'ruts': ['1'] * 4}), content_type='application/json')
+        self.assertEqual(respuesta.status_code, 400)
+
+
+class ResumenDiarioTests(TestCase):
+    """La tabla de agregados diarios se mantiene con señales y alimenta REM y dashboard."""
+    def setUp(self):
+        from django.utils import timezone
+        from .models import Parto, RecienNacido
+        self.madre = Madre.objects.create(rut='12.345.678-5', nombres='Ana', apellidos='Rojas',
+                                          fecha_nacimiento=date(1995, 5, 1), estado_civil='soltera',
+                                          direccion='x', telefono='+56 9 9123 4567', prevision='fonasa_a')
+        self.dia = date(2025, 9, 10)
+        self.fecha_hora = timezone.make_aware(datetime(2025, 9, 10, 23, 30))
+        self.parto = Parto.objects.create(madre=self.madre, fecha_hora=self.fecha_hora, tipo_parto='eutocico',
+                                          tipo_anestesia='epidural')
+        RecienNacido.objects.create(parto=self.parto, hora_nacimiento=self.fecha_hora.time(), sexo='F',
+                                    peso='3.200', talla='50.0', apgar_1=8, apgar_5=9)
+
+    def resumen(self, dia=None):
+        from .models import ResumenDiario
+        filas = ResumenDiario.objects.filter(fecha=dia or self.dia)
+        return {(f.dimension, f.valor): f.total for f in filas}
+
+    def test_senales_mantienen_el_resumen(self):
+        from datetime import timedelta
+        from .models import RecienNacido
+        self.assertEqual(self.resumen(), {
+            ('tipo_parto', 'eutocico'): 1,
+            ('tipo_anestesia', 'epidural'): 1,
+            ('clasificacion_robson', ''): 1,
+            ('edad_madre', '30_34'): 1,
+            ('rn_sexo', 'F'): 1,
+            ('rn_estado', 'vivo'): 1,
+        })
+
+        # Mover el parto de día corrige ambos días
+        self.parto.fecha_hora += timedelta(days=1)
+        self.parto.save()
+        self.assertEqual(self.resumen(), {})
+        self.assertEqual(self.resumen(date(2025, 9, 11))[('rn_sexo', 'F')], 1)
+
+        # La fecha de nacimiento de la madre cambia el tramo de edad
+        self.madre.fecha_nacimiento = date(2008, 1, 1)
+        self.madre.save()
+        self.assertEqual(self.resumen(date(2025, 9, 11))[('edad_madre', '15_19')], 1)
+
+        RecienNacido.objects.filter(parto=self.parto).get().delete()
+        self.assertNotIn(('rn_sexo', 'F'), self.resumen(date(2025, 9, 11)))
+        self.madre.delete()
+        self.assertEqual(self.resumen(date(2025, 9, 11)), {})
+
+    def test_recalcula_solo_los_dias_tocados(self):
+        from .models import ResumenDiario
+        from .resumen import tramos_consecutivos
+        self.assertEqual(tramos_consecutivos({date(2025, 1, 3), date(2025, 1, 1), date(2025, 1, 2), date(2025, 3, 1)}),
+                         [(date(2025, 1, 1), date(2025, 1, 3)), (date(2025, 3, 1), date(2025, 3, 1))])
+        # Una fila de un día intermedio no se toca al mover el parto un año
+        intermedio = ResumenDiario.objects.create(fecha=date(2026, 3, 1), dimension='tipo_parto', valor='x', total=7)
+        self.parto.fecha_hora += timedelta(days=365)
+        self.parto.save()
+        self.assertEqual(self.resumen(), {})
+        self.assertEqual(self.resumen(date(2026, 9, 10))[('tipo_parto', 'eutocico')], 1)
+        self.assertTrue(ResumenDiario.objects.filter(pk=intermedio.pk, total=7).exists())
+
+    def test_rem_lee_el_resumen(self):
+        from .utils import GeneradorREM
+        datos = GeneradorREM(self.dia, self.dia).rem_bs22()
+        self.assertEqual(datos['total_partos'], 1)
+        self.assertEqual(datos['partos_por_tipo']['eutocico'], 1)
+        self.assertEqual(datos['partos_por_edad']['30_34'], 1)
+        self.assertEqual(datos['anestesia']['epidural'], 1)
+        self.assertEqual(GeneradorREM(date(2025, 9, 11), date(2025, 9, 30)).rem_bs22()['total_partos'], 0)
+
+    def test_reconstruir_resumen(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import ResumenDiario
+        esperado = self.resumen()
+        ResumenDiario.objects.all().delete()
+        ResumenDiario.objects.create(fecha=date(2020, 1, 1), dimension='tipo_parto', valor='eutocico', total=5)
+        call_command('reconstruir_resumen', stdout=StringIO())
+        self.assertEqual(self.resumen(), esperado)
+        self.assertEqual(ResumenDiario.objects.filter(fecha=date(2020, 1, 1)).count(), 0)
+
+    def test_importador_actualiza_el_resumen(self):
+        from .import_data import importar_datos_excel
+        filas = [[datetime(2025, 9, 10), '08:00', 'EVA DIAZ', 11111111, '1', 20, 'CES. URGENCIA', 39,
+                  'MASCULINO', 3300, 50, 9, 10]]
+        importar_datos_excel(planilla_partos(filas))
+        resumen = self.resumen()
+        self.assertEqual(resumen[('tipo_parto', 'cesarea_urgencia')], 1)
+        self.assertEqual(resumen[('rn_sexo', 'M')], 1)
+        self.assertEqual(resumen[('edad_madre', '20_24')], 1)
+
+    def test_dashboard_usa_el_resumen(self):
+        from django.utils import timezone
+        from .models import Parto
+        User = get_user_model()
+        User.objects.create_user(username='tester9', password='testpass')
+        self.client.login(username='tester9', password='testpass')
+        Parto.objects.create(madre=self.madre, fecha_hora=timezone.now() - timedelta(hours=1), tipo_parto='eutocico')
+        resp = self.client.get(reverse('cuentas:dashboard'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context['total_mes'], 1)
+        self.assertEqual(resp.context['total_30dias'], 1)
+
+
+class RemBs22SqlTests(TestCase):
+    """Los tramos de edad del REM-BS22 se calculan en SQL con una sola consulta."""
+    def setUp(self):
+        from django.utils import timezone
+        from .models import Parto
+        casos = [
+            # (nacimiento, parto local, tipo, anestesia)
+            (date(2010, 9, 11), datetime(2025, 9, 10, 12, 0), 'eutocico', 'ninguna'),      # 14 años: cumple mañana
+            (date(2010, 9, 10), datetime(2025, 9, 10, 12, 0), 'distocico', 'local'),       # 15 años justos
+            (date(2000, 2, 29), datetime(2025, 2, 28, 23, 59), 'cesarea_urgencia', None),  # 24 años
+            (date(1990, 1, 1), datetime(2025, 9, 1, 0, 30), 'cesarea_electiva', 'raquidea'),  # 35 años
+        ]
+        for i, (nacimiento, fecha_hora, tipo, anestesia) in enumerate(casos):
+            madre = Madre.objects.create(rut=f'{10000000 + i}-{i}', nombres='M', apellidos=str(i),
+                                         fecha_nacimiento=nacimiento, estado_civil='soltera',
+                                         direccion='x', telefono='+56 9 9123 4567', prevision='fonasa_a')
+            Parto.objects.create(madre=madre, fecha_hora=timezone.make_aware(fecha_hora),
+                                 tipo_parto=tipo, tipo_anestesia=anestesia)
+
+    def test_tramos_en_sql_en_una_consulta(self):
+        from .resumen import conteos_bs22_directo
+        with self.assertNumQueries(1):
+            conteos = conteos_bs22_directo(date(2025, 1, 1), date(2025, 12, 31))
+        self.assertEqual(conteos['total'], 4)
+        self.assertEqual(conteos['edad_madre'], {'menor_15': 1, '15_19': 1, '20_24': 1, '35_mas': 1})
+        self.assertEqual(conteos['tipo_parto']['cesarea_electiva'], 1)
+        self.assertEqual(conteos['tipo_anestesia'][None], 1)
+
+    def test_directo_y_resumen_coinciden(self):
+        from .utils import GeneradorREM
+        for desde, hasta in [(date(2025, 1, 1), date(2025, 12, 31)), (date(2025, 9, 1), date(2025, 9, 1))]:
+            with self.assertNumQueries(3):  # versión de datos + partos + recién nacidos
+                desde_resumen = GeneradorREM(desde, hasta).rem_bs22()
+            self.assertEqual(desde_resumen, GeneradorREM(desde, hasta, directo=True).rem_bs22())
+
+
+class PaqueteRemTests(TestCase):
+    """Todas las secciones REM salen de una pasada y se memoizan por versión de datos."""
+    def setUp(self):
+        from django.core.cache import cache
+        from django.utils import timezone
+        from .models import Parto, RecienNacido
+        cache.clear()
+        madre = Madre.objects.create(rut='12.345.678-5', nombres='Ana', apellidos='Rojas',
+                                     fecha_nacimiento=date(1995, 5, 1), estado_civil='soltera',
+                                     direccion='x', telefono='+56 9 9123 4567', prevision='fonasa_a')
+        fecha_hora = timezone.make_aware(datetime(2025, 9, 10, 10, 0))
+        self.parto = Parto.objects.create(madre=madre, fecha_hora=fecha_hora, tipo_parto='eutocico')
+        RecienNacido.objects.create(parto=self.parto, hora_nacimiento=fecha_hora.time(), sexo='F',
+                                    peso='3.200', talla='50.0', apgar_1=8, apgar_5=9, estado='fallecido')
+
+    def test_paquete_en_una_pasada_y_memoizado(self):
+        from .utils import GeneradorREM
+        for directo in (False, True):
+            generador = GeneradorREM(date(2025, 9, 1), date(2025, 9, 30), directo=directo)
+            with self.assertNumQueries(3):  # versión de datos + un recorrido de partos + uno de RN
+                paquete = generador.generar_paquete()
+            self.assertEqual(paquete['bs22']['total_partos'], 1)
+            self.assertEqual(paquete['a04']['defunciones_total'], 1)
+            with self.assertNumQueries(1):  # solo la versión de datos
+                self.assertEqual(generador.rem_a04(), paquete['a04'])
+
+    def test_cambio_de_datos_invalida_el_paquete(self):
+        from .utils import GeneradorREM
+        generador = GeneradorREM(date(2025, 9, 1), date(2025, 9, 30))
+        self.assertEqual(generador.rem_bs22()['partos_por_tipo']['eutocico'], 1)
+        self.parto.tipo_parto = 'distocico'
+        self.parto.save()
+        datos = generador.rem_bs22()
+        self.assertNotIn('eutocico', datos['partos_por_tipo'])
+        self.assertEqual(datos['partos_por_tipo']['distocico'], 1)
+
+    def test_exportar_excel_usa_el_paquete(self):
+        from io import BytesIO
+        from openpyxl import load_workbook
+        from .utils import GeneradorREM
+        libro = load_workbook(BytesIO(GeneradorREM(date(2025, 9, 1), date(2025, 9, 30)).exportar_excel()))
+        self.assertEqual(libro.sheetnames, ['REM-BS22', 'REM-A09', 'REM-A04'])
+
+
+class RangoFechasTests(TestCase):
+    """`en_rango` filtra por días locales con un rango semiabierto que usa el índice."""
+    def setUp(self):
+        from django.utils import timezone
+        from .models import Parto
+        madre = Madre.objects.create(rut='12.345.678-5', nombres='Ana', apellidos='Rojas',
+                                     fecha_nacimiento=date(1995, 5, 1), estado_civil='soltera',
+                                     direccion='x', telefono='+56 9 9123 4567', prevision='fonasa_a')
+        # 23:30 hora de Santiago ya es el día siguiente en UTC; el 7/9 empieza el horario de verano
+        for local in [datetime(2025, 9, 5, 23, 30), datetime(2025, 9, 6, 0, 0), datetime(2025, 9, 7, 1, 0)]:
+            Parto.objects.create(madre=madre, fecha_hora=timezone.make_aware(local), tipo_parto='eutocico')
+
+    def test_equivale_al_filtro_por_fecha(self):
+        from .models import Parto, RecienNacido
+        for desde, hasta in [(date(2025, 9, 5), date(2025, 9, 5)), (date(2025, 9, 6), date(2025, 9, 7)),
+                             (date(2025, 9, 1), date(2025, 9, 30))]:
+            esperado = set(Parto.objects.filter(fecha_hora__date__range=[desde, hasta]).values_list('id', flat=True))
+            self.assertEqual(set(Parto.objects.en_rango(desde, hasta).values_list('id', flat=True)), esperado)
+        self.assertEqual(Parto.objects.en_rango(date(2025, 9, 5), date(2025, 9, 5)).count(), 1)
+        self.assertEqual(Parto.objects.en_rango(desde=date(2025, 9, 6)).count(), 2)
+        self.assertEqual(RecienNacido.objects.en_rango(date(2025, 9, 1), date(2025, 9, 30)).count(), 0)
+
+    def test_explain_usa_el_indice(self):
+        from django.db import connection
+        from .models import Parto
+        consulta = Parto.objects.en_rango(date(2025, 9, 1), date(2025, 9, 30)).values('id')
+        if connection.vendor == 'sqlite':
+            # SEARCH con el rango sobre la columna, no un SCAN completo del índice
+            plan = consulta.explain()
+            self.assertIn('SEARCH registros_parto USING', plan)
+            self.assertIn('(fecha_hora>? AND fecha_hora<?)', plan)
+        elif connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            self.assertIn('Index', consulta.explain())
+        else:
+            self.skipTest('EXPLAIN solo se verifica en SQLite y Postgres')
+
+
+class PaginacionCursorTests(TestCase):
+    """lista_partos pagina por (fecha_hora, id) con cursores opacos y total en caché."""
+    def setUp(self):
+        from django.core.cache import cache
+        from django.utils import timezone
+        from .models import Parto
+        cache.clear()
+        User = get_user_model()
+        self.user = User.objects.create_user(username='pag', password='pass')
+        self.client = Client()
+        self.client.force_login(self.user)
+        madre = Madre.objects.create(rut='12.345.678-5', nombres='Ana', apellidos='Rojas',
+                                     fecha_nacimiento=date(1995, 5, 1), estado_civil='soltera',
+                                     direccion='x', telefono='+56 9 9123 4567', prevision='fonasa_a')
+        base = timezone.make_aware(datetime(2025, 3, 1, 8, 0))
+        # Varios partos con la misma fecha_hora para ejercitar el desempate por id
+        for i in range(25):
+            Parto.objects.create(madre=madre, fecha_hora=base + timedelta(hours=i // 3), tipo_parto='eutocico',
+                                 created_by=self.user)
+        self.esperado = list(Parto.objects.order_by('-fecha_hora', '-id').values_list('id', flat=True))
+
+    def _pagina(self, cursor=None):
+        params = {'cursor': cursor} if cursor else {}
+        return self.client.get(reverse('registros:lista_partos'), params).context['partos']
+
+    def test_recorre_todas_las_paginas_en_ambos_sentidos(self):
+        paginas = [self._pagina()]
+        while paginas[-1].has_next:
+            paginas.append(self._pagina(paginas[-1].cursor_siguiente))
+        self.assertEqual([len(p) for p in paginas], [10, 10, 5])
+        self.assertEqual([parto.id for p in paginas for parto in p], self.esperado)
+        self.assertFalse(paginas[0].has_previous)
+        self.assertEqual(paginas[0].total, 25)
+
+        anterior = self._pagina(paginas[-1].cursor_anterior)
+        self.assertEqual([parto.id for parto in anterior], [parto.id for parto in paginas[1]])
+        primera = self._pagina(anterior.cursor_anterior)
+        self.assertEqual([parto.id for parto in primera], self.esperado[:10])
+        self.assertFalse(primera.has_previous)
+
+    def test_cursor_invalido_muestra_la_primera_pagina(self):
+        pagina = self._pagina('no-es-un-cursor')
+        self.assertEqual([parto.id for parto in pagina], self.esperado[:10])
+
+    def test_total_en_cache_hasta_que_cambian_los_datos(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .models import Parto
+        self._pagina()
+        with CaptureQueriesContext(connection) as consultas:
+            self._pagina()
+        self.assertFalse([q for q in consultas.captured_queries if 'COUNT(' in q['sql']])
+        self.assertFalse([q for q in consultas.captured_queries if 'OFFSET' in q['sql']])
+
+        Parto.objects.filter(id=self.esperado[0]).delete()
+        self.assertEqual(self._pagina().total, 24)
+
+    def test_lista_madres_pagina_por_created_at(self):
+        from .utils import calculate_dv
+        for i in range(16):
+            Madre.objects.create(rut=f'{10000000 + i}-{calculate_dv(10000000 + i)}', nombres=f'M{i}',
+                                 apellidos='Soto', fecha_nacimiento=date(1990, 1, 1), estado_civil='soltera',
+                                 direccion='x', telefono='+56 9 9123 4567', prevision='fonasa_a')
+        respuesta = self.client.get(reverse('registros:lista_madres'))
+        madres = respuesta.context['madres']
+        self.assertEqual((len(madres), madres.total), (15, 17))
+        siguiente = self.client.get(reverse('registros:lista_madres'), {'cursor': madres.cursor_siguiente})
+        self.assertEqual(len(siguiente.context['madres']), 2)
+        self.assertContains(respuesta, 'Siguiente')
+
+
+class BusquedaPartosTests(TestCase):
+    """La búsqueda de lista_partos usa el documento desnormalizado mantenido por señales."""
+    def setUp(self):
+        from django.utils import timezone
+        from .models import Parto, RecienNacido
+        User = get_user_model()
+        self.user = User.objects.create_user(username='busca', password='pass')
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.madre = Madre.objects.create(rut='12.345.678-5', nombres='María José', apellidos='Núñez',
+                                          fecha_nacimiento=date(1995, 5, 1), estado_civil='soltera',
+                                          direccion='x', telefono='+56 9 9123 4567', prevision='fonasa_a')
+        self.parto = Parto.objects.create(madre=self.madre, fecha_hora=timezone.make_aware(datetime(2025, 3, 1, 8)),
+                                          tipo_parto='eutocico', profesional_a_cargo='Matrona Pérez',
+                                          folio_valido='F-1234', created_by=self.user)
+        self.rn = RecienNacido.objects.create(parto=self.parto, hora_nacimiento='08:00', sexo='F', peso=3.2,
+                                              talla=49, apgar_1=8, apgar_5=9)
+        otra = Madre.objects.create(rut='11.111.111-1', nombres='Ana', apellidos='Rojas',
+                                    fecha_nacimiento=date(1990, 1, 1), estado_civil='soltera',
+                                    direccion='x', telefono='+56 9 9123 4567', prevision='fonasa_a')
+        self.otro = Parto.objects.create(madre=otra, fecha_hora=timezone.make_aware(datetime(2025, 3, 2, 8)),
+                                         tipo_parto='eutocico', created_by=self.user)
+
+    def _ids(self, q):
+        respuesta = self.client.get(reverse('registros:lista_partos'), {'q': q})
+        return [parto.id for parto in respuesta.context['partos']]
+
+    def test_busca_por_rut_nombre_profesional_folio_y_recien_nacido(self):
+        for q in ['12.345.678-5', '1234', 'maria nunez', 'NÚÑEZ', 'perez', 'f 1234', 'femenino']:
+            self.assertEqual(self._ids(q), [self.parto.id], q)
+        self.assertEqual(self._ids('rojas'), [self.otro.id])
+        self.assertEqual(self._ids('inexistente'), [])
+
+    def test_senales_mantienen_el_documento(self):
+        from .models import DocumentoBusquedaParto
+        self.madre.apellidos = 'Soto'
+        self.madre.save()
+        self.assertEqual(self._ids('soto'), [self.parto.id])
+        self.assertEqual(self._ids('nunez'), [])
+
+        self.rn.delete()
+        self.assertEqual(self._ids('femenino'), [])
+        self.parto.delete()
+        self.assertFalse(DocumentoBusquedaParto.objects.filter(parto_id=self.parto.id).exists())
+        self.assertEqual(self._ids('soto'), [])
+
+    def test_importador_escribe_los_documentos(self):
+        from .import_data import importar_filas
+        from .models import Parto
+        from django.utils import timezone
+        fila = {
+            'fila_excel': 4, 'rut_normalizado': '123456785', 'nombres': 'María José', 'apellidos': 'Valdés',
+            'direccion': '', 'tiene_direccion': False, 'fecha_hora': timezone.make_aware(datetime(2025, 4, 1, 9)),
+            'tipo_parto': 'eutocico', 'semanas_gestacion': 39, 'sexo': 'M', 'peso': 3.4, 'talla': 50,
+            'apgar_1': 9, 'apgar_5': 9, 'fecha_nacimiento': date(1995, 5, 1),
+        }
+        importar_filas([fila], self.user)
+        # El cambio de apellido alcanza también al parto que ya existía
+        ids = set(filtrar_partos(Parto.objects.all(), 'valdes').values_list('id', flat=True))
+        self.assertEqual(len(ids), 2)
+        self.assertIn(self.parto.id, ids)
+
+
+class PdfPorBloquesTests(TestCase):
+    """El PDF se arma por bloques (en procesos aparte) con numeración de páginas continua."""
+    def setUp(self):
+        from django.utils import timezone
+        from .models import Parto
+        User = get_user_model()
+        self.user = User.objects.create_user(username='pdf', password='pass')
+        base = timezone.make_aware(datetime(2025, 3, 1, 8, 0))
+        for i in range(5):
+            madre = Madre.objects.create(rut=f'{20000000 + i}-{i}', nombres=f'Madre{i}', apellidos='Pdf',
+                                         fecha_nacimiento=date(1995, 5, 1), estado_civil='soltera',
+                                         direccion='x', telefono='+56 9 9123 4567', prevision='fonasa_a')
+            Parto.objects.create(madre=madre, fecha_hora=base + timedelta(days=i), tipo_parto='eutocico',
+                                 created_by=self.user)
+
+    def _generar(self, **opciones):
+        from io import BytesIO
+        from pypdf import PdfReader
+        from .pdf_export import generar_pdf_partos
+        destino = BytesIO()
+        with self.settings(**opciones):
+            self.assertIsNone(generar_pdf_partos(destino))
+        destino.seek(0)
+        return [pagina.extract_text() for pagina in PdfReader(destino).pages]
+
+    def test_bloques_en_paralelo_con_numeracion_continua(self):
+        paginas = self._generar(PDF_PARTOS_POR_BLOQUE=2, PDF_PROCESOS=2)
+        self.assertEqual(len(paginas), 3)  # 2 + 2 + 1 partos, una página por bloque
+        for numero, texto in enumerate(paginas, start=1):
+            self.assertIn(f'Página {numero} de 3', texto)
+        self.assertIn('Reporte de Partos', paginas[0])
+        self.assertNotIn('Reporte de Partos', paginas[1])
+        todo = ''.join(paginas)
+        # Sin tope de filas y en orden descendente por fecha
+        posiciones = [todo.index(f'Madre{i}') for i in range(5)]
+        self.assertEqual(posiciones, sorted(posiciones, reverse=True))
+
+    def test_sin_partos_genera_una_pagina(self):
+        from .models import Parto
+        Parto.objects.all().delete()
+        paginas = self._generar(PDF_PROCESOS=1)
+        self.assertEqual(len(paginas), 1)
+        self.assertIn('Página 1 de 1', paginas[0])
+
+    def test_memoria_de_la_union_no_crece_con_los_bloques(self):
+        import os
+        import shutil
+        import tempfile
+        import tracemalloc
+        from io import BytesIO
+        from pypdf import PdfReader
+        from .pdf_motor import html_a_pdf, unir_pdfs
+        carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, carpeta, ignore_errors=True)
+        base = os.path.join(carpeta, 'base.pdf')
+        filas = ''.join(f'<tr><td>Madre {i}</td><td>{i}</td></tr>' for i in range(300))
+        self.assertTrue(html_a_pdf(f'<table>{filas}</table>', base))
+
+        def pico(bloques):
+            rutas = []
+            for i in range(bloques):
+                rutas.append(os.path.join(carpeta, f'{bloques}_{i}.pdf'))
+                shutil.copy(base, rutas[-1])
+            destino = BytesIO()
+            tracemalloc.start()
+            try:
+                unir_pdfs(rutas, destino)
+                # Sin contar el destino, que aquí está en memoria
+                return tracemalloc.get_traced_memory()[1] - len(destino.getvalue()), destino
+            finally:
+                tracemalloc.stop()
+
+        pico(2)  # primera carga de módulos y cachés de pypdf
+        pocos, _ = pico(4)
+        muchos, destino = pico(32)
+        destino.seek(0)
+        paginas = PdfReader(destino).pages
+        self.assertEqual(len(paginas), 32 * len(PdfReader(base).pages))
+        self.assertIn(f'Página {len(paginas)} de {len(paginas)}', paginas[-1].extract_text())
+        self.assertLess(muchos, pocos * 1.3)
+
+
+class ArtefactosCacheTests(TestCase):
+    """Las descargas repetidas se sirven desde la caché de artefactos hasta que cambian los datos del rango."""
+    def setUp(self):
+        import tempfile
+        from django.test import override_settings
+        from django.utils import timezone
+        from .models import Parto
+        self.media = tempfile.TemporaryDirectory()
+        self.override = override_settings(MEDIA_ROOT=self.media.name, EXPORTACIONES_EN_SEGUNDO_PLANO=False)
+        self.override.enable()
+        User = get_user_model()
+        self.user = User.objects.create_user(username='cache', password='pass')
+        self.client.force_login(self.user)
+        madre = Madre.objects.create(rut='12.345.678-5', nombres='Ana', apellidos='Rojas',
+                                     fecha_nacimiento=date(1995, 5, 1), estado_civil='soltera',
+                                     direccion='x', telefono='+56 9 9123 4567', prevision='fonasa_a')
+        self.dentro = Parto.objects.create(madre=madre, fecha_hora=timezone.make_aware(datetime(2025, 1, 10, 8)),
+                                           tipo_parto='eutocico', created_by=self.user)
+        self.fuera = Parto.objects.create(madre=madre, fecha_hora=timezone.make_aware(datetime(2025, 3, 10, 8)),
+                                          tipo_parto='eutocico', created_by=self.user)
+        self.params = {'start': '2025-01-01', 'end': '2025-01-31'}
+
+    def tearDown(self):
+        self.override.disable()
+        self.media.cleanup()
+
+    def _exportar(self, **headers):
+        return self.client.get(reverse('registros:exportar_partos'), self.params, headers=headers)
+
+    def test_segunda_descarga_sale_de_la_cache_con_etag(self):
+        from .models import TrabajoExportacion
+        self.assertEqual(self._exportar().status_code, 302)
+        self.assertEqual(TrabajoExportacion.objects.count(), 1)
+
+        cacheada = self._exportar()
+        self.assertEqual(cacheada.status_code, 200)
+        self.assertIn('Registros_Partos_2025-01-01_2025-01-31.xlsx', cacheada['Content-Disposition'])
+        etag = cacheada['ETag']
+        cacheada.close()
+        self.assertEqual(TrabajoExportacion.objects.count(), 1)
+
+        no_modificada = self._exportar(if_none_match=etag)
+        self.assertEqual(no_modificada.status_code, 304)
+        self.assertEqual(no_modificada['ETag'], etag)
+
+    def test_cambio_en_los_datos_invalida(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .artefactos import clave_artefacto
+        from .models import RecienNacido
+        self._exportar()
+        # La clave sale de la versión de los datos: una consulta, sin agregados sobre los partos
+        with CaptureQueriesContext(connection) as consultas:
+            clave_artefacto('excel', {'fecha_inicio': None, 'fecha_fin': None})
+        self.assertEqual(len(consultas), 1)
+        self.assertIn('registros_versiondatos', consultas[0]['sql'])
+        respuesta = self._exportar()
+        self.assertEqual(respuesta.status_code, 200)
+        respuesta.close()
+
+        RecienNacido.objects.create(parto=self.dentro, hora_nacimiento='08:00', sexo='F', peso=3.2,
+                                    talla=49, apgar_1=8, apgar_5=9)
+        self.assertEqual(self._exportar().status_code, 302)
+
+    def test_exportacion_completa_lleva_la_fecha_de_la_descarga(self):
+        from unittest import mock
+        from django.utils import timezone
+        self.params = {}
+        self._exportar()
+        with mock.patch('registros.artefactos.timezone.localdate', return_value=date(2030, 2, 3)):
+            respuesta = self._exportar()
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('Registros_Partos_Completo_20300203.xlsx', respuesta['Content-Disposition'])
+        respuesta.close()
+        hoy = timezone.localdate().strftime('%Y%m%d')
+        respuesta = self._exportar()
+        self.assertIn(f'Registros_Partos_Completo_{hoy}.xlsx', respuesta['Content-Disposition'])
+        respuesta.close()
+
+    def test_desalojo_lru_por_tamano(self):
+        import os
+        from io import BytesIO
+        from .artefactos import buscar_artefacto, clave_artefacto, desalojar_artefactos, guardar_artefacto
+        antiguo = guardar_artefacto(clave_artefacto('excel', {'n': 1}, 's'), BytesIO(b'a' * 100), 'a.xlsx')
+        nuevo = guardar_artefacto(clave_artefacto('excel', {'n': 2}, 's'), BytesIO(b'b' * 100), 'b.xlsx')
+        os.utime(antiguo.ruta, (1, 1))
+        self.assertEqual(desalojar_artefactos(max_bytes=150), 1)
+        self.assertFalse(os.path.exists(antiguo.ruta))
+        self.assertTrue(os.path.exists(nuevo.ruta))
+        self.assertIsNone(buscar_artefacto('excel', {'n': 1}, clave_artefacto('excel', {'n': 1}, 's')))
+        encontrado = buscar_artefacto('excel', {'n': 2}, clave_artefacto('excel', {'n': 2}, 's'))
+        encontrado.archivo.close()
+        self.assertEqual(encontrado.sha, nuevo.sha)
+
+    def test_desalojo_durante_la_descarga(self):
+        import os
+        from unittest import mock
+        from .artefactos import desalojar_artefactos
+        from .models import TrabajoExportacion
+        self._exportar()
+        # Otro proceso desaloja el archivo justo después de encontrarlo
+        with mock.patch('registros.views.buscar_artefacto', side_effect=self._buscar_y_desalojar):
+            respuesta = self._exportar()
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(b''.join(respuesta.streaming_content)[:2], b'PK')
+        respuesta.close()
+
+        # Si también se purgó el archivo del trabajo, la descarga vuelve a encolar
+        trabajo = TrabajoExportacion.objects.get()
+        os.remove(trabajo.archivo.path)
+        desalojar_artefactos(max_bytes=0)
+        respuesta = self.client.get(reverse('registros:exportacion_descargar', args=[trabajo.id]))
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertEqual(TrabajoExportacion.objects.count(), 2)
+
+    def _buscar_y_desalojar(self, *args, **kwargs):
+        from .artefactos import buscar_artefacto, desalojar_artefactos
+        artefacto = buscar_artefacto(*args, **kwargs)
+        self.assertEqual(desalojar_artefactos(max_bytes=0), 1)
+        return artefacto
+
+
+class DatosSinteticosTests(TestCase):
+    """Generador de datos sintéticos y benchmark de punta a punta."""
+    def test_generador_respeta_choices_y_validaciones(self):
+        from django.core.management import call_command
+        from .models import Parto, RecienNacido, DocumentoBusquedaParto
+        from .resumen import total_partos
+        from .utils import validate_rut
+        call_command('generar_datos_sinteticos', '60', '--semilla', '7', '--lote', '25', stdout=open('/dev/null', 'w'))
+
+        self.assertEqual(Parto.objects.count(), 60)
+        self.assertLessEqual(Madre.objects.count(), 60)
+        self.assertGreaterEqual(RecienNacido.objects.count(), 60)
+        self.assertEqual(DocumentoBusquedaParto.objects.count(), 60)
+        self.assertEqual(total_partos(), 60)
+        self.assertTrue(all(validate_rut(m.rut) for m in Madre.objects.all()))
+
+        tipos = {v for v, _ in Parto.TIPO_PARTO_CHOICES}
+        robson = {v for v, _ in Parto.CLASIFICACION_ROBSON_CHOICES}
+        for parto in Parto.objects.all():
+            self.assertIn(parto.tipo_parto, tipos)
+            self.assertIn(parto.clasificacion_robson, robson)
+        for rn in RecienNacido.objects.select_related('parto'):
+            rn.clean_fields()
+            self.assertGreaterEqual(rn.apgar_5, rn.apgar_1)
+            self.assertGreater(rn.apgar_1, 0)
+            if rn.parto.semanas_gestacion >= 37:
+                self.assertTrue(2 <= rn.peso <= 5)
+
+    def test_benchmark_escribe_json(self):
+        import tempfile
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        with tempfile.NamedTemporaryFile(suffix='.json') as salida, self.settings(PDF_PROCESOS=1):
+            call_command('benchmark', '--tamanos', '15', '--repeticiones', '2', '--filas-importacion', '3',
+                         '--ruts-lote', '5', '--semilla', '1', '--salida', salida.name,
+                         stdout=open('/dev/null', 'w'))
+            informe = json.load(open(salida.name))
+        resultado = informe['resultados'][0]
+        self.assertEqual(resultado['tamano'], 15)
+        for ruta in ('madre_lookup', 'madre_lookup_lote', 'madre_typeahead_nombre', 'lista_partos', 'lista_partos_pagina_profunda',
+                     'exportar_partos', 'exportar_partos_pdf', 'reporte_rem', 'importar_datos_excel'):
+            self.assertEqual(resultado['rutas'][ruta]['n'], 2)
+            self.assertGreater(resultado['rutas'][ruta]['consultas'], 0)
+        # El lote resuelve con una consulta lo que uno a uno cuesta una por RUT
+        self.assertLess(resultado['rutas']['madre_lookup_lote']['consultas'],
+                        resultado['rutas']['madre_lookup_uno_a_uno']['consultas'])
+
+        # Con datos reales en la base no corre
+        Madre.objects.create(rut='12.345.678-5', nombres='Ana', apellidos='Real', fecha_nacimiento=date(1990, 1, 1),
+                             estado_civil='soltera', direccion='x', telefono='123456789', prevision='fonasa_a')
+        with self.assertRaises(CommandError):
+            call_command('benchmark', '--tamanos', '15', stdout=open('/dev/null', 'w'))
+
+
+class RutEnLoteTests(TestCase):
+    """`ruts_en_lote` coincide con las funciones de a un RUT sobre un corpus aleatorio."""
+    def corpus(self, cantidad=3000, semilla=19):
+        import random
+        from .utils import calculate_dv
+        rng = random.Random(semilla)
+        valores = ['', '-', 'k', '0-0', '1-9', '00000000-0', '999999-9', '1000000-0', None, 0]
+        for _ in range(cantidad):
+            numero = rng.choice([rng.randrange(1, 10 ** 6), rng.randrange(10 ** 6, 3 * 10 ** 7),
+                                 rng.randrange(10 ** 8, 10 ** 14)])
+            dv = calculate_dv(numero) if rng.random() < 0.6 else rng.choice('0123456789Kk')
+            texto = rng.choice([f'{numero}{dv}', f'{numero}-{dv}', format_rut(f'{numero}{dv}'),
+                                f' {numero}-{dv.lower()} ', f'{numero}.{dv}', f'0{numero}-{dv}', f'{numero}K{dv}',
+                                f'RUT {numero}-{dv}', f'{numero}'])
+            valores.append(texto)
+            if rng.random() < 0.05:
+                valores.append(numero)
+        return valores
+
+    def test_textos_largos_se_truncan_e_invalidan(self):
+        import pandas as pd
+        from .utils import MAX_LARGO_RUT, ruts_en_lote
+        resultado = ruts_en_lote(pd.Series(['12.345.678-5', '1' * 5000, ' ' * 30 + '12.345.678-5'], dtype='object'))
+        self.assertEqual(list(resultado['valido']), [True, False, False])
+        self.assertEqual(list(resultado['normalizado']), ['123456785', '', ''])
+        self.assertEqual(resultado['limpio'][1], '1' * MAX_LARGO_RUT)
+
+    def test_coincide_con_las_funciones_escalares(self):
+        import numpy as np
+        import pandas as pd
+        from .utils import clean_rut, ruts_en_lote, validate_rut
+        valores = self.corpus()
+        for entrada in (pd.Series(valores, dtype='object'), np.array(valores, dtype=object)):
+            resultado = ruts_en_lote(entrada)
+            for crudo, limpio, valido, normalizado, formateado in zip(
+                    valores, resultado['limpio'], resultado['valido'], resultado['normalizado'], resultado['formateado']):
+                texto = '' if crudo is None or crudo == 0 else str(crudo)
+                self.assertEqual(limpio, clean_rut(crudo), crudo)
+                self.assertEqual(valido, validate_rut(texto), crudo)
+                self.assertEqual(normalizado, normalize_rut(texto), crudo)
+                self.assertEqual(formateado, format_rut(normalize_rut(texto)), crudo)
+
+    def test_dv_de_madre_usa_el_modulo_11(self):
+        from .utils import calculate_dv
+        for numero in range(10_000_000, 10_000_200):
+            self.assertEqual(Madre.calcular_dv(numero), calculate_dv(numero))
+        self.assertEqual(Madre.calcular_dv(10000013), 'K')
+
+    def test_importador_rechaza_dv_invalido(self):
+        from .import_data import importar_datos_excel
+        filas = [
+            [datetime(2025, 9, 1), '09:56', 'ANA ROJAS', 12345678, '5', 27, 'EUTOCICO', 38, 'FEMENINO', 3450, 50, 8, 9],
+            [datetime(2025, 9, 2), '10:00', 'EVA PEREZ', 12345678, '4', 30, 'EUTOCICO', 39, 'FEMENINO', 3200, 50, 9, 10],
+        ]
+        resultado = importar_datos_excel(planilla_partos(filas))
+        self.assertEqual(resultado['counts']['partos'], 1)
+        self.assertEqual(resultado['errors'], ['Fila 4: RUT inválido: 123456784'])
+
+
+class ArranqueTests(TestCase):
+    """El arranque de un worker no carga pandas, openpyxl ni xhtml2pdf."""
+    def test_parsea_salida_de_importtime(self):
+        from .arranque import informe_arranque, parsear_importtime
+        salida = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       300 |        300 |     numpy.core\n'
+            'import time:      1200 |       1500 |   numpy\n'
+            'import time:      2000 |       3500 | pandas\n'
+            'import time:       500 |        500 | registros.views\n'
+        )
+        modulos = parsear_importtime(salida)
+        self.assertEqual(modulos[0], ('numpy.core', 300, 300))
+        informe = informe_arranque(modulos, top=2)
+        self.assertEqual(informe['total_ms'], 4.0)
+        self.assertEqual(informe['pesadas'], ['pandas', 'numpy'])
+        self.assertEqual([m['modulo'] for m in informe['mas_lentos']], ['pandas', 'numpy'])
+
+    def test_arranque_sin_bibliotecas_pesadas(self):
+        from .arranque import medir_arranque
+        informe = medir_arranque()
+        self.assertEqual(informe['pesadas'], [], informe['mas_lentos'])
@@ -11,11 +11,19 @@ urlpatterns = [
     path('madres/', views.lista_madres, name='lista_madres'),
     path('exportar/excel/', views.exportar_partos, name='exportar_partos'),
     path('exportar/pdf/', views.exportar_partos_pdf, name='exportar_partos_pdf'),
+    path('exportar/<int:trabajo_id>/', views.exportacion_estado, name='exportacion_estado'),
+    path('exportar/<int:trabajo_id>/descargar/', views.exportacion_descargar, name='exportacion_descargar'),
     path('importar/', views.importar_partos, name='importar_partos'),
+    path('importar/<str:clave>/', views.importar_vista_previa, name='importar_vista_previa'),
+    path('importar/<str:clave>/confirmar/', views.importar_confirmar, name='importar_confirmar'),
+    path('importar/<str:clave>/perfil/<int:hoja>/', views.importar_perfil, name='importar_perfil'),
     path('api/madre/', views.madre_lookup, name='madre_lookup'),
+    path('api/madre/lote/', views.madre_lookup_lote, name='madre_lookup_lote'),
     path('api/madre_create/', views.madre_create, name='madre_create'),
     path('madre/create/page/', views.madre_create_page, name='madre_create_page'),
     path('api/madre_typeahead/', views.madre_typeahead, name='madre_typeahead'),
+    path('api/madres/indice/', views.madre_indice, name='madre_indice'),
+    path('api/madres/indice/delta/', views.madre_indice_delta, name='madre_indice_delta'),
     path('api/profesionales/', views.profesionales_list, name='profesionales_list'),
     path('detalle/<int:parto_id>/', views.detalle_parto, name='detalle_parto'),
     path('editar/<int:parto_id>/', views.editar_parto, name='editar_parto'),
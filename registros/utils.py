@@ -1,12 +1,19 @@
 import re
+import unicodedata
+from itertools import cycle
+
+# Factores del módulo 11, desde el dígito de las unidades
+FACTORES_DV = (2, 3, 4, 5, 6, 7)
+RUT_MINIMO = 1000000
+# Ningún RUT escrito, ni con puntos, guion o espacios, llega a este largo
+MAX_LARGO_RUT = 20
 
 
 def calculate_dv(rut_number: str) -> str:
     """Calculate verification digit for Chilean RUT."""
     reversed_digits = map(int, reversed(str(rut_number)))
-    factors = (2, 3, 4, 5, 6, 7)
     s = 0
-    for d, f in zip(reversed_digits, factors * 2):  # Use factors * 2 to handle longer numbers
+    for d, f in zip(reversed_digits, cycle(FACTORES_DV)):
         s += d * f
     dv = 11 - (s % 11)
     if dv == 11:
@@ -29,7 +36,7 @@ def validate_rut(rut: str) -> bool:
    
     if not number.isdigit():
         return False
-    if int(number) < 1000000:  
+    if int(number) < RUT_MINIMO:
         return False
     
     expected_dv = calculate_dv(number)
@@ -47,6 +54,24 @@ def normalize_rut(raw: str) -> str:
     return s
 
 
+def clean_rut(raw: str) -> str:
+    """Return only digits + dv (uppercase), without validating the check digit.
+    This is the canonical key stored in `Madre.rut_normalizado`."""
+    if not raw:
+        return ''
+    return re.sub(r'[^0-9kK]', '', str(raw)).upper()
+
+
+def fold_text(value: str) -> str:
+    """Lowercase, strip accents and collapse whitespace ("María  José" -> "maria jose").
+    Used to build accent-insensitive search keys."""
+    if not value:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', str(value))
+    sin_tildes = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(sin_tildes.lower().split())
+
+
 def format_rut(clean: str) -> str:
     """Format a cleaned rut (digits+dv) into XX.XXX.XXX-X style if possible."""
     if not clean:
@@ -62,23 +87,70 @@ def format_rut(clean: str) -> str:
     if num:
         parts.insert(0, num)
     return '.'.join(parts) + '-' + dv
-from datetime import datetime
-from django.db.models import Count, Q
-from .models import Parto, RecienNacido
+from django.core.cache import cache
+
+from .resumen import conteos_bs22, conteos_bs22_directo, conteos_rn, conteos_rn_directo
+from .versiones import version_datos
+
+# Segundos que se guarda un paquete REM en caché (la versión de datos lo invalida antes)
+REM_CACHE_SEGUNDOS = 3600
 
 class GeneradorREM:
-    def __init__(self, fecha_inicio, fecha_fin):
+    def __init__(self, fecha_inicio, fecha_fin, directo=False):
+        """`directo=True` calcula desde partos y recién nacidos en vez del resumen diario."""
         self.fecha_inicio = fecha_inicio
         self.fecha_fin = fecha_fin
-        self.partos = Parto.objects.filter(
-            fecha_hora__date__range=[fecha_inicio, fecha_fin]
-        ).select_related('madre').prefetch_related('recien_nacidos')
+        self.directo = directo
+
+    def clave_cache(self):
+        modo = 'directo' if self.directo else 'resumen'
+        return f'registros:rem:{self.fecha_inicio}:{self.fecha_fin}:{modo}:{version_datos()}'
+
+    def generar_paquete(self):
+        """
+        Calcula todas las secciones REM ({'bs22', 'a09', 'a04'}) en una pasada:
+        un recorrido de partos y uno de recién nacidos (o una lectura del resumen
+        diario por cada uno). El resultado se memoiza por rango de fechas y
+        versión de los datos, así que repetir la descarga del mismo mes no
+        vuelve a consultar.
+        """
+        clave = self.clave_cache()
+        paquete = cache.get(clave)
+        if paquete is None:
+            if self.directo:
+                partos = conteos_bs22_directo(self.fecha_inicio, self.fecha_fin)
+                recien_nacidos = conteos_rn_directo(self.fecha_inicio, self.fecha_fin)
+            else:
+                partos = conteos_bs22(self.fecha_inicio, self.fecha_fin)
+                recien_nacidos = conteos_rn(self.fecha_inicio, self.fecha_fin)
+            paquete = {
+                'bs22': self._datos_bs22(partos),
+                'a09': self._datos_a09(),
+                'a04': self._datos_a04(recien_nacidos),
+            }
+            cache.set(clave, paquete, REM_CACHE_SEGUNDOS)
+        return paquete
 
     def rem_bs22(self):
         """
         Genera datos para el REM-BS22 (Atenciones de Obstetricia y Ginecología)
         """
-    
+        return self.generar_paquete()['bs22']
+
+    def rem_a09(self):
+        """
+        Genera datos para el REM-A09 (Egresos Hospitalarios)
+        """
+        return self.generar_paquete()['a09']
+
+    def rem_a04(self):
+        """
+        Genera datos para el REM-A04 (Defunciones)
+        """
+        return self.generar_paquete()['a04']
+
+    @staticmethod
+    def _datos_bs22(conteos):
         datos = {
             'total_partos': 0,
             'partos_por_tipo': {
@@ -102,44 +174,14 @@ class GeneradorREM:
                 'general': 0
             }
         }
-
-       
-        tipos_parto = self.partos.values('tipo_parto').annotate(
-            total=Count('id')
-        )
-        for tipo in tipos_parto:
-            datos['partos_por_tipo'][tipo['tipo_parto']] = tipo['total']
-            datos['total_partos'] += tipo['total']
-
-       
-        for parto in self.partos:
-            edad = (parto.fecha_hora.date() - parto.madre.fecha_nacimiento).days // 365
-            if edad < 15:
-                datos['partos_por_edad']['menor_15'] += 1
-            elif edad <= 19:
-                datos['partos_por_edad']['15_19'] += 1
-            elif edad <= 24:
-                datos['partos_por_edad']['20_24'] += 1
-            elif edad <= 29:
-                datos['partos_por_edad']['25_29'] += 1
-            elif edad <= 34:
-                datos['partos_por_edad']['30_34'] += 1
-            else:
-                datos['partos_por_edad']['35_mas'] += 1
-
-       
-        tipos_anestesia = self.partos.values('tipo_anestesia').annotate(
-            total=Count('id')
-        )
-        for tipo in tipos_anestesia:
-            datos['anestesia'][tipo['tipo_anestesia']] = tipo['total']
-
+        datos['total_partos'] = conteos['total']
+        datos['partos_por_tipo'].update(conteos['tipo_parto'])
+        datos['partos_por_edad'].update(conteos['edad_madre'])
+        datos['anestesia'].update(conteos['tipo_anestesia'])
         return datos
 
-    def rem_a09(self):
-        """
-        Genera datos para el REM-A09 (Egresos Hospitalarios)
-        """
+    @staticmethod
+    def _datos_a09():
         datos = {
             'egresos_total': 0,
             'motivo_egreso': {
@@ -149,14 +191,10 @@ class GeneradorREM:
             },
             'estadia_promedio': 0  
         }
-
-   
         return datos
 
-    def rem_a04(self):
-        """
-        Genera datos para el REM-A04 (Defunciones)
-        """
+    @staticmethod
+    def _datos_a04(conteos_rn):
         datos = {
             'defunciones_total': 0,
             'defunciones_por_edad': {
@@ -167,14 +205,7 @@ class GeneradorREM:
                 '28_dias_mas': 0
             }
         }
-
-
-        recien_nacidos = RecienNacido.objects.filter(
-            parto__fecha_hora__date__range=[self.fecha_inicio, self.fecha_fin],
-            estado='fallecido'
-        )
-        datos['defunciones_total'] = recien_nacidos.count()
-
+        datos['defunciones_total'] = conteos_rn['rn_estado'].get('fallecido', 0)
         return datos
 
     def exportar_excel(self):
@@ -184,22 +215,106 @@ class GeneradorREM:
         import pandas as pd
         from io import BytesIO
 
- 
+        paquete = self.generar_paquete()
         output = BytesIO()
-        writer = pd.ExcelWriter(output, engine='openpyxl')
+        # ExcelWriter.save() ya no existe en pandas 2: el context manager cierra el libro
+        with pd.ExcelWriter(output, engine='openpyxl') as writer:
+            pd.DataFrame([paquete['bs22']]).to_excel(writer, sheet_name='REM-BS22', index=False)
+            pd.DataFrame([paquete['a09']]).to_excel(writer, sheet_name='REM-A09', index=False)
+            pd.DataFrame([paquete['a04']]).to_excel(writer, sheet_name='REM-A04', index=False)
+
+        return output.getvalue()
+
+
+def _vacio(valor):
+    if isinstance(valor, str):
+        return not valor
+    try:
+        return valor is None or valor != valor or not valor  # None, NaN/NaT, 0
+    except TypeError:  # pd.NA
+        return True
+
+
+def _matriz_a_textos(matriz):
+    """Matriz de code points (filas rellenas con 0 a la derecha) -> arreglo de str."""
+    import numpy as np
+    if matriz.shape[1] == 0:
+        return np.full(matriz.shape[0], '', dtype=object)
+    return np.ascontiguousarray(matriz, dtype=np.uint32).view(f'<U{matriz.shape[1]}').ravel().astype(object)
+
+
+def ruts_en_lote(valores):
+    """Versión por lote de clean_rut, validate_rut, normalize_rut y format_rut.
+
+    `valores` es una Series de pandas o un arreglo de NumPy con RUT crudos
+    (texto o número). Los textos se pasan a una matriz de code points (una fila
+    por RUT) y todo lo demás son operaciones de NumPy sobre esa matriz: filtrar
+    y compactar los caracteres 0-9/K, multiplicar los dígitos por los factores
+    del módulo 11 según su posición desde la derecha y armar el formato con
+    puntos. Devuelve un DataFrame (mismo índice que la Series) con las columnas:
+
+    - limpio: dígitos + DV en mayúscula, sin validar (clean_rut)
+    - valido: si el DV es correcto y el número >= RUT_MINIMO (validate_rut)
+    - normalizado: `limpio` si es válido, '' si no (normalize_rut)
+    - formateado: XX.XXX.XXX-X del normalizado, '' si no es válido
+
+    La matriz tiene el ancho del texto más largo, así que los textos de más de
+    MAX_LARGO_RUT caracteres se truncan antes de armarla y quedan inválidos:
+    una celda enorme en una planilla no puede disparar la memoria.
+    """
+    import numpy as np
+    import pandas as pd
 
+    serie = valores if isinstance(valores, pd.Series) else pd.Series(valores, dtype='object')
+    textos = ['' if _vacio(v) else str(v) for v in serie.tolist()]
+    demasiado_largo = np.array([len(t) > MAX_LARGO_RUT for t in textos], dtype=bool)
+    if demasiado_largo.any():
+        textos = [t[:MAX_LARGO_RUT] for t in textos]
+    crudo = np.array(textos, dtype=str)
+    puntos = crudo.view(np.uint32).reshape(len(textos), crudo.itemsize // 4)
 
-        datos_bs22 = self.rem_bs22()
-        df_bs22 = pd.DataFrame([datos_bs22])
-        df_bs22.to_excel(writer, sheet_name='REM-BS22', index=False)
+    # clean_rut: conservar 0-9 y k/K (en mayúscula), compactados a la izquierda
+    es_digito = (puntos >= ord('0')) & (puntos <= ord('9'))
+    conservar = es_digito | (puntos == ord('k')) | (puntos == ord('K'))
+    orden = np.argsort(~conservar, axis=1, kind='stable')
+    limpio = np.take_along_axis(np.where(puntos == ord('k'), ord('K'), puntos) * conservar, orden, axis=1)
+    largo = conservar.sum(axis=1)
+    limpio = limpio[:, :largo.max(initial=0)]
 
-        datos_a09 = self.rem_a09()
-        df_a09 = pd.DataFrame([datos_a09])
-        df_a09.to_excel(writer, sheet_name='REM-A09', index=False)
+    # validate_rut: número de solo dígitos, >= RUT_MINIMO y DV del módulo 11
+    columnas = np.arange(limpio.shape[1])
+    en_numero = columnas < (largo - 1)[:, None]
+    digitos = np.where(en_numero, limpio.astype(np.int64) - ord('0'), 0)
+    solo_digitos = ~(en_numero & ((digitos < 0) | (digitos > 9))).any(axis=1)
+    desde_derecha = (largo - 2)[:, None] - columnas
+    factores = np.array(FACTORES_DV)[desde_derecha % len(FACTORES_DV)]
+    suma = (np.clip(digitos, 0, 9) * factores * en_numero).sum(axis=1)
+    esperado = np.array([0] + [ord(str(d)) for d in range(1, 10)] + [ord('K'), ord('0')])[11 - suma % 11]
+    dv = limpio[np.arange(len(largo)), np.maximum(largo - 1, 0)] if limpio.shape[1] else np.zeros(len(largo))
+    primer_significativo = np.where(en_numero & (digitos > 0), columnas, limpio.shape[1]).min(axis=1, initial=limpio.shape[1])
+    significativos = np.maximum(largo - 1 - primer_significativo, 0)
+    valido = ((largo >= 2) & solo_digitos & (significativos >= len(str(RUT_MINIMO))) & (dv == esperado)
+              & ~demasiado_largo)
 
-        datos_a04 = self.rem_a04()
-        df_a04 = pd.DataFrame([datos_a04])
-        df_a04.to_excel(writer, sheet_name='REM-A04', index=False)
+    # format_rut: se recorre cada fila desde la derecha (DV, guion y grupos de tres)
+    cifras = np.where(valido, largo - 1, 0)
+    largo_formato = np.where(valido, cifras + (cifras - 1) // 3 + 2, 0)
+    ancho = largo_formato.max(initial=0)
+    r = largo_formato[:, None] - 1 - np.arange(ancho)  # posición desde la derecha
+    q = r - 2
+    es_punto = (q >= 0) & (q % 4 == 3)
+    indice_digito = (largo - 2)[:, None] - (q - q // 4)
+    tomado = np.take_along_axis(limpio, np.clip(indice_digito, 0, max(limpio.shape[1] - 1, 0)), axis=1) if ancho else limpio[:, :0]
+    formato = np.select(
+        [r < 0, r == 0, r == 1, es_punto],
+        [0, dv[:, None], ord('-'), ord('.')],
+        default=tomado.astype(np.int64),
+    ) if ancho else np.zeros((len(largo), 0), np.uint32)
 
-        writer.save()
-        return output.getvalue()
\ No newline at end of file
+    limpio_txt = _matriz_a_textos(limpio)
+    return pd.DataFrame({
+        'limpio': limpio_txt,
+        'valido': valido,
+        'normalizado': np.where(valido, limpio_txt, ''),
+        'formateado': _matriz_a_textos(formato),
+    }, index=serie.index)
@@ -0,0 +1,37 @@
+"""Versión de los datos clínicos para invalidar cachés de reportes.
+
+`version_datos()` devuelve el token actual (una consulta) y
+`marcar_cambio()` lo reemplaza; las señales y el importador masivo lo llaman
+después de escribir.
+"""
+import uuid
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+CLAVE_DATOS = 'datos_clinicos'
+
+
+def version_datos(clave=CLAVE_DATOS):
+    from .models import VersionDatos
+    return VersionDatos.objects.filter(clave=clave).values_list('token', flat=True).first() or ''
+
+
+def fecha_version(clave=CLAVE_DATOS):
+    """Cuándo cambió por última vez la versión de `clave` (None si nunca se marcó)."""
+    from .models import VersionDatos
+    return VersionDatos.objects.filter(clave=clave).values_list('actualizado', flat=True).first()
+
+
+def marcar_cambio(clave=CLAVE_DATOS):
+    """Escribe un token nuevo para `clave` y lo devuelve."""
+    from .models import VersionDatos
+    token = uuid.uuid4().hex
+    if not VersionDatos.objects.filter(clave=clave).update(token=token, actualizado=timezone.now()):
+        try:
+            with transaction.atomic():
+                VersionDatos.objects.create(clave=clave, token=token)
+        except IntegrityError:
+            # Otro proceso creó la fila entre el UPDATE y el INSERT
+            VersionDatos.objects.filter(clave=clave).update(token=token, actualizado=timezone.now())
+    return token
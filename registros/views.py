@@ -1,20 +1,27 @@
+import json
 import logging
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.conf import settings
 from django.urls import reverse
-from django.core.paginator import Paginator
 from django.db.models import Q
-from .models import Madre, Parto, RecienNacido
+from .models import Madre, Parto, RecienNacido, TrabajoExportacion
 from .forms import MadreForm, PartoForm, RecienNacidoForm, PartoCompletoForm
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, HttpResponseNotModified, FileResponse, Http404
+from django.utils.http import parse_etags
 from datetime import datetime, timedelta
-from .excel_export import exportar_datos_excel
-from .pdf_export import exportar_datos_pdf
-from .import_data import importar_datos_excel
+from .artefactos import buscar_artefacto, nombre_descarga, respuesta_artefacto
+from .exportaciones import encolar_exportacion, pendiente_vencido, vencer_pendientes
 from .utils import normalize_rut
+from .search import buscar_madres, filtrar_partos, resolver_ruts
+from .indice_madres import delta_madres, indice_madres
+from .paginacion import paginar_por_cursor
+from .profesionales import buscar_profesionales, directorio, etag_profesionales
+from django.views.decorators.gzip import gzip_page
 from django.views.decorators.http import require_POST
 from django.forms.models import model_to_dict
+from cuentas.views import requiere_rol
 
 @login_required
 def registro_parto(request, madre_id=None):
@@ -78,15 +85,9 @@ def lista_partos(request):
     partos = Parto.objects.select_related('madre', 'created_by').order_by('-fecha_hora')
     
     if query:
-        partos = partos.filter(
-            Q(madre__rut__icontains=query) |
-            Q(madre__nombres__icontains=query) |
-            Q(madre__apellidos__icontains=query)
-        )
+        partos = filtrar_partos(partos, query)
     
-    paginator = Paginator(partos, 10)
-    page = request.GET.get('page')
-    partos_paginados = paginator.get_page(page)
+    partos_paginados = paginar_por_cursor(partos, 'fecha_hora', request.GET.get('cursor'), por_pagina=10)
     
     return render(request, 'registros/lista_partos.html', {
         'partos': partos_paginados,
@@ -106,9 +107,7 @@ def lista_madres(request):
             Q(apellidos__icontains=query)
         )
     
-    paginator = Paginator(madres, 15)
-    page = request.GET.get('page')
-    madres_paginadas = paginator.get_page(page)
+    madres_paginadas = paginar_por_cursor(madres, 'created_at', request.GET.get('cursor'), por_pagina=15)
     
     # Manejar creación de nueva madre
     if request.method == 'POST':
@@ -260,83 +259,113 @@ def madre_lookup(request):
         return JsonResponse({'error': 'Rut requerido'}, status=400)
     
     rut_norm = normalize_rut(rut)
+    if not rut_norm:
+        return JsonResponse({'found': False})
     try:
-        
-        madres = Madre.objects.all()
-        madre = None
-        for m in madres:
-            if m.rut.replace('.', '').replace('-', '').upper() == rut_norm:
-                madre = m
-                break
+        madre = Madre.objects.filter(rut_normalizado=rut_norm).first()
         if not madre:
             return JsonResponse({'found': False})
-        data = {
-            'found': True,
-            'rut': madre.rut,
-            'nombres': madre.nombres,
-            'apellidos': madre.apellidos,
-            'fecha_nacimiento': madre.fecha_nacimiento.isoformat() if madre.fecha_nacimiento else None,
-            'estado_civil': madre.estado_civil,
-            'direccion': madre.direccion,
-            'telefono': madre.telefono,
-            'prevision': madre.prevision,
-        }
-        return JsonResponse(data)
+        return JsonResponse({'found': True, **_datos_madre(madre)})
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
 
+@login_required
+@require_POST
+@gzip_page
+def madre_lookup_lote(request):
+    """Versión por lote de `madre_lookup` (vista previa de importación, listas pegadas, integraciones).
+
+    Recibe JSON `{"ruts": [...]}` o el campo de formulario `ruts` con un RUT
+    por línea, hasta MADRE_LOOKUP_LOTE_MAX. Responde un resultado por RUT, en
+    el mismo orden, con `estado` 'encontrada', 'no_encontrada' o 'invalido'.
+    """
+    if request.content_type == 'application/json':
+        try:
+            ruts = json.loads(request.body).get('ruts')
+        except (ValueError, AttributeError):
+            return JsonResponse({'error': 'JSON inválido'}, status=400)
+    else:
+        ruts = [linea.strip() for linea in request.POST.get('ruts', '').splitlines() if linea.strip()]
+    if not isinstance(ruts, list) or not ruts:
+        return JsonResponse({'error': 'Lista de RUT requerida'}, status=400)
+    # Se devuelven tal cual en `entrada`: solo texto o números, nada de objetos o listas anidadas
+    if any(isinstance(rut, bool) or not isinstance(rut, (str, int, float)) for rut in ruts):
+        return JsonResponse({'error': 'Cada RUT debe ser texto o número'}, status=400)
+    if len(ruts) > settings.MADRE_LOOKUP_LOTE_MAX:
+        return JsonResponse({'error': f'Máximo {settings.MADRE_LOOKUP_LOTE_MAX} RUT por consulta'}, status=400)
+
+    resultados = []
+    for entrada, rut_norm, madre in resolver_ruts(ruts):
+        if madre:
+            resultados.append({'entrada': entrada, 'estado': 'encontrada', 'madre': _datos_madre(madre)})
+        else:
+            resultados.append({'entrada': entrada, 'estado': 'no_encontrada' if rut_norm else 'invalido'})
+    return JsonResponse({'resultados': resultados}, json_dumps_params={'separators': (',', ':')})
+
+
+def _datos_madre(madre):
+    return {
+        'rut': madre.rut,
+        'nombres': madre.nombres,
+        'apellidos': madre.apellidos,
+        'fecha_nacimiento': madre.fecha_nacimiento.isoformat() if madre.fecha_nacimiento else None,
+        'estado_civil': madre.estado_civil,
+        'direccion': madre.direccion,
+        'telefono': madre.telefono,
+        'prevision': madre.prevision,
+    }
+
+
 @login_required
 def madre_typeahead(request):
     """Return JSON list of matching mothers by partial rut or name."""
     q = request.GET.get('q', '').strip()
-    results = []
-    if q:
-        q_norm = normalize_rut(q)
-        qs = Madre.objects.all()
-      
-        for m in qs:
-            m_norm = m.rut.replace('.', '').replace('-', '').upper()
-            if q_norm and m_norm.startswith(q_norm):
-                results.append({'id': m.id, 'rut': m.rut, 'nombres': m.nombres, 'apellidos': m.apellidos})
-                continue
-            if q.lower() in m.nombres.lower() or q.lower() in m.apellidos.lower():
-                results.append({'id': m.id, 'rut': m.rut, 'nombres': m.nombres, 'apellidos': m.apellidos})
-            if len(results) >= 10:
-                break
+    results = [
+        {'id': m.id, 'rut': m.rut, 'nombres': m.nombres, 'apellidos': m.apellidos}
+        for m in buscar_madres(q, limite=10)
+    ]
     return JsonResponse({'results': results})
 
 
+@login_required
+@gzip_page
+def madre_indice(request):
+    """Índice compacto de madres recientes para el typeahead local (ver `registros.indice_madres`)."""
+    respuesta = JsonResponse(indice_madres(), json_dumps_params={'separators': (',', ':')})
+    respuesta['Cache-Control'] = 'private, no-cache'
+    return respuesta
+
+
+@login_required
+@gzip_page
+def madre_indice_delta(request):
+    """Cambios del índice desde `desde` (el `hasta` de la respuesta anterior) para la `version` dada."""
+    datos = delta_madres(request.GET.get('desde'), request.GET.get('version'))
+    respuesta = JsonResponse(datos, json_dumps_params={'separators': (',', ':')})
+    respuesta['Cache-Control'] = 'private, no-cache'
+    return respuesta
+
+
 @login_required
 def profesionales_list(request):
-    """API que devuelve lista de profesionales (usuarios) con RUT, nombres, apellidos y área."""
-    from cuentas.models import Usuario
-    
+    """API que devuelve lista de profesionales (usuarios) con RUT, nombres, apellidos y área.
+
+    Responde desde el directorio en memoria (`registros.profesionales`) y con
+    un ETag por versión del directorio y búsqueda: si el navegador ya tiene la
+    respuesta, recibe un 304.
+    """
     q = request.GET.get('q', '').strip()
-    profesionales = Usuario.objects.filter(is_active=True).select_related('rol').order_by('first_name', 'last_name')
-    
-    if q:
-        # Buscar por RUT, nombre o apellido
-        profesionales = profesionales.filter(
-            Q(run__icontains=q) |
-            Q(first_name__icontains=q) |
-            Q(last_name__icontains=q) |
-            Q(username__icontains=q)
-        )
-    
-    results = []
-    for prof in profesionales[:100]:  # Limitar a 100 resultados para permitir más opciones
-        area = prof.rol.nombre if prof.rol else 'Sin área'
-        results.append({
-            'id': prof.id,
-            'rut': prof.run or '',
-            'nombres': prof.first_name or '',
-            'apellidos': prof.last_name or '',
-            'area': area,
-            'nombre_completo': f"{prof.first_name or ''} {prof.last_name or ''}".strip() or prof.username
-        })
-    
-    return JsonResponse({'profesionales': results})
+    version, entradas = directorio.actual()
+    etag = etag_profesionales(version, q)
+    etags = parse_etags(request.headers.get('If-None-Match', ''))
+    if '*' in etags or etag in etags:
+        respuesta = HttpResponseNotModified()
+    else:
+        respuesta = JsonResponse({'profesionales': buscar_profesionales(entradas, q)})
+    respuesta['ETag'] = etag
+    respuesta['Cache-Control'] = 'private, no-cache'
+    return respuesta
 
 
 @login_required
@@ -413,13 +442,12 @@ def madre_create(request):
     de la madre creada o errores en caso de validación.
     """
     
-    from .utils import normalize_rut, format_rut
+    from .utils import normalize_rut
     rut_raw = request.POST.get('rut', '')
     if rut_raw:
         norm = normalize_rut(rut_raw)
         if norm:
-            formatted = format_rut(norm)
-            if Madre.objects.filter(rut=formatted).exists():
+            if Madre.objects.filter(rut_normalizado=norm).exists():
                 return JsonResponse({'created': False, 'errors': {'rut': ['Ya existe una madre con ese RUT.']}}, status=400)
 
     form = MadreForm(request.POST)
@@ -442,44 +470,96 @@ def madre_create(request):
         return JsonResponse({'created': False, 'errors': form.errors}, status=400)
 
 
+def _rango_exportacion(request):
+    """Lee start/end (YYYY-MM-DD) del GET. Devuelve (fecha_inicio, fecha_fin) o
+    (None, None) si no se enviaron; lanza ValueError si el formato es inválido."""
+    start = request.GET.get('start')
+    end = request.GET.get('end')
+    if not start or not end:
+        return None, None
+    return datetime.fromisoformat(start).date(), datetime.fromisoformat(end).date()
+
+
+def _encolar_y_redirigir(request, tipo, parametros):
+    """Sirve el archivo desde la caché de artefactos si los datos no cambiaron; si no, lo encola."""
+    artefacto = buscar_artefacto(tipo, parametros)
+    if artefacto is not None:
+        return respuesta_artefacto(request, artefacto)
+    trabajo = encolar_exportacion(tipo, parametros, request.user)
+    return redirect('registros:exportacion_estado', trabajo_id=trabajo.id)
+
+
 @login_required
 def exportar_partos(request):
-    """Exportar partos a Excel dentro de un rango de fechas (GET start/end en formato YYYY-MM-DD).
+    """Encola la exportación de partos a Excel dentro de un rango de fechas (GET start/end en formato YYYY-MM-DD).
     Si no se proveen fechas, exporta TODOS los partos disponibles.
     """
-    start = request.GET.get('start')
-    end = request.GET.get('end')
-    
-    # Si no se proporcionan fechas, exportar todos los partos (pasar None)
-    if not start or not end:
-        fecha_inicio = None
-        fecha_fin = None
-    else:
-        try:
-            fecha_inicio = datetime.fromisoformat(start).date()
-            fecha_fin = datetime.fromisoformat(end).date()
-        except ValueError:
-            return HttpResponse('Formato de fecha inválido. Use YYYY-MM-DD', status=400)
+    try:
+        fecha_inicio, fecha_fin = _rango_exportacion(request)
+    except ValueError:
+        return HttpResponse('Formato de fecha inválido. Use YYYY-MM-DD', status=400)
 
-    return exportar_datos_excel(fecha_inicio, fecha_fin)
+    return _encolar_y_redirigir(request, 'excel', {
+        'fecha_inicio': fecha_inicio.isoformat() if fecha_inicio else None,
+        'fecha_fin': fecha_fin.isoformat() if fecha_fin else None,
+    })
 
 @login_required
 def exportar_partos_pdf(request):
-    """Exportar partos a PDF dentro de un rango de fechas."""
-    start = request.GET.get('start')
-    end = request.GET.get('end')
-    
-    if not start or not end:
-        fecha_inicio = None
-        fecha_fin = None
-    else:
-        try:
-            fecha_inicio = datetime.fromisoformat(start).date()
-            fecha_fin = datetime.fromisoformat(end).date()
-        except ValueError:
-            return HttpResponse('Formato de fecha inválido. Use YYYY-MM-DD', status=400)
+    """Encola la exportación de partos a PDF dentro de un rango de fechas."""
+    try:
+        fecha_inicio, fecha_fin = _rango_exportacion(request)
+    except ValueError:
+        return HttpResponse('Formato de fecha inválido. Use YYYY-MM-DD', status=400)
+
+    return _encolar_y_redirigir(request, 'pdf', {
+        'fecha_inicio': fecha_inicio.isoformat() if fecha_inicio else None,
+        'fecha_fin': fecha_fin.isoformat() if fecha_fin else None,
+    })
+
+
+def _trabajo_del_usuario(request, trabajo_id):
+    trabajo = get_object_or_404(TrabajoExportacion, id=trabajo_id)
+    if trabajo.created_by_id != request.user.id and not request.user.is_superuser:
+        raise Http404('Exportación no encontrada')
+    return trabajo
 
-    return exportar_datos_pdf(fecha_inicio, fecha_fin)
+
+@login_required
+def exportacion_estado(request, trabajo_id):
+    """Estado de una exportación encolada. Con ?format=json responde para el polling de la página."""
+    trabajo = _trabajo_del_usuario(request, trabajo_id)
+    if pendiente_vencido(trabajo) and vencer_pendientes(TrabajoExportacion.objects.filter(pk=trabajo.pk)):
+        trabajo.refresh_from_db()
+    if request.GET.get('format') == 'json':
+        data = {
+            'id': trabajo.id,
+            'estado': trabajo.estado,
+            'terminado': trabajo.terminado,
+            'error': trabajo.error,
+            'descarga': None,
+        }
+        if trabajo.estado == 'completado':
+            data['descarga'] = reverse('registros:exportacion_descargar', args=[trabajo.id])
+        return JsonResponse(data)
+
+    return render(request, 'registros/exportacion_estado.html', {
+        'trabajo': trabajo,
+        'titulo': 'Exportación'
+    })
+
+
+@login_required
+def exportacion_descargar(request, trabajo_id):
+    trabajo = _trabajo_del_usuario(request, trabajo_id)
+    if trabajo.estado != 'completado' or not trabajo.archivo:
+        raise Http404('La exportación aún no está disponible')
+    try:
+        archivo = trabajo.archivo.open('rb')
+    except FileNotFoundError:
+        # Ya purgado: se sirve desde la caché de artefactos o se vuelve a generar
+        return _encolar_y_redirigir(request, trabajo.tipo, trabajo.parametros or {})
+    return FileResponse(archivo, as_attachment=True, filename=nombre_descarga(trabajo.nombre_archivo))
 
 @login_required
 def importar_partos(request):
@@ -489,25 +569,120 @@ def importar_partos(request):
             return redirect('registros:importar_partos')
         
         file = request.FILES['file']
-        import_type = request.POST.get('import_type', 'auto')
         
         if not file.name.endswith(('.xlsx', '.xls')):
             messages.error(request, 'Formato de archivo no válido. Use Excel (.xlsx, .xls).')
             return redirect('registros:importar_partos')
 
-        result = importar_datos_excel(file, request.user, import_type=import_type)
-        
-        if result['success']:
-            counts = result.get('counts', {})
-            msg = f"Importación exitosa. Creados: {counts.get('madres', 0)} Madres, {counts.get('partos', 0)} Partos, {counts.get('rn', 0)} RNs."
-            messages.success(request, msg)
-            
-            if result.get('errors'):
-                messages.warning(request, f"Se encontraron algunos errores no críticos: {len(result['errors'])}")
-                # Podríamos mostrar los errores en detalle si fuera necesario
-        else:
-            messages.error(request, f"Error en la importación: {result.get('message')}")
-            
-        return redirect('registros:lista_partos')
+        # Fase 1: analizar (o reutilizar el análisis de un archivo idéntico) y mostrar la vista previa.
+        # import_data carga pandas: se importa aquí para no cargarlo al arrancar cada worker.
+        from .import_data import analizar_excel_con_cache
+        try:
+            clave, _analisis, _desde_cache = analizar_excel_con_cache(file)
+        except Exception as e:
+            logging.getLogger(__name__).exception("Error analizando excel")
+            messages.error(request, f"Error en la importación: Error procesando el archivo: {str(e)}")
+            return redirect('registros:importar_partos')
+        return redirect('registros:importar_vista_previa', clave=clave)
 
     return render(request, 'registros/importar_partos.html', {'titulo': 'Importar Registros'})
+
+CAMPOS_IMPORTACION = [
+    ('rut', 'RUT / RUN'),
+    ('dv', 'Dígito verificador'),
+    ('nombre', 'Nombre completo'),
+    ('edad', 'Edad'),
+    ('fecha', 'Fecha del parto'),
+    ('hora', 'Hora del parto'),
+    ('comuna', 'Comuna / Domicilio'),
+    ('tipo_parto', 'Tipo de parto'),
+    ('semanas', 'Semanas de gestación'),
+    ('sexo', 'Sexo RN'),
+    ('peso', 'Peso RN'),
+    ('talla', 'Talla RN'),
+    ('apgar1', 'APGAR 1 min'),
+    ('apgar5', 'APGAR 5 min'),
+]
+
+def _es_superusuario(user):
+    return getattr(user, 'rol', None) is not None and user.rol.nombre == 'superusuario'
+
+def _opciones_columnas(hoja):
+    """Columnas de la cabecera de la hoja, sin vacías ni repetidas."""
+    return [c for c in dict.fromkeys(hoja['encabezados']) if c]
+
+@login_required
+def importar_vista_previa(request, clave):
+    from .import_data import cargar_analisis
+    analisis = cargar_analisis(clave)
+    if analisis is None:
+        messages.error(request, 'La vista previa expiró. Vuelva a subir el archivo.')
+        return redirect('registros:importar_partos')
+
+    filas = analisis['filas']
+    hojas = [{
+        **hoja,
+        'indice': indice,
+        'mapeo': [(campo, etiqueta, hoja['columnas'].get(campo)) for campo, etiqueta in CAMPOS_IMPORTACION],
+        'opciones': _opciones_columnas(hoja),
+    } for indice, hoja in enumerate(analisis['hojas'])]
+    return render(request, 'registros/importar_vista_previa.html', {
+        'titulo': 'Vista previa de importación',
+        'clave': clave,
+        'hojas': hojas,
+        'varias_hojas': sum(1 for hoja in hojas if not hoja['omitida']) > 1,
+        'puede_editar_perfil': _es_superusuario(request.user),
+        'total_filas': len(filas),
+        'total_madres': len({f['rut_normalizado'] for f in filas}),
+        'total_errores': len(analisis['errores']),
+        'errores': analisis['errores'][:50],
+        'muestra': filas[:10],
+    })
+
+@requiere_rol("superusuario")
+@require_POST
+def importar_perfil(request, clave, hoja):
+    # Confirma o corrige el mapeo de una hoja; queda guardado para su formato de cabecera
+    from .import_data import cargar_analisis, guardar_perfil, reanalizar
+    analisis = cargar_analisis(clave)
+    if analisis is None or hoja >= len(analisis['hojas']):
+        messages.error(request, 'La vista previa expiró. Vuelva a subir el archivo.')
+        return redirect('registros:importar_partos')
+
+    info = analisis['hojas'][hoja]
+    if info['huella'] is None:
+        messages.error(request, 'La cabecera de esta hoja no tiene columnas suficientes para guardar un perfil.')
+        return redirect('registros:importar_vista_previa', clave=clave)
+    opciones = set(_opciones_columnas(info))
+    columnas = {campo: request.POST.get(campo) or None for campo, _ in CAMPOS_IMPORTACION}
+    if any(col is not None and col not in opciones for col in columnas.values()):
+        messages.error(request, 'El mapeo incluye columnas que no están en la cabecera.')
+        return redirect('registros:importar_vista_previa', clave=clave)
+    if columnas['rut'] is None:
+        messages.error(request, 'Debe indicar la columna de RUT / RUN.')
+        return redirect('registros:importar_vista_previa', clave=clave)
+
+    guardar_perfil(info['huella'], info['encabezados'], columnas, request.user)
+    if reanalizar(clave) is None:
+        messages.error(request, 'El perfil se guardó, pero la vista previa expiró. Vuelva a subir el archivo.')
+        return redirect('registros:importar_partos')
+    messages.success(request, f"Mapeo de la hoja '{info['nombre']}' guardado para las próximas importaciones.")
+    return redirect('registros:importar_vista_previa', clave=clave)
+
+@login_required
+@require_POST
+def importar_confirmar(request, clave):
+    # Fase 2: guardar desde el análisis cacheado, sin volver a abrir el Excel
+    from .import_data import confirmar_importacion
+    result = confirmar_importacion(clave, request.user)
+    if result is None:
+        messages.error(request, 'La vista previa expiró. Vuelva a subir el archivo.')
+        return redirect('registros:importar_partos')
+
+    counts = result.get('counts', {})
+    msg = f"Importación exitosa. Creados: {counts.get('madres', 0)} Madres, {counts.get('partos', 0)} Partos, {counts.get('rn', 0)} RNs."
+    messages.success(request, msg)
+
+    if result.get('errors'):
+        messages.warning(request, f"Se encontraron algunos errores no críticos: {len(result['errors'])}")
+    return redirect('registros:lista_partos')
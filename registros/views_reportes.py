@@ -1,9 +1,10 @@
-from django.http import HttpResponse
-from django.shortcuts import render
+from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from datetime import datetime
 from .utils import GeneradorREM
+from .artefactos import buscar_artefacto, respuesta_artefacto
+from .exportaciones import encolar_exportacion
 
 @login_required
 def reporte_rem(request):
@@ -16,10 +17,27 @@ def reporte_rem(request):
                 messages.error(request, 'La fecha de inicio debe ser anterior a la fecha final.')
                 return render(request, 'registros/reporte_rem.html')
             
-            generador = GeneradorREM(fecha_inicio, fecha_fin)
-            
-            
             tipo_reporte = request.POST.get('tipo_reporte')
+            if tipo_reporte not in ('bs22', 'a09', 'a04', 'datos_completos'):
+                messages.error(request, 'Tipo de reporte no válido.')
+                return render(request, 'registros/reporte_rem.html')
+
+            if request.POST.get('formato') == 'excel':
+                # La planilla se genera en el worker de exportaciones
+                parametros = {
+                    'fecha_inicio': fecha_inicio.isoformat(),
+                    'fecha_fin': fecha_fin.isoformat(),
+                }
+                tipo = 'excel' if tipo_reporte == 'datos_completos' else 'rem'
+                if tipo == 'rem':
+                    parametros['tipo_reporte'] = tipo_reporte
+                artefacto = buscar_artefacto(tipo, parametros)
+                if artefacto is not None:
+                    return respuesta_artefacto(request, artefacto)
+                trabajo = encolar_exportacion(tipo, parametros, request.user)
+                return redirect('registros:exportacion_estado', trabajo_id=trabajo.id)
+
+            generador = GeneradorREM(fecha_inicio, fecha_fin)
             if tipo_reporte == 'bs22':
                 datos = generador.rem_bs22()
             elif tipo_reporte == 'a09':
@@ -29,20 +47,7 @@ def reporte_rem(request):
             else:
                 messages.error(request, 'Tipo de reporte no válido.')
                 return render(request, 'registros/reporte_rem.html')
-         
-            if request.POST.get('formato') == 'excel':
-                if tipo_reporte == 'datos_completos':
-                    from .excel_export import exportar_datos_excel
-                    return exportar_datos_excel(fecha_inicio, fecha_fin)
-                else:
-                    excel_data = generador.exportar_excel()
-                    response = HttpResponse(
-                        excel_data,
-                        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-                    )
-                    response['Content-Disposition'] = f'attachment; filename=REM_{tipo_reporte}_{fecha_inicio}_{fecha_fin}.xlsx'
-                    return response
-            
+
             return render(request, 'registros/reporte_rem.html', {
                 'datos': datos,
                 'tipo_reporte': tipo_reporte,
@@ -10,7 +10,7 @@ os.environ["DJANGO_DEBUG"] = "True"
 django.setup()
 
 from registros.models import Madre, Parto, RecienNacido
-from registros.pdf_export import exportar_datos_pdf
+from registros.pdf_export import generar_pdf_partos
 from registros.excel_export import exportar_datos_excel
 from registros.import_data import importar_datos_excel
 from django.contrib.auth import get_user_model
@@ -18,11 +18,12 @@ from django.contrib.auth import get_user_model
 def test_export_pdf():
     print("Testing PDF Export...")
     try:
-        response = exportar_datos_pdf()
-        if response.status_code == 200 and response['Content-Type'] == 'application/pdf':
+        from io import BytesIO
+        html_con_errores = generar_pdf_partos(BytesIO())
+        if html_con_errores is None:
             print("PDF Export: SUCCESS")
         else:
-            print(f"PDF Export: FAILED (Status: {response.status_code}, Type: {response.get('Content-Type')})")
+            print("PDF Export: FAILED (xhtml2pdf reported errors)")
     except Exception as e:
         print(f"PDF Export: ERROR ({e})")
 